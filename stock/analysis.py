@@ -0,0 +1,109 @@
+"""与界面无关的数据处理：K线范围、周期合成、均线和高低点，供界面和批量分析共用"""
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from indicators import MA_PERIODS, moving_averages, rolling_mean
+from instrumentation import span
+from kline_store import period_start
+from resample import resample_ohlcv
+
+DEFAULT_DAILY_MONTHS = 24   # 日K默认范围（月）
+DEFAULT_WEEKLY_YEARS = 10   # 周K默认范围（年）
+DEFAULT_MONTHLY_YEARS = 20  # 月K默认范围（年）
+HIGH_LOW_WINDOW = 250       # 批量分析中计算近期高低点的K线数量（约一年）
+VOLUME_RATIO_DAYS = 5       # 量比：当日成交量 / 前5日平均成交量
+
+K_LINE_PERIODS = (("日K", None), ("周K", "weekly"), ("月K", "monthly"))
+
+
+def range_start_dates(daily_months=DEFAULT_DAILY_MONTHS, weekly_years=DEFAULT_WEEKLY_YEARS,
+                      monthly_years=DEFAULT_MONTHLY_YEARS, now=None):
+    """各K线类型的起始日期（'YYYYMMDD'）"""
+    now = now or datetime.now()
+    return {
+        "日K": (now - timedelta(days=daily_months*30)).strftime('%Y%m%d'),
+        "周K": (now - timedelta(days=weekly_years*365)).strftime('%Y%m%d'),
+        "月K": (now - timedelta(days=monthly_years*365)).strftime('%Y%m%d'),
+    }
+
+
+def history_start_date(start_dates):
+    """合成各K线类型需要的日K起始日期（'YYYYMMDD'）
+
+    周K、月K从起始日期所在周、所在月的第一天开始取日K，否则第一根周K、月K只包含部分交易日，与 akshare 不一致。
+    """
+    periods = dict(K_LINE_PERIODS)
+    return min(period_start(datetime.strptime(start, '%Y%m%d'), periods[k_type] or 'daily')
+               for k_type, start in start_dates.items()).strftime('%Y%m%d')
+
+
+def iter_k_line_data(daily, start_dates):
+    """由日K数据截取日K范围，并在本地依次合成周K、月K
+
+    daily 应从 history_start_date(start_dates) 开始；周K、月K保留包含起始日期的整个周期。
+    只产出 start_dates 中包含的K线类型，其余类型不合成。
+    """
+    for k_type, period in K_LINE_PERIODS:
+        if k_type not in start_dates:
+            continue
+        with span(f'kline.{k_type}', bars=len(daily)):
+            df = daily if period is None else resample_ohlcv(daily, period)
+            df = df[pd.to_datetime(df['日期']) >= pd.to_datetime(start_dates[k_type])].reset_index(drop=True)
+        yield k_type, df
+
+
+def calculate_ma(df, periods=MA_PERIODS):
+    """收盘价均线，返回 {'MA5': 数组, ...}"""
+    return moving_averages(df['收盘'].values, periods)
+
+
+def find_extremes(high, low):
+    """区间最高价、最低价及其位置，返回 (最高价, 最高价下标, 最低价, 最低价下标)"""
+    high_index = int(np.nanargmax(high))
+    low_index = int(np.nanargmin(low))
+    return high[high_index], high_index, low[low_index], low_index
+
+
+def summarize_daily(code, daily, window=HIGH_LOW_WINDOW):
+    """单只股票日K数据的汇总行：最新行情、均线、区间与近期高低点、量比"""
+    if daily is None or daily.empty:
+        raise ValueError(f"No daily data for {code}")
+    close = daily['收盘'].values
+    volume = daily['成交量'].values
+    dates = daily['日期'].values
+    last = len(daily) - 1
+    mas = calculate_ma(daily)
+    ma_last = {name: values[-1] for name, values in mas.items()}
+
+    high = daily['最高'].values
+    low = daily['最低'].values
+    high_value, high_index, low_value, low_index = find_extremes(high, low)
+    recent_high, recent_high_index, recent_low, recent_low_index = find_extremes(high[-window:], low[-window:])
+    offset = len(daily) - len(high[-window:])
+    volume_base = rolling_mean(volume, VOLUME_RATIO_DAYS)
+    previous_volume = volume_base[-2] if len(volume_base) > 1 else np.nan
+
+    ma_values = [ma_last[f'MA{period}'] for period in MA_PERIODS]
+    row = {
+        '代码': code,
+        '日期': dates[last],
+        'K线数量': len(daily),
+        '收盘': close[last],
+        '涨跌幅': daily['涨跌幅'].values[last] if '涨跌幅' in daily else np.nan,
+        **ma_last,
+        # 短期均线依次在长期均线之上
+        '均线多头': bool(np.all(np.diff(ma_values) < 0)) if not np.isnan(ma_values).any() else False,
+        '偏离MA20': (close[last] / ma_last['MA20'] - 1) * 100 if 'MA20' in ma_last else np.nan,
+        '量比': volume[last] / previous_volume if previous_volume > 0 else np.nan,
+        '区间最高': high_value,
+        '区间最高日期': dates[high_index],
+        '区间最低': low_value,
+        '区间最低日期': dates[low_index],
+        f'{window}日最高': recent_high,
+        f'{window}日最高日期': dates[offset + recent_high_index],
+        f'{window}日最低': recent_low,
+        f'{window}日最低日期': dates[offset + recent_low_index],
+        f'创{window}日新高': offset + recent_high_index == last,
+        f'创{window}日新低': offset + recent_low_index == last,
+    }
+    return row
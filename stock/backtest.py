@@ -0,0 +1,519 @@
+"""多股票向量化回测（无界面）：在本地缓存的前复权日K上，对 股票×日期 的二维数组一次计算全部股票
+
+运行: python backtest.py                                         对本地已缓存的全部股票回测 MA5/MA20 金叉死叉
+      python backtest.py --strategy breakout --param entry=55 --param exit=20
+      python backtest.py --symbols-file codes.txt --years 10 --update --plot
+      python backtest.py --fake --update --symbols 000001 000002  使用模拟数据
+
+交易规则：当天收盘后根据信号决定目标仓位，下一交易日开盘价成交，因此当天买入的股票最早次日卖出（T+1）；
+开盘涨停时不能买入、跌停时不能卖出，停牌日不能交易，未成交的信号顺延到下一个可交易日。
+买卖双向收取佣金，卖出另收印花税，不计最低佣金。每只股票是一个独立的满仓/空仓账户，
+组合净值为全部股票账户等权平均（初始资金平均分配，之后不再平衡）。
+"""
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from bars import to_day_numbers
+from batch import read_symbols, SOURCE_CONCURRENCY
+from data_provider import AkshareProvider, FakeProvider
+from indicators import MA_PERIODS, rolling_mean
+from instrumentation import span
+from kline_store import KLineStore, DEFAULT_DATA_DIR, DB_FILENAME
+from trading_calendar import TradingCalendar, CALENDAR_FILENAME
+
+matplotlib.rcParams['font.sans-serif'] = ['SimHei']  # 设置中文字体
+matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_DIRNAME = 'backtest'  # 数据目录下的默认输出目录
+DEFAULT_YEARS = 10             # 默认回测年数
+COMMISSION = 0.00025           # 佣金费率（买卖双向）
+STAMP_TAX = 0.0005             # 印花税率（仅卖出）
+SLIPPAGE = 0.0                 # 每次成交的滑点（按成交额比例，买卖双向）
+TRADING_DAYS = 252             # 每年交易日数，用于年化
+LIMIT_TOLERANCE = 0.002        # 判断涨跌停的容差（前复权价格不是精确的两位小数）
+PANEL_COLUMNS = ('open', 'high', 'low', 'close')
+PANEL_CACHE_FILENAME = 'panel_cache.npz'  # 数据目录下对齐后的日K缓存
+
+
+def price_limits(codes):
+    """各股票的涨跌停幅度：创业板、科创板 20%，北交所 30%，其余 10%（无法识别 ST 股票的 5%）"""
+    limits = np.full(len(codes), 0.1)
+    for i, code in enumerate(codes):
+        if code.startswith(('300', '301', '688', '689')):
+            limits[i] = 0.2
+        elif code.startswith(('8', '4', '92')):
+            limits[i] = 0.3
+    return limits
+
+
+def forward_fill(values):
+    """沿日期方向（最后一维）用前一个有效值填充 NaN，开头的 NaN 保留"""
+    index = np.where(np.isnan(values), 0, np.arange(values.shape[-1]))
+    np.maximum.accumulate(index, axis=-1, out=index)
+    return np.take_along_axis(values, index, axis=-1)
+
+
+def shift(values, fill):
+    """沿日期方向后移一天，第一天填充 fill"""
+    result = np.empty_like(values)
+    result[..., 0] = fill
+    result[..., 1:] = values[..., :-1]
+    return result
+
+
+def prior_extreme(values, window, reduce):
+    """前 window 个交易日（不含当天）的最高或最低值，reduce 为 np.max / np.min"""
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] > window:
+        result[..., window:] = reduce(sliding_window_view(values, window, axis=-1)[..., :-1, :], axis=-1)
+    return result
+
+
+class Panel:
+    """多只股票对齐到同一日期轴的日K
+
+    各字段为 (股票数, 日期数) 的 float64 数组，股票当天没有K线（未上市或停牌）时为 NaN；
+    dates 与 BarSeries 相同，为 int64 天数。
+    """
+
+    def __init__(self, codes, dates, values):
+        self.codes = list(codes)
+        self.dates = dates
+        self.values = values   # 字段 -> 二维数组
+        self._filled = {}
+
+    @classmethod
+    def from_records(cls, df, codes=None):
+        """由 KLineStore.load_many 返回的长表创建，codes 决定行顺序（没有数据的股票整行为 NaN）"""
+        codes = list(codes) if codes is not None else sorted(df['symbol'].unique())
+        rows = pd.Index(codes).get_indexer(df['symbol'])
+        keep = rows >= 0
+        # 日期字符串先去重再转换，每个日期只解析一次
+        date_codes, unique_dates = pd.factorize(df['date'])
+        day_numbers = to_day_numbers(unique_dates) if len(unique_dates) else np.empty(0, dtype=np.int64)
+        order = np.argsort(day_numbers)
+        columns = np.empty(len(order), dtype=np.intp)
+        columns[order] = np.arange(len(order))
+        columns = columns[date_codes]
+        values = {}
+        for field in df.columns.drop(['symbol', 'date']):
+            # 与 BarSeries 和缓存文件相同按 float32 精度保存价格，读取缓存与否结果完全一致
+            array = np.full((len(codes), len(order)), np.nan, dtype=np.float32)
+            array[rows[keep], columns[keep]] = df[field].to_numpy(dtype=float)[keep]
+            values[field] = array.astype(float)
+        return cls(codes, day_numbers[order], values)
+
+    @property
+    def shape(self):
+        return len(self.codes), len(self.dates)
+
+    @property
+    def open(self):
+        return self.values['open']
+
+    @property
+    def high(self):
+        return self.values['high']
+
+    @property
+    def low(self):
+        return self.values['low']
+
+    @property
+    def close(self):
+        return self.values['close']
+
+    def filled(self, field):
+        """停牌日以前值填充的字段，用于计算信号"""
+        if field not in self._filled:
+            self._filled[field] = forward_fill(self.values[field])
+        return self._filled[field]
+
+    def datetimes(self):
+        return self.dates.view('datetime64[D]')
+
+    def save(self, path, key):
+        """保存为 npz 缓存（数值保存为 float32），key 用于判断缓存是否仍然有效"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, key=key, codes=np.asarray(self.codes), dates=self.dates,
+                     **{field: values.astype(np.float32) for field, values in self.values.items()})
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, key):
+        """读取 npz 缓存，文件不存在或 key 不一致时返回 None"""
+        try:
+            with np.load(path) as data:
+                if str(data['key']) != key:
+                    return None
+                values = {field: data[field].astype(float) for field in data.files
+                          if field not in ('key', 'codes', 'dates')}
+                return cls(data['codes'].tolist(), data['dates'], values)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Error loading panel cache from %s: %s", path, e)
+            return None
+
+
+# 策略函数：根据截至当天收盘的数据返回 (股票数, 日期数) 的布尔数组，True 表示希望持有
+def ma_cross(panel, fast=5, slow=20):
+    """快线在慢线之上时持有（金叉买入、死叉卖出）"""
+    close = panel.filled('close')
+    return rolling_mean(close, fast) > rolling_mean(close, slow)
+
+
+def above_ma(panel, ma=20):
+    """收盘价在均线之上时持有"""
+    close = panel.filled('close')
+    return close > rolling_mean(close, ma)
+
+
+def ma_bullish(panel, periods=MA_PERIODS):
+    """均线多头排列（MA5 > MA10 > MA20 > MA30）时持有，与批量分析中的“均线多头”一致"""
+    close = panel.filled('close')
+    lines = [rolling_mean(close, period) for period in sorted(periods)]
+    hold = np.ones(close.shape, dtype=bool)
+    for shorter, longer in zip(lines, lines[1:]):
+        hold &= shorter > longer
+    return hold
+
+
+def breakout(panel, entry=20, exit=10):
+    """收盘价突破前 entry 日最高价买入，跌破前 exit 日最低价卖出"""
+    close = panel.filled('close')
+    enter = close > prior_extreme(panel.filled('high'), entry, np.max)
+    leave = close < prior_extreme(panel.filled('low'), exit, np.min)
+    state = forward_fill(np.where(enter, 1.0, np.where(leave, 0.0, np.nan)))
+    return state == 1
+
+
+STRATEGIES = {
+    'ma_cross': ma_cross,
+    'above_ma': above_ma,
+    'ma_bullish': ma_bullish,
+    'breakout': breakout,
+}
+
+
+def performance(equity, active):
+    """净值统计，equity 为 (n, 日期数) 的净值，active 标记已有价格的日期；返回 {指标: 长度为 n 的数组}"""
+    days = active.sum(axis=-1)
+    returns = np.where(active, equity / shift(equity, 1.0) - 1, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = returns.sum(axis=-1) / days
+        std = np.sqrt(np.where(active, (returns - mean[:, None]) ** 2, 0.0).sum(axis=-1) / (days - 1))
+        return {
+            '总收益': equity[:, -1] - 1,
+            '年化收益': np.where(days > 0, equity[:, -1] ** (TRADING_DAYS / days) - 1, np.nan),
+            '最大回撤': (equity / np.maximum.accumulate(equity, axis=-1) - 1).min(axis=-1),
+            '年化波动': std * np.sqrt(TRADING_DAYS),
+            '夏普比率': np.where(std > 0, mean / std * np.sqrt(TRADING_DAYS), np.nan),
+        }
+
+
+class BacktestResult:
+    """回测结果：每只股票的仓位和净值、交易明细、统计表和组合净值"""
+
+    def __init__(self, panel, position, equity, trades, stats, portfolio, elapsed_ms):
+        self.panel = panel
+        self.position = position    # (股票数, 日期数) 布尔数组，当天开盘成交后的持仓
+        self.equity = equity        # (股票数, 日期数) 每只股票账户的净值
+        self.trades = trades        # 每笔交易一行
+        self.stats = stats          # 每只股票一行
+        self.portfolio = portfolio  # 每天一行：组合净值、回撤、持仓股票数
+        self.elapsed_ms = elapsed_ms
+
+    def summary(self):
+        """组合的统计指标"""
+        equity = self.portfolio['净值'].to_numpy()[None, :]
+        metrics = performance(equity, np.ones(equity.shape, dtype=bool))
+        trades = len(self.trades)
+        return {
+            'symbols': len(self.panel.codes),
+            'days': len(self.panel.dates),
+            'start': str(self.panel.datetimes()[0]) if len(self.panel.dates) else None,
+            'end': str(self.panel.datetimes()[-1]) if len(self.panel.dates) else None,
+            **{name: round(float(values[0]), 4) for name, values in metrics.items()},
+            '交易次数': trades,
+            '胜率': round(float((self.trades['收益率'] > 0).mean()), 4) if trades else None,
+            '平均持仓股票数': round(float(self.portfolio['持仓数'].mean()), 1),
+            'compute_ms': round(self.elapsed_ms, 1),
+        }
+
+
+def run_backtest(panel, hold, commission=COMMISSION, stamp_tax=STAMP_TAX, slippage=SLIPPAGE):
+    """按信号模拟交易，hold 为策略函数返回的布尔数组
+
+    全部计算都是对整个二维数组的 NumPy 运算，不逐日、逐股票循环：
+    目标仓位后移一天得到开盘时的委托，不可成交（停牌、涨跌停）的位置置为 NaN 后沿日期方向前向填充，
+    就是实际持仓；每天的净值变化 = 隔夜涨跌（昨日持有）× 日内涨跌（今日持有）× 手续费。
+    """
+    start = time.perf_counter()
+    with span('backtest.simulate', symbols=panel.shape[0], days=panel.shape[1]), \
+            np.errstate(divide='ignore', invalid='ignore'):
+        has_bar = ~np.isnan(panel.open)
+        close = panel.filled('close')
+        open_price = np.where(has_bar, panel.open, close)  # 停牌日按前收盘价计，不产生涨跌
+        prev_close = shift(close, np.nan)
+
+        want = shift(np.asarray(hold, dtype=bool), False)  # 收盘信号，下一交易日开盘执行
+        gap = open_price / prev_close - 1
+        limits = price_limits(panel.codes)[:, None] - LIMIT_TOLERANCE
+        executable = has_bar & ~(want & (gap >= limits)) & ~(~want & (gap <= -limits))
+        position = forward_fill(np.where(executable, want, np.nan))
+        position = np.nan_to_num(position, nan=0.0).astype(bool)
+        held = shift(position, False)
+        buys = position & ~held
+        sells = held & ~position
+
+        factor = np.where(held, open_price / prev_close, 1.0) * np.where(position, close / open_price, 1.0)
+        factor *= np.where(buys, 1 - commission - slippage, 1.0)
+        factor *= np.where(sells, 1 - commission - stamp_tax - slippage, 1.0)
+        equity = np.cumprod(factor, axis=-1)
+
+        trades = collect_trades(panel, position, buys, sells, equity)
+        stats = symbol_stats(panel, close, position, equity, trades)
+        portfolio = pd.DataFrame({
+            '日期': panel.datetimes(),
+            '净值': equity.mean(axis=0),
+            '持仓数': position.sum(axis=0),
+        })
+        portfolio.insert(2, '回撤', portfolio['净值'] / portfolio['净值'].cummax() - 1)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return BacktestResult(panel, position, equity, trades, stats, portfolio, elapsed_ms)
+
+
+def collect_trades(panel, position, buys, sells, equity):
+    """配对买入和卖出，期末仍持有的按最后收盘价计算（未平仓）"""
+    entry_rows, entry_cols = np.nonzero(buys)
+    exit_rows, exit_cols = np.nonzero(sells)
+    still_open = np.flatnonzero(position[:, -1])
+    exit_rows = np.concatenate([exit_rows, still_open])
+    exit_cols = np.concatenate([exit_cols, np.full(len(still_open), position.shape[1] - 1)])
+    # 每只股票的买入、卖出按时间交替出现，按 (股票, 日期) 排序后第 i 次买入对应第 i 次卖出
+    order = np.lexsort((exit_cols, exit_rows))
+    exit_rows, exit_cols = exit_rows[order], exit_cols[order]
+    is_open = np.zeros(len(exit_rows), dtype=bool)
+    is_open[len(exit_rows) - len(still_open):] = True
+    is_open = is_open[order]
+
+    entry_value = equity[entry_rows, entry_cols - 1]  # 买入前一天的净值，买入当天第一列必然无仓位
+    exit_value = equity[exit_rows, exit_cols]
+    dates = panel.datetimes()
+    return pd.DataFrame({
+        '代码': np.asarray(panel.codes, dtype=object)[entry_rows],
+        '买入日期': dates[entry_cols],
+        '卖出日期': dates[exit_cols],
+        '持有天数': exit_cols - entry_cols,
+        '收益率': exit_value / entry_value - 1,
+        '未平仓': is_open,
+    })
+
+
+def symbol_stats(panel, close, position, equity, trades):
+    """每只股票的统计表，附买入持有收益作对比"""
+    active = ~np.isnan(close)
+    listed = active.any(axis=-1)
+    first = np.argmax(active, axis=-1)
+    rows = np.arange(len(panel.codes))
+    entries = pd.Index(panel.codes).get_indexer(trades['代码'])
+    trade_count = np.bincount(entries, minlength=len(panel.codes))
+    wins = np.bincount(entries, weights=trades['收益率'].to_numpy() > 0, minlength=len(panel.codes))
+    stats = pd.DataFrame({'代码': panel.codes})
+    for name, values in performance(equity, active).items():
+        stats[name] = values
+    stats['交易次数'] = trade_count
+    stats['胜率'] = np.where(trade_count > 0, wins / np.maximum(trade_count, 1), np.nan)
+    stats['持仓比例'] = position.sum(axis=-1) / np.maximum(active.sum(axis=-1), 1)
+    stats['持有收益'] = np.where(listed, close[:, -1] / close[rows, first] - 1, np.nan)
+    stats['K线数量'] = (~np.isnan(panel.open)).sum(axis=-1)
+    return stats
+
+
+def ensure_history(store, codes, start_date, end_date, concurrency=SOURCE_CONCURRENCY):
+    """把缺少的日K下载到本地仓库（已有的部分不会重新下载），返回 {代码: 错误信息}"""
+    failures = {}
+
+    def fetch(code):
+        store.get_hist(symbol=code, period="daily", adjust="qfq", start_date=start_date, end_date=end_date)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(fetch, code): code for code in codes}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            code = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures[code] = f"{type(e).__name__}: {e}"
+                logger.warning("Error updating K-line data for %s: %s", code, e)
+            if done % 100 == 0:
+                logger.info("Updated %d/%d symbols", done, len(codes))
+    return failures
+
+
+def load_panel(store, codes, start_date, end_date, cache_path=None):
+    """从本地仓库读取前复权日K，对齐为 Panel
+
+    全市场十年的日K有上千万行，从 SQLite 逐行读取需要十几秒；指定 cache_path 时把对齐后的数组保存下来，
+    股票列表、日期范围相同且仓库没有更新过时直接读取缓存，调整策略参数反复回测时不再查询数据库。
+    """
+    key = json.dumps([list(codes), start_date, end_date, store.last_fetched('daily', 'qfq')])
+    with span('backtest.load', symbols=len(codes)) as attrs:
+        panel = Panel.load(cache_path, key) if cache_path else None
+        attrs['cached'] = panel is not None
+        if panel is None:
+            df = store.load_many(codes, 'daily', 'qfq', start_date, end_date, columns=PANEL_COLUMNS)
+            panel = Panel.from_records(df, codes)
+            if cache_path:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                panel.save(cache_path, key)
+    return panel
+
+
+def save_equity_chart(portfolio, path, title):
+    """组合净值与回撤曲线"""
+    figure = Figure(figsize=(12, 6))
+    FigureCanvasAgg(figure)
+    ax_equity, ax_drawdown = figure.subplots(2, 1, sharex=True, gridspec_kw={'height_ratios': [3, 1]})
+    ax_equity.plot(portfolio['日期'], portfolio['净值'], color='tab:red', linewidth=1)
+    ax_equity.axhline(1.0, color='gray', linewidth=0.5)
+    ax_equity.set_title(title)
+    ax_equity.set_ylabel('净值')
+    ax_equity.grid(True, alpha=0.3)
+    ax_drawdown.fill_between(portfolio['日期'], portfolio['回撤'], 0, color='tab:green', alpha=0.4)
+    ax_drawdown.set_ylabel('回撤')
+    ax_drawdown.grid(True, alpha=0.3)
+    figure.tight_layout()
+    figure.savefig(path)
+
+
+def write_results(result, output_dir, run_info, plot=False):
+    """写入统计表、交易明细、组合净值和每只股票的净值曲线"""
+    os.makedirs(output_dir, exist_ok=True)
+    # utf-8-sig 便于用 Excel 直接打开
+    for name, df in (('stats.csv', result.stats), ('trades.csv', result.trades), ('equity.csv', result.portfolio)):
+        df.to_csv(os.path.join(output_dir, name), index=False, encoding='utf-8-sig', float_format='%.4f')
+    np.savez_compressed(os.path.join(output_dir, 'curves.npz'), codes=np.asarray(result.panel.codes),
+                        dates=result.panel.datetimes(), equity=result.equity.astype(np.float32),
+                        position=result.position)
+    with open(os.path.join(output_dir, 'run.json'), 'w', encoding='utf-8') as f:
+        json.dump(run_info, f, ensure_ascii=False, indent=2)
+    if plot:
+        save_equity_chart(result.portfolio, os.path.join(output_dir, 'equity.png'), run_info['strategy'])
+
+
+def parse_params(items):
+    """把 ['fast=5', 'slow=20'] 转换为参数字典，数值按 JSON 解析"""
+    params = {}
+    for item in items or []:
+        name, _, value = item.partition('=')
+        try:
+            params[name] = json.loads(value)
+        except ValueError:
+            params[name] = value
+    return params
+
+
+def run(codes, store, output_dir, strategy='ma_cross', params=None, start_date=None, end_date=None,
+        commission=COMMISSION, stamp_tax=STAMP_TAX, slippage=SLIPPAGE, plot=False, cache_path=None):
+    """读取数据、计算信号、模拟交易并写入结果，返回运行信息"""
+    params = params or {}
+    end_date = end_date or datetime.now().strftime('%Y%m%d')
+    start_date = start_date or (datetime.now() - timedelta(days=DEFAULT_YEARS * 365)).strftime('%Y%m%d')
+
+    started = time.perf_counter()
+    panel = load_panel(store, codes, start_date, end_date, cache_path)
+    load_s = time.perf_counter() - started
+    logger.info("Loaded %d symbols x %d days in %.2f s", *panel.shape, load_s)
+
+    started = time.perf_counter()
+    with span('backtest.signals', strategy=strategy), np.errstate(invalid='ignore'):
+        hold = STRATEGIES[strategy](panel, **params)
+    signals_ms = (time.perf_counter() - started) * 1000
+    result = run_backtest(panel, hold, commission, stamp_tax, slippage)
+
+    run_info = {
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'strategy': strategy,
+        'params': params,
+        'start_date': start_date,
+        'end_date': end_date,
+        'commission': commission,
+        'stamp_tax': stamp_tax,
+        'slippage': slippage,
+        **result.summary(),
+        'load_s': round(load_s, 3),
+        'signals_ms': round(signals_ms, 1),
+    }
+    write_results(result, output_dir, run_info, plot)
+    return run_info
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多股票回测")
+    parser.add_argument("--symbols", nargs="*", help="股票代码，默认为本地已缓存日K的全部股票")
+    parser.add_argument("--symbols-file", help="股票代码文件，每行一个代码")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="ma_cross", help="策略")
+    parser.add_argument("--param", action="append", metavar="NAME=VALUE",
+                        help="策略参数，可重复，例如 --param fast=5 --param slow=20")
+    parser.add_argument("--years", type=int, default=DEFAULT_YEARS, help="回测年数")
+    parser.add_argument("--start-date", help="起始日期（YYYYMMDD），指定后忽略 --years")
+    parser.add_argument("--end-date", help="结束日期（YYYYMMDD），默认为今天")
+    parser.add_argument("--commission", type=float, default=COMMISSION, help="佣金费率（买卖双向）")
+    parser.add_argument("--stamp-tax", type=float, default=STAMP_TAX, help="印花税率（仅卖出）")
+    parser.add_argument("--slippage", type=float, default=SLIPPAGE, help="滑点（成交额比例）")
+    parser.add_argument("--update", action="store_true", help="回测前下载缺少的日K数据")
+    parser.add_argument("--source-concurrency", type=int, default=SOURCE_CONCURRENCY,
+                        help="更新数据时同时向数据源发起的请求数上限")
+    parser.add_argument("--plot", action="store_true", help="保存组合净值曲线图 equity.png")
+    parser.add_argument("--no-cache", action="store_true", help=f"不使用对齐后的日K缓存 {PANEL_CACHE_FILENAME}")
+    parser.add_argument("--output-dir", help=f"结果目录，默认为数据目录下的 {BACKTEST_DIRNAME} 目录")
+    parser.add_argument("--data-dir", help=f"K线缓存目录，默认为 {DEFAULT_DATA_DIR}")
+    parser.add_argument("--fake", action="store_true", help="使用本地模拟数据，不访问网络")
+    parser.add_argument("--log-level", default="INFO", help="日志级别")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    if args.fake:
+        provider = FakeProvider()
+        data_dir = args.data_dir or os.path.join(DEFAULT_DATA_DIR, 'fake')
+    else:
+        provider = AkshareProvider()
+        data_dir = args.data_dir or DEFAULT_DATA_DIR
+    calendar = TradingCalendar(provider.tool_trade_date_hist_sina, path=os.path.join(data_dir, CALENDAR_FILENAME))
+    store = KLineStore(provider.stock_zh_a_hist, path=os.path.join(data_dir, DB_FILENAME), calendar=calendar)
+
+    codes = list(args.symbols or [])
+    if args.symbols_file:
+        codes += read_symbols(args.symbols_file)
+    codes = list(dict.fromkeys(codes)) or store.symbols()
+    if not codes:
+        parser.error("No symbols given and no daily K-line data cached; run batch.py or pass --symbols with --update")
+
+    start_date = args.start_date or (datetime.now() - timedelta(days=args.years * 365)).strftime('%Y%m%d')
+    end_date = args.end_date or datetime.now().strftime('%Y%m%d')
+    if args.update:
+        calendar.ensure_current()
+        failures = ensure_history(store, codes, start_date, end_date, args.source_concurrency)
+        if failures:
+            logger.warning("%d symbols failed to update, using cached data only", len(failures))
+
+    info = run(codes, store, args.output_dir or os.path.join(data_dir, BACKTEST_DIRNAME),
+               strategy=args.strategy, params=parse_params(args.param), start_date=start_date, end_date=end_date,
+               commission=args.commission, stamp_tax=args.stamp_tax, slippage=args.slippage, plot=args.plot,
+               cache_path=None if args.no_cache else os.path.join(data_dir, PANEL_CACHE_FILENAME))
+    print(json.dumps(info, ensure_ascii=False, indent=2))
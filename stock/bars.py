@@ -0,0 +1,108 @@
+"""紧凑的K线容器：日期为 int64（自1970-01-01起的天数），开高低收量为 float32 连续数组"""
+import numpy as np
+import pandas as pd
+
+# 字段名与 akshare 列名的对应关系（只保留绘图、指标和提示框用到的列）
+FIELDS = ('open', 'high', 'low', 'close', 'volume', 'pct_change')
+COLUMNS = {
+    'open': '开盘',
+    'high': '最高',
+    'low': '最低',
+    'close': '收盘',
+    'volume': '成交量',
+    'pct_change': '涨跌幅',
+}
+DTYPE = np.float32
+
+
+def to_day_numbers(dates):
+    """日期序列转换为 int64 天数"""
+    return pd.to_datetime(np.asarray(dates)).values.astype('datetime64[D]').astype(np.int64)
+
+
+class BarSeries:
+    """一只股票某个周期的K线
+
+    全部数值字段保存在一个 (字段数, K线数) 的 float32 数组中，每个字段是其中连续的一行；
+    切片（bars[start:end] 或 window）返回共用同一块内存的视图，不复制数据。
+    与 akshare 返回的 DataFrame 相比不保存字符串日期、股票代码和不使用的列，内存占用约为其几分之一。
+    """
+
+    __slots__ = ('dates', 'values')
+
+    def __init__(self, dates, values):
+        self.dates = dates    # int64 天数，升序
+        self.values = values  # float32，形状为 (len(FIELDS), n)
+
+    @classmethod
+    def from_frame(cls, df):
+        """由 ak.stock_zh_a_hist 格式的 DataFrame 创建，缺少的列填 NaN"""
+        n = len(df)
+        values = np.empty((len(FIELDS), n), dtype=DTYPE)
+        for row, field in enumerate(FIELDS):
+            column = COLUMNS[field]
+            values[row] = df[column].to_numpy(dtype=float) if column in df else np.nan
+        dates = to_day_numbers(df['日期']) if n else np.empty(0, dtype=np.int64)
+        return cls(dates, values)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty((len(FIELDS), 0), dtype=DTYPE))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, index):
+        """按下标切片，返回视图"""
+        if not isinstance(index, slice):
+            raise TypeError("BarSeries only supports slicing; use the field arrays for single bars")
+        return BarSeries(self.dates[index], self.values[:, index])
+
+    @property
+    def open(self):
+        return self.values[0]
+
+    @property
+    def high(self):
+        return self.values[1]
+
+    @property
+    def low(self):
+        return self.values[2]
+
+    @property
+    def close(self):
+        return self.values[3]
+
+    @property
+    def volume(self):
+        return self.values[4]
+
+    @property
+    def pct_change(self):
+        return self.values[5]
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + self.values.nbytes
+
+    def datetimes(self):
+        """日期的 datetime64[D] 视图，可直接传给 pandas / matplotlib"""
+        return self.dates.view('datetime64[D]')
+
+    def date_at(self, index):
+        return self.datetimes()[index].astype(object)
+
+    def window(self, start=None, end=None):
+        """日期在 [start, end] 范围内的K线（二分查找），返回视图"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, to_day_numbers([start])[0], side='left'))
+        hi = len(self) if end is None else int(np.searchsorted(self.dates, to_day_numbers([end])[0], side='right'))
+        return self[lo:hi]
+
+    def to_frame(self):
+        """转换回 akshare 列名的 DataFrame（会复制数据）"""
+        df = pd.DataFrame({'日期': self.datetimes().astype(object)})
+        for field in FIELDS:
+            # float32 还原为 float64 后保留4位小数，去掉单精度带来的尾数
+            df[COLUMNS[field]] = getattr(self, field).astype(float).round(4)
+        return df
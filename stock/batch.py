@@ -0,0 +1,277 @@
+"""批量分析（无界面）：多进程处理全市场股票的日K数据，把汇总表写入磁盘
+
+运行: python batch.py                                        分析快照中的全部股票
+      python batch.py --symbols 000001 600000 --workers 2
+      python batch.py --fake --latency 0.05 --output-dir scan  使用模拟数据，结果写入 scan 目录
+
+结果默认写入数据目录下的 batch 目录，界面中的条件选股以其中的 summary.csv 作为均线、近期高低点等参考数据。
+每只股票的结果在完成后立即追加到输出目录的 progress.jsonl，中断后以相同参数重新运行会跳过已完成的股票；
+失败的股票默认也不再重试，加 --retry-failed 重新处理。进度按 (股票代码, 截止日期) 记录，截止日期默认为
+最近一个已收盘的交易日，因此每个交易日收盘后在同一目录重新运行会更新全部股票。汇总表 summary.csv 在每次运行结束（包括中断）时
+由 progress.jsonl 重新生成。
+"""
+import argparse
+import concurrent.futures
+import csv
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from datetime import datetime
+from analysis import HIGH_LOW_WINDOW, range_start_dates, summarize_daily
+from data_provider import AkshareProvider, FakeProvider, to_jsonable
+from kline_store import KLineStore, DEFAULT_DATA_DIR, DB_FILENAME, MARKET_CLOSE_HOUR
+from trading_calendar import TradingCalendar, CALENDAR_FILENAME
+
+logger = logging.getLogger(__name__)
+
+BATCH_DIRNAME = 'batch'  # 数据目录下的默认输出目录
+PROGRESS_FILENAME = 'progress.jsonl'
+SUMMARY_FILENAME = 'summary.csv'
+FAILURES_FILENAME = 'failures.csv'
+RUN_FILENAME = 'run.json'
+BATCH_SIZE = 20          # 每个任务处理的股票数量，减少进程间通信的次数
+SOURCE_CONCURRENCY = 4   # 所有进程合计同时向数据源发起的请求数上限
+FETCH_RETRIES = 2        # 单只股票请求失败后的重试次数
+RETRY_DELAY = 1.0        # 第一次重试前的等待时间（秒），之后每次翻倍
+PENDING_PER_WORKER = 2   # 每个进程最多排队的任务数，中断时只需放弃少量任务
+
+_store = None  # 工作进程内的K线仓库，由 init_worker 创建
+
+
+def make_worker_store(provider_factory, data_dir, source_slots):
+    """在工作进程中创建数据源和K线仓库，数据源请求受跨进程信号量限制"""
+    # Ctrl+C 由主进程处理，工作进程在主进程关闭进程池后退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    provider = provider_factory()
+
+    def fetch(**kwargs):
+        with source_slots:
+            return provider.stock_zh_a_hist(**kwargs)
+
+    # 日历由主进程预先更新到本地文件，这里只读取文件
+    calendar = TradingCalendar(provider.tool_trade_date_hist_sina, path=os.path.join(data_dir, CALENDAR_FILENAME))
+    return KLineStore(fetch, path=os.path.join(data_dir, DB_FILENAME), calendar=calendar)
+
+
+def prepare_calendar(provider_factory, data_dir):
+    """工作进程启动前更新一次日历文件，各进程只读取本地文件；返回日历"""
+    calendar = TradingCalendar(provider_factory().tool_trade_date_hist_sina,
+                               path=os.path.join(data_dir, CALENDAR_FILENAME))
+    calendar.ensure_current()
+    return calendar
+
+
+def latest_completed_day(calendar, now=None):
+    """最近一个已收盘的交易日（YYYYMMDD），盘中运行时不包含当天未完成的K线"""
+    return calendar.latest_close(now or datetime.now(), MARKET_CLOSE_HOUR).strftime('%Y%m%d')
+
+
+def init_worker(provider_factory, data_dir, source_slots):
+    global _store
+    _store = make_worker_store(provider_factory, data_dir, source_slots)
+
+
+def analyze_symbol(code, start_date, end_date, window):
+    delay = RETRY_DELAY
+    for attempt in range(FETCH_RETRIES + 1):
+        try:
+            daily = _store.get_hist(symbol=code, period="daily", adjust="qfq",
+                                    start_date=start_date, end_date=end_date)
+            break
+        except Exception as e:
+            if attempt == FETCH_RETRIES:
+                raise
+            logger.info("Retrying %s after error: %s", code, e)
+            time.sleep(delay)
+            delay *= 2
+    return summarize_daily(code, daily, window)
+
+
+def analyze_batch(codes, start_date, end_date, window):
+    """在工作进程中分析一批股票，单只股票出错不影响其他股票"""
+    rows = []
+    for code in codes:
+        try:
+            row = analyze_symbol(code, start_date, end_date, window)
+            row = {key: to_jsonable(value) for key, value in row.items()}
+            row['status'] = 'ok'
+        except Exception as e:
+            row = {'代码': code, 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+        row['end_date'] = end_date
+        rows.append(row)
+    return rows
+
+
+def load_progress(path):
+    """读取已有结果，返回 {代码: 结果行}；同一代码以最后一行为准，忽略中断时写了一半的行
+
+    结果行的 end_date 为分析时的截止日期，与本次运行不同的结果视为未完成。
+    """
+    results = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(row, dict) and '代码' in row:
+                    results[row['代码']] = row
+    except FileNotFoundError:
+        pass
+    return results
+
+
+def write_csv(path, rows, columns):
+    # utf-8-sig 便于用 Excel 直接打开
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_tables(output_dir, results):
+    """由全部结果生成成功汇总表和失败列表，返回 (成功数, 失败数)"""
+    ok = sorted((row for row in results.values() if row['status'] == 'ok'), key=lambda row: row['代码'])
+    failed = sorted((row for row in results.values() if row['status'] != 'ok'), key=lambda row: row['代码'])
+    columns = []
+    for row in ok:
+        columns.extend(key for key in row if key not in columns and key not in ('status', 'end_date'))
+    write_csv(os.path.join(output_dir, SUMMARY_FILENAME), ok, columns or ['代码'])
+    write_csv(os.path.join(output_dir, FAILURES_FILENAME), failed, ['代码', 'error'])
+    return len(ok), len(failed)
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def run(codes, output_dir, provider_factory, data_dir=DEFAULT_DATA_DIR, workers=None,
+        source_concurrency=SOURCE_CONCURRENCY, batch_size=BATCH_SIZE, start_date=None, end_date=None,
+        window=HIGH_LOW_WINDOW, retry_failed=False):
+    """分析 codes 中截止到 end_date（默认为最近一个已收盘的交易日）尚未完成的股票，返回本次运行的统计信息"""
+    workers = workers or os.cpu_count() or 1
+    start_date = start_date or range_start_dates()['日K']
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(data_dir, exist_ok=True)
+    progress_path = os.path.join(output_dir, PROGRESS_FILENAME)
+
+    calendar = prepare_calendar(provider_factory, data_dir)
+    end_date = end_date or latest_completed_day(calendar)
+
+    results = load_progress(progress_path)
+    todo = [code for code in dict.fromkeys(codes)
+            if code not in results or results[code].get('end_date') != end_date
+            or (retry_failed and results[code]['status'] != 'ok')]
+    logger.info("%d symbols requested, %d already done for %s, %d to process",
+                len(set(codes)), len(set(codes)) - len(todo), end_date, len(todo))
+
+    started = time.time()
+    processed = 0
+    interrupted = False
+    source_slots = multiprocessing.BoundedSemaphore(source_concurrency)
+    batches = iter(list(chunks(todo, batch_size)))
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(provider_factory, data_dir, source_slots))
+    try:
+        with open(progress_path, 'a', encoding='utf-8') as progress:
+            pending = set()
+            while True:
+                # 只保持少量任务排队，中断时不会留下大量已提交的任务
+                while len(pending) < workers * PENDING_PER_WORKER:
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    pending.add(executor.submit(analyze_batch, batch, start_date, end_date, window))
+                if not pending:
+                    break
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    for row in future.result():
+                        results[row['代码']] = row
+                        progress.write(json.dumps(row, ensure_ascii=False) + '\n')
+                        processed += 1
+                    progress.flush()
+                elapsed = time.time() - started
+                logger.info("Processed %d/%d symbols (%.1f/s)", processed, len(todo), processed / max(elapsed, 1e-9))
+    except KeyboardInterrupt:
+        interrupted = True
+        logger.warning("Interrupted after %d symbols, rerun to resume", processed)
+    finally:
+        executor.shutdown(wait=not interrupted, cancel_futures=True)
+
+    elapsed = time.time() - started
+    ok_count, failed_count = write_tables(output_dir, results)
+    stats = {
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'interrupted': interrupted,
+        'start_date': start_date,
+        'end_date': end_date,
+        'window': window,
+        'workers': workers,
+        'source_concurrency': source_concurrency,
+        'requested': len(set(codes)),
+        'processed': processed,
+        'ok': ok_count,
+        'failed': failed_count,
+        'elapsed_s': round(elapsed, 3),
+        'symbols_per_s': round(processed / elapsed, 3) if elapsed > 0 else None,
+    }
+    with open(os.path.join(output_dir, RUN_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+    return stats
+
+
+def read_symbols(path):
+    """读取股票代码文件，每行一个代码，忽略空行和 # 开头的行"""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量分析")
+    parser.add_argument("--symbols", nargs="*", help="股票代码，默认为全市场快照中的全部股票")
+    parser.add_argument("--symbols-file", help="股票代码文件，每行一个代码")
+    parser.add_argument("--output-dir", help=f"结果目录，默认为数据目录下的 {BATCH_DIRNAME} 目录，中断后使用相同目录继续")
+    parser.add_argument("--workers", type=int, help="进程数，默认为CPU核数")
+    parser.add_argument("--source-concurrency", type=int, default=SOURCE_CONCURRENCY,
+                        help="同时向数据源发起的请求数上限（所有进程合计）")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="每个任务处理的股票数量")
+    parser.add_argument("--start-date", help="日K起始日期（YYYYMMDD），默认为两年前")
+    parser.add_argument("--end-date", help="日K截止日期（YYYYMMDD），默认为最近一个已收盘的交易日")
+    parser.add_argument("--window", type=int, default=HIGH_LOW_WINDOW, help="近期高低点的K线数量")
+    parser.add_argument("--retry-failed", action="store_true", help="重新处理之前失败的股票")
+    parser.add_argument("--data-dir", help=f"K线缓存目录，默认为 {DEFAULT_DATA_DIR}")
+    parser.add_argument("--fake", action="store_true", help="使用本地模拟数据，不访问网络")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟数据的请求延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="模拟数据的请求失败概率")
+    parser.add_argument("--log-level", default="INFO", help="日志级别")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(),
+                        format="%(asctime)s %(levelname)s %(name)s [%(processName)s] %(message)s")
+
+    if args.fake:
+        # 工作进程各自创建数据源，这里只传递可序列化的构造函数
+        provider_factory = functools.partial(FakeProvider, latency=args.latency, failure_rate=args.failure_rate)
+        data_dir = args.data_dir or os.path.join(DEFAULT_DATA_DIR, 'fake')
+    else:
+        provider_factory = AkshareProvider
+        data_dir = args.data_dir or DEFAULT_DATA_DIR
+
+    output_dir = args.output_dir or os.path.join(data_dir, BATCH_DIRNAME)
+    codes = list(args.symbols or [])
+    if args.symbols_file:
+        codes += read_symbols(args.symbols_file)
+    if not codes:
+        snapshot = provider_factory().stock_zh_a_spot_em()
+        codes = snapshot['代码'].astype(str).tolist()
+
+    stats = run(codes, output_dir, provider_factory, data_dir, workers=args.workers,
+                source_concurrency=args.source_concurrency, batch_size=args.batch_size,
+                start_date=args.start_date, end_date=args.end_date, window=args.window, retry_failed=args.retry_failed)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
@@ -0,0 +1,666 @@
+"""性能测试（无界面，使用Agg后端，数据来自本地模拟数据源，不访问网络）
+
+运行: python benchmark.py                       运行全部测试
+      python benchmark.py fetch memory          只运行指定的测试
+      python benchmark.py --quick --output results.jsonl
+                                                缩小规模，并把结果追加到 JSON Lines 文件中便于长期对比
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from analysis import history_start_date, iter_k_line_data
+from backtest import Panel, STRATEGIES, run_backtest
+from bars import BarSeries
+from chart_renderer import LEGEND_LOC, CandlestickRenderer, LayerBlitter, to_date_nums
+from data_provider import FakeProvider, RemoteProvider
+from data_service import make_server
+from instrumentation import tracer, format_summary
+from intraday import IntradayChart, SLOTS
+from screener import Screener, Rule, DEFAULT_RULES
+from stock_monitor import StockMonitor
+from symbol_cache import SymbolState
+
+
+def make_sample_frame(n, seed=0):
+    """生成与 ak.stock_zh_a_hist 列名一致的随机日K数据"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=n)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volume = rng.integers(10000, 1000000, n).astype(float)
+    return pd.DataFrame({
+        '日期': dates.date,
+        '开盘': open_.round(2),
+        '收盘': close.round(2),
+        '最高': high.round(2),
+        '最低': low.round(2),
+        '成交量': volume,
+    })
+
+
+def legacy_render(ax1, ax2, df):
+    """旧版逐根K线绘制方式，仅用于对比"""
+    for i in range(len(df)):
+        color = 'red' if df['收盘'].iloc[i] >= df['开盘'].iloc[i] else 'green'
+        ax1.plot([df['日期'].iloc[i], df['日期'].iloc[i]],
+                 [df['最低'].iloc[i], df['最高'].iloc[i]], color=color, linewidth=1)
+        ax1.plot([df['日期'].iloc[i], df['日期'].iloc[i]],
+                 [df['开盘'].iloc[i], df['收盘'].iloc[i]], color=color, linewidth=3)
+        ax2.bar(df['日期'].iloc[i], df['成交量'].iloc[i], color=color, width=0.6)
+
+
+def vectorized_render(ax1, ax2, df):
+    """新版向量化绘制方式"""
+    renderer = CandlestickRenderer(ax1, ax2)
+    renderer.draw(to_date_nums(df['日期']), df['开盘'].values, df['最高'].values,
+                  df['最低'].values, df['收盘'].values, df['成交量'].values)
+
+
+def time_render(render, df, repeat=3):
+    """返回构建图元与完整绘制的最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
+        start = time.perf_counter()
+        render(ax1, ax2, df)
+        fig.canvas.draw()
+        best = min(best, time.perf_counter() - start)
+        plt.close(fig)
+    return best
+
+
+def bench_render(sizes=(250, 1000, 2500, 5000), legacy_limit=2500):
+    """对比旧版循环与向量化绘制在不同K线数量下的耗时"""
+    print(f"{'K线数量':>8} {'旧版(ms)':>10} {'向量化(ms)':>12} {'加速比':>8}")
+    results = []
+    for n in sizes:
+        df = make_sample_frame(n)
+        new = time_render(vectorized_render, df)
+        # 旧版在大数据量下耗时过长，超过上限时跳过
+        old = time_render(legacy_render, df, repeat=1) if n <= legacy_limit else None
+        results.append({'bars': n, 'legacy_ms': old and old * 1000, 'vectorized_ms': new * 1000})
+        old_text = f"{old * 1000:10.1f}" if old else f"{'--':>10}"
+        ratio_text = f"{old / new:8.1f}" if old else f"{'--':>8}"
+        print(f"{n:>8} {old_text} {new * 1000:12.1f} {ratio_text}")
+    return results
+
+
+def zoom_path(x, frames):
+    """生成从全部数据逐步放大到最近一个月、再缩小回全部数据的可见范围序列"""
+    widths = np.geomspace(x[-1] - x[0], 30, frames // 2)
+    widths = np.concatenate([widths, widths[::-1]])
+    return [(x[-1] - width, x[-1]) for width in widths]
+
+
+def bench_zoom(n=1250, frames=60, legacy_frames=5):
+    """滚轮缩放帧耗时：旧版逐根图元 + 完整重绘，对比多级细节绘制 + 完整重绘、多级细节绘制 + 只 blit 数据图层（默认约5年日K）"""
+    df = make_sample_frame(n)
+    x = to_date_nums(df['日期'])
+    arrays = (df['开盘'].values, df['最高'].values, df['最低'].values, df['收盘'].values, df['成交量'].values)
+    path = zoom_path(x, frames)
+
+    def run(setup, frame, count, with_ma=True, blit=False):
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
+        state = setup(ax1, ax2)
+        if with_ma:
+            for period in (5, 10, 20, 30):
+                ax1.plot(x, df['收盘'].rolling(period).mean().values, linewidth=1, label=f'MA{period}')
+            ax1.legend(loc=LEGEND_LOC)
+        ax1.xaxis_date()
+        ax2.xaxis_date()
+        fig.canvas.draw()
+        # blit 时第一帧包含手势开始时的一次完整重绘（保存背景）
+        blitter = LayerBlitter(fig.canvas, state) if blit else None
+        times = []
+        for xmin, xmax in path[:count]:
+            start = time.perf_counter()
+            ax1.set_xlim(xmin, xmax)
+            ax2.set_xlim(xmin, xmax)
+            frame(state, ax1, xmin, xmax)
+            if blitter is None:
+                fig.canvas.draw()
+            elif blitter.active:
+                blitter.frame()
+            else:
+                blitter.begin()
+            times.append(time.perf_counter() - start)
+        if blitter is not None:
+            blitter.end(redraw=False)  # 松开后的完整重绘不计入帧耗时
+        plt.close(fig)
+        return np.array(times) * 1000
+
+    def lod_setup(ax1, ax2):
+        renderer = CandlestickRenderer(ax1, ax2)
+        renderer.set_data(x, *arrays)
+        return renderer
+
+    def lod_frame(renderer, ax1, xmin, xmax):
+        renderer.render(xmin, xmax, ax1.bbox.width)
+
+    # 空白坐标轴的重绘耗时是帧耗时的下限（刻度、标签等）
+    baseline = run(lambda ax1, ax2: None, lambda *args: None, frames, with_ma=False)
+    legacy = run(lambda ax1, ax2: legacy_render(ax1, ax2, df), lambda *args: None, legacy_frames)
+    lod = run(lod_setup, lod_frame, frames)
+    blit = run(lod_setup, lod_frame, frames, blit=True)
+
+    print(f"缩放帧耗时（{n}根K线）")
+    print(f"{'方式':>8} {'平均(ms)':>10} {'P95(ms)':>10} {'帧率':>8}")
+    results = []
+    for name, times in (('空白图表', baseline), ('旧版', legacy), ('多级细节', lod), ('blit', blit)):
+        mean, p95 = times.mean(), np.percentile(times, 95)
+        results.append({'method': name, 'bars': n, 'mean_ms': mean, 'p95_ms': p95, 'fps': 1000 / mean})
+        print(f"{name:>8} {mean:10.1f} {p95:10.1f} {1000 / mean:8.1f}")
+    return results
+
+
+def make_minute_frame(seed=0):
+    """生成与 ak.stock_zh_a_hist_min_em(period='1') 列名一致的一个交易日分钟数据"""
+    rng = np.random.default_rng(seed)
+    day = pd.Timestamp.today().normalize()
+    times = pd.date_range(day + pd.Timedelta('09:30:00'), day + pd.Timedelta('11:30:00'), freq='min').append(
+        pd.date_range(day + pd.Timedelta('13:01:00'), day + pd.Timedelta('15:00:00'), freq='min'))
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.001, len(times))))
+    volume = rng.integers(100, 5000, len(times)).astype(float)
+    return pd.DataFrame({
+        '时间': times.strftime('%Y-%m-%d %H:%M:%S'),
+        '开盘': close,
+        '收盘': close,
+        '最高': close,
+        '最低': close,
+        '成交量': volume,
+        '成交额': volume * 100 * close,
+        '均价': np.cumsum(volume * close) / np.cumsum(volume),
+    })
+
+
+def bench_intraday():
+    """模拟一个交易日的分时刷新：每分钟一次增量更新，对比每次完整重绘"""
+    df = make_minute_frame()
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
+    chart = IntradayChart(ax1, ax2, fig.canvas)
+    fig.canvas.draw_idle = fig.canvas.draw  # Agg 后端下立即完成完整重绘
+    chart.setup('分时')
+    full_draws = []
+    fig.canvas.mpl_connect('draw_event', lambda event: full_draws.append(1))
+    times = []
+    for i in range(1, len(df) + 1):
+        start = time.perf_counter()
+        chart.update(df.iloc[:i])
+        times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    fig.canvas.draw()
+    full = time.perf_counter() - start
+    plt.close(fig)
+
+    times = np.array(times) * 1000
+    print(f"分时刷新（{SLOTS}次更新）")
+    print(f"增量更新平均 {times.mean():.1f} ms，P95 {np.percentile(times, 95):.1f} ms，"
+          f"其中完整重绘 {len(full_draws)} 次；单次完整重绘 {full * 1000:.1f} ms")
+    return {'updates': SLOTS, 'mean_ms': times.mean(), 'p95_ms': np.percentile(times, 95),
+            'full_draws': len(full_draws), 'full_draw_ms': full * 1000}
+
+
+def summarize(times_ms):
+    """耗时样本（毫秒）的统计值"""
+    times_ms = np.asarray(times_ms, dtype=float)
+    if len(times_ms) == 0:
+        return {'count': 0}
+    return {
+        'count': len(times_ms),
+        'mean_ms': float(times_ms.mean()),
+        'p50_ms': float(np.percentile(times_ms, 50)),
+        'p95_ms': float(np.percentile(times_ms, 95)),
+        'max_ms': float(times_ms.max()),
+    }
+
+
+class HeadlessRoot:
+    """代替 tk.Tk 的定时器：after 只登记回调，由 run_pending 手动执行"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.next_id = 0
+
+    def after(self, ms, func, *args):
+        self.next_id += 1
+        self.jobs[self.next_id] = (func, args)
+        return self.next_id
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run_pending(self):
+        jobs, self.jobs = self.jobs, {}
+        for func, args in jobs.values():
+            func(*args)
+
+
+class Value:
+    """代替 tk 变量和输入框的 get()"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class HeadlessLabel:
+    """代替 ttk.Label，忽略显示内容"""
+
+    def config(self, **kwargs):
+        pass
+
+
+class HeadlessTooltip:
+    """代替 TkTooltip，只保存提示框文字"""
+
+    def __init__(self):
+        self.text = None
+
+    def show(self, text, x, y, left):
+        self.text = text
+
+    def hide(self):
+        self.text = None
+
+
+def make_headless_monitor(provider, data_dir):
+    """创建不依赖 Tk 窗口的 StockMonitor，图表绘制在 Agg 画布上"""
+    monitor = StockMonitor.__new__(StockMonitor)
+    monitor.root = HeadlessRoot()
+    monitor.k_type = Value("日K")
+    monitor.show_ma = Value(True)
+    monitor.daily_range, monitor.weekly_range, monitor.monthly_range = Value("24"), Value("10"), Value("20")
+    monitor.info_labels = defaultdict(HeadlessLabel)
+    monitor.fig, (monitor.ax1, monitor.ax2) = plt.subplots(2, 1, gridspec_kw={'height_ratios': [3, 1]},
+                                                           figsize=(12, 8))
+    monitor.canvas = monitor.fig.canvas
+    monitor.init_chart_state()
+    monitor.crosshair.tooltip = HeadlessTooltip()
+    monitor.init_services(provider, data_dir)
+    monitor.watchlist_panel = None
+    return monitor
+
+
+def close_monitor(monitor):
+    monitor.executor.shutdown(wait=True)
+    monitor.prefetch_executor.shutdown(wait=True)
+    monitor.market_snapshot.shutdown()
+    monitor.quote_fetcher.shutdown()
+    monitor.watchlist.shutdown()
+    monitor.kline_store.conn.close()
+    plt.close(monitor.fig)
+
+
+def drain_ui_queue(monitor):
+    """取出后台线程送回的结果，返回 [回调函数名]"""
+    names = []
+    while not monitor.ui_queue.empty():
+        _, callback, _ = monitor.ui_queue.get_nowait()
+        names.append(callback.__name__)
+    return names
+
+
+def bench_fetch(symbols=20, latency=0.05, failure_rate=0.05):
+    """查询流程耗时：fetch_all_k_line_data（首次下载 / 本地缓存）、update_stock_info（对冲请求），
+    以及切换回内存缓存中的股票直到图表绘制完成"""
+    provider = FakeProvider(latency=latency, jitter=0.5, failure_rate=failure_rate)
+    codes = provider.symbols()[:symbols]
+    with tempfile.TemporaryDirectory() as data_dir:
+        monitor = make_headless_monitor(provider, data_dir)
+        start_dates = monitor.get_range_start_dates()
+        generation = monitor.query_generation
+        stages = {'k_line_cold': [], 'k_line_warm': [], 'stock_info': [], 'switch_cached': []}
+        states = {}
+        errors = 0
+        for stage in ('k_line_cold', 'k_line_warm'):
+            for code in codes:
+                states[code] = SymbolState(code, start_dates)
+                start = time.perf_counter()
+                monitor.fetch_all_k_line_data(code, start_dates, generation, states[code])
+                stages[stage].append((time.perf_counter() - start) * 1000)
+                errors += drain_ui_queue(monitor).count('show_error')
+        for code in codes:
+            start = time.perf_counter()
+            monitor.update_stock_info(code, generation, states[code])
+            stages['stock_info'].append((time.perf_counter() - start) * 1000)
+            errors += drain_ui_queue(monitor).count('show_error')
+
+        # 切换回已缓存的股票：不发起任何请求，耗时主要是图表绘制
+        calls_before = sum(provider.calls.values())
+        for code in codes:
+            monitor.stock_code = Value(code)
+            start = time.perf_counter()
+            monitor.query_stock()
+            monitor.root.run_pending()
+            stages['switch_cached'].append((time.perf_counter() - start) * 1000)
+        switch_calls = sum(provider.calls.values()) - calls_before
+        cache_stats = monitor.symbol_cache.stats()
+        source_stats = monitor.quote_fetcher.summary()
+        close_monitor(monitor)
+
+    print(f"查询流程耗时（{symbols}只股票，模拟延迟 {latency * 1000:.0f} ms，失败率 {failure_rate:.0%}）")
+    print(f"{'阶段':>12} {'平均(ms)':>10} {'P50(ms)':>10} {'P95(ms)':>10} {'最大(ms)':>10}")
+    results = {'symbols': symbols, 'latency_ms': latency * 1000, 'failure_rate': failure_rate,
+               'errors': errors, 'calls': dict(provider.calls), 'switch_calls': switch_calls,
+               'cache': cache_stats, 'quote_sources': source_stats}
+    for stage, times in stages.items():
+        stats = summarize(times)
+        results[stage] = stats
+        print(f"{stage:>12} {stats['mean_ms']:10.1f} {stats['p50_ms']:10.1f} {stats['p95_ms']:10.1f} {stats['max_ms']:10.1f}")
+    print(f"失败 {errors} 次，请求次数 {dict(provider.calls)}，切换缓存股票时请求 {switch_calls} 次")
+    for name, stats in source_stats.items():
+        latency = f"P50 {stats['p50'] * 1000:.0f} ms，P90 {stats['p90'] * 1000:.0f} ms" if stats['count'] else "未请求"
+        print(f"行情数据源 {name}：胜出 {stats['wins']} 次，失败 {stats['failures']} 次，"
+              f"超时 {stats['timeouts']} 次，{latency}")
+    print(f"股票缓存 {cache_stats['symbols']} 只，占用 {cache_stats['bytes'] / 1024 / 1024:.1f} MB，"
+          f"命中 {cache_stats['hits']} 次")
+    return results
+
+
+def bench_display(sizes=(250, 1000, 2500, 5000), scroll_frames=20):
+    """update_chart_display 耗时与K线数量的关系，以及 on_scroll 触发的每帧耗时"""
+    provider = FakeProvider()
+    results = []
+    print(f"{'K线数量':>8} {'绘制(ms)':>10} {'滚轮帧平均(ms)':>16} {'滚轮帧P95(ms)':>14}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        monitor = make_headless_monitor(provider, data_dir)
+        monitor.has_queried = True
+        for n in sizes:
+            bars = BarSeries.from_frame(provider.history('000001').tail(n))
+            monitor.data_version += 1
+            monitor.k_line_versions['日K'] = monitor.data_version
+            start = time.perf_counter()
+            monitor.update_chart_display(bars, '日K')
+            display = (time.perf_counter() - start) * 1000
+
+            # 每帧一次滚轮事件，先放大再缩小；合并的缩放在 run_pending 中执行并重绘
+            xmin, xmax = monitor.ax1.get_xlim()
+            center = (xmin + xmax) / 2
+            frames = []
+            for i in range(scroll_frames):
+                button = 'up' if i < scroll_frames // 2 else 'down'
+                start = time.perf_counter()
+                monitor.on_scroll(SimpleNamespace(inaxes=monitor.ax1, button=button, xdata=center))
+                monitor.root.run_pending()
+                frames.append((time.perf_counter() - start) * 1000)
+            stats = summarize(frames)
+            results.append({'bars': n, 'display_ms': display, 'scroll': stats})
+            print(f"{n:>8} {display:10.1f} {stats['mean_ms']:16.1f} {stats['p95_ms']:14.1f}")
+        close_monitor(monitor)
+    return results
+
+
+def bench_crosshair(sizes=(250, 1000, 2500, 5000), moves=200):
+    """鼠标在K线图上移动时十字光标每次更新的耗时（blit 光标线并生成提示框文字），与一次完整重绘对比"""
+    provider = FakeProvider()
+    results = []
+    print(f"{'K线数量':>8} {'完整重绘(ms)':>14} {'光标平均(ms)':>14} {'光标P95(ms)':>13}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        monitor = make_headless_monitor(provider, data_dir)
+        for n in sizes:
+            bars = BarSeries.from_frame(provider.history('000001').tail(n))
+            monitor.data_version += 1
+            monitor.k_line_versions['日K'] = monitor.data_version
+            monitor.update_chart_display(bars, '日K')
+            start = time.perf_counter()
+            monitor.canvas.draw()
+            full = (time.perf_counter() - start) * 1000
+
+            # 从左到右扫过全部K线，价格图和成交量图交替
+            xmin, xmax = monitor.ax1.get_xlim()
+            ymin, ymax = monitor.ax1.get_ylim()
+            times = []
+            for i, xdata in enumerate(np.linspace(xmin, xmax, moves)):
+                ax = monitor.ax1 if i % 4 else monitor.ax2
+                event = SimpleNamespace(inaxes=ax, xdata=xdata, ydata=(ymin + ymax) / 2 if ax is monitor.ax1 else 0)
+                start = time.perf_counter()
+                monitor.on_mouse_move(event)
+                monitor.root.run_pending()
+                times.append((time.perf_counter() - start) * 1000)
+            stats = summarize(times)
+            results.append({'bars': n, 'full_draw_ms': full, 'move': stats})
+            print(f"{n:>8} {full:14.1f} {stats['mean_ms']:14.2f} {stats['p95_ms']:13.2f}")
+        close_monitor(monitor)
+    return results
+
+
+def bench_memory(symbols=20):
+    """每只已加载股票占用的内存：日K、周K、月K数据（BarSeries）和指标缓存，并与 DataFrame 对比"""
+    provider = FakeProvider()
+    codes = provider.symbols()[:symbols]
+    with tempfile.TemporaryDirectory() as data_dir:
+        monitor = make_headless_monitor(provider, data_dir)
+        start_dates = monitor.get_range_start_dates()
+        # 先下载到本地仓库，只统计加载后常驻内存的数据
+        for code in codes:
+            monitor.kline_store.get_hist(symbol=code, period="daily", adjust="qfq",
+                                         start_date=history_start_date(start_dates))
+        loaded = {}
+        bars = 0
+        frame_bytes = 0
+        series_bytes = 0
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for code in codes:
+            daily = monitor.kline_store.get_hist(symbol=code, period="daily", adjust="qfq",
+                                                 start_date=history_start_date(start_dates))
+            series = {}
+            for k_type, df in iter_k_line_data(daily, start_dates):
+                # 与界面相同，只保留 BarSeries，DataFrame 用完即释放
+                frame_bytes += int(df.memory_usage(deep=True).sum())
+                series[k_type] = BarSeries.from_frame(df)
+            del daily, df
+            for k_type, kbars in series.items():
+                monitor.indicator_engine.compute((code, k_type), 1, kbars.high, kbars.low, kbars.close, kbars.volume)
+                bars += len(kbars)
+                series_bytes += kbars.nbytes
+            loaded[code] = series
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        close_monitor(monitor)
+
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    result = {
+        'symbols': symbols,
+        'bars_per_symbol': bars / symbols,
+        'bytes_per_symbol': total / symbols,
+        'frame_bytes_per_symbol': frame_bytes / symbols,
+        'series_bytes_per_symbol': series_bytes / symbols,
+        'bytes_per_bar': total / bars,
+    }
+    print(f"内存占用（{symbols}只股票，每只 {bars / symbols:.0f} 根K线，含周K、月K和指标缓存）")
+    print(f"每只股票 {total / symbols / 1024:.1f} KB（其中K线 {series_bytes / symbols / 1024:.1f} KB，"
+          f"保存为 DataFrame 时为 {frame_bytes / symbols / 1024:.1f} KB），每根K线 {total / bars:.0f} 字节")
+    return result
+
+
+def make_reference(snapshot, window=250, seed=0):
+    """由快照生成模拟的批量分析汇总表（上一收盘价、MA20、近期高低点）"""
+    rng = np.random.default_rng(seed)
+    close = snapshot['昨收'].to_numpy(dtype=float)
+    n = len(close)
+    return pd.DataFrame({
+        '收盘': close,
+        'MA20': close * (1 + rng.normal(0, 0.03, n)),
+        f'{window}日最高': close * rng.uniform(1.0, 1.5, n),
+        f'{window}日最低': close * rng.uniform(0.5, 1.0, n),
+    }, index=snapshot['代码'].to_numpy())
+
+
+def bench_screener(repeats=50):
+    """全市场快照上计算全部选股条件的耗时"""
+    snapshot = FakeProvider().stock_zh_a_spot_em()
+    screener = Screener([Rule.from_dict(rule) for rule in DEFAULT_RULES], make_reference(snapshot))
+    times = []
+    for _ in range(repeats):
+        result, alerts, elapsed = screener.evaluate(snapshot)
+        times.append(elapsed)
+    stats = summarize(times)
+    print(f"条件选股（{len(snapshot)}只股票，{len(screener.rules)}个条件）：平均 {stats['mean_ms']:.2f} ms，"
+          f"P95 {stats['p95_ms']:.2f} ms，命中 {len(result)} 只")
+    return {'rows': len(snapshot), 'rules': len(screener.rules), 'hits': len(result), **stats}
+
+
+def make_panel(symbols, days, seed=0):
+    """模拟的 股票×日期 日K面板：随机游走，部分股票中途上市，约1%的停牌日"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (symbols, days)), axis=1))
+    open_price = close * np.exp(rng.normal(0, 0.005, (symbols, days)))
+    missing = rng.random((symbols, days)) < 0.01
+    missing |= np.arange(days) < rng.integers(0, days // 2, symbols)[:, None] * (rng.random(symbols) < 0.2)[:, None]
+    close[missing] = np.nan
+    open_price[missing] = np.nan
+    values = {'open': open_price, 'high': np.fmax(open_price, close), 'low': np.fmin(open_price, close), 'close': close}
+    return Panel([f'{i:06d}' for i in range(symbols)], np.arange(days, dtype=np.int64) + 16000, values)
+
+
+def bench_backtest(symbols=3000, days=2500):
+    """全部策略在模拟面板上的回测耗时（不含读取数据）"""
+    panel = make_panel(symbols, days)
+    result = {'symbols': symbols, 'days': days}
+    for name, strategy in STRATEGIES.items():
+        start = time.perf_counter()
+        with np.errstate(invalid='ignore'):
+            hold = strategy(panel)
+        signals_ms = (time.perf_counter() - start) * 1000
+        backtest = run_backtest(panel, hold)
+        total_ms = signals_ms + backtest.elapsed_ms
+        result[name] = {'signals_ms': round(signals_ms, 1), 'simulate_ms': round(backtest.elapsed_ms, 1),
+                        'trades': len(backtest.trades)}
+        print(f"{name:12s} 信号 {signals_ms:7.1f} ms  模拟 {backtest.elapsed_ms:7.1f} ms  "
+              f"合计 {total_ms / 1000:.2f} s  交易 {len(backtest.trades)} 笔")
+    print(f"{symbols}只股票 × {days}个交易日")
+    return result
+
+
+def bench_service(clients=10, symbols=5, latency=0.2):
+    """本地数据服务：多个客户端同时请求同一只股票时的耗时与上游请求次数"""
+    provider = FakeProvider(latency=latency)
+    codes = provider.symbols()[:symbols]
+    with tempfile.TemporaryDirectory() as data_dir:
+        server = make_server(provider, data_dir, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://%s:%d' % server.server_address[:2]
+        remotes = [RemoteProvider(url) for _ in range(clients)]
+
+        def burst(request):
+            """所有客户端同时发出同一个请求，返回全部完成的耗时（毫秒）"""
+            barrier = threading.Barrier(clients)
+
+            def client(remote):
+                barrier.wait()
+                request(remote)
+            threads = [threading.Thread(target=client, args=(remote,)) for remote in remotes]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return (time.perf_counter() - start) * 1000
+
+        stages = {'hist_cold': [], 'hist_warm': [], 'spot': []}
+        for stage in ('hist_cold', 'hist_warm'):
+            for code in codes:
+                stages[stage].append(burst(lambda remote: remote.stock_zh_a_hist(code, 'daily', '20200101',
+                                                                                 adjust='qfq')))
+        for _ in range(3):
+            stages['spot'].append(burst(lambda remote: remote.stock_zh_a_spot_em()))
+        service_stats = remotes[0].stats()
+        server.shutdown()
+        server.server_close()
+        server.service.shutdown()
+
+    print(f"本地数据服务（{clients}个客户端同时请求，{symbols}只股票，模拟延迟 {latency * 1000:.0f} ms）")
+    print(f"{'阶段':>12} {'平均(ms)':>10} {'最大(ms)':>10}")
+    results = {'clients': clients, 'symbols': symbols, 'latency_ms': latency * 1000,
+               'requests': service_stats['requests'], 'upstream': service_stats['upstream']}
+    for stage, times in stages.items():
+        stats = summarize(times)
+        results[stage] = stats
+        print(f"{stage:>12} {stats['mean_ms']:10.1f} {stats['max_ms']:10.1f}")
+    print(f"服务收到请求 {service_stats['requests']}，上游请求 {service_stats['upstream']}")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+BENCHMARKS = {
+    'fetch': (bench_fetch, {'symbols': 5}),
+    'render': (bench_render, {'sizes': (250, 1000), 'legacy_limit': 250}),
+    'display': (bench_display, {'sizes': (250, 1000), 'scroll_frames': 6}),
+    'zoom': (bench_zoom, {'frames': 10, 'legacy_frames': 2}),
+    'crosshair': (bench_crosshair, {'sizes': (250, 5000), 'moves': 50}),
+    'intraday': (bench_intraday, {}),
+    'memory': (bench_memory, {'symbols': 5}),
+    'screener': (bench_screener, {'repeats': 10}),
+    'backtest': (bench_backtest, {'symbols': 500}),
+    'service': (bench_service, {'symbols': 2}),
+}  # 名称 -> (测试函数, --quick 时使用的参数)
+
+
+def run_suite(names=None, quick=False):
+    """运行指定的测试，返回包含运行环境信息的结果字典，stages 为每项测试中各阶段的耗时统计"""
+    results = {}
+    stages = {}
+    for name in names or BENCHMARKS:
+        func, quick_kwargs = BENCHMARKS[name]
+        print(f"== {name} ==")
+        tracer.reset()
+        results[name] = func(**(quick_kwargs if quick else {}))
+        stages[name] = tracer.summary()
+        if stages[name]:
+            print(format_summary(stages[name]))
+        print()
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'quick': quick,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+        'machine': platform.machine(),
+        'results': results,
+        'stages': stages,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="性能测试")
+    parser.add_argument("names", nargs="*", help=f"要运行的测试（{', '.join(BENCHMARKS)}），默认全部")
+    parser.add_argument("--quick", action="store_true", help="缩小测试规模")
+    parser.add_argument("--output", help="把结果追加到该 JSON Lines 文件")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的测试: {', '.join(unknown)}")
+
+    report = run_suite(args.names, args.quick)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report, ensure_ascii=False, default=float) + '\n')
+        print(f"结果已追加到 {args.output}")
@@ -0,0 +1,216 @@
+"""图表导出（无界面）：多进程把K线图批量保存为 PNG / SVG，绘图与界面共用 draw_k_line_chart
+
+运行: python chart_export.py                                  导出自选股的日K图
+      python chart_export.py --symbols 000001 600000 --k-types 日K 周K --format svg
+      python chart_export.py --symbols-file codes.txt --workers 4 --output-dir report
+
+每个工作进程只创建一个 Figure（Agg 画布，不经过 pyplot），之后的每张图都清空坐标轴后重新绘制。
+图表按数据截止日期（默认为最近一个已收盘的交易日）保存在输出目录下的 YYYYMMDD 子目录中，
+同一截止日期下已存在的图表会被跳过，中断后重新运行即可继续；加 --overwrite 重新导出。
+"""
+import argparse
+import concurrent.futures
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import time
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from analysis import history_start_date, iter_k_line_data, range_start_dates
+from bars import BarSeries
+from batch import (chunks, latest_completed_day, make_worker_store, prepare_calendar, read_symbols,
+                   SOURCE_CONCURRENCY, PENDING_PER_WORKER)
+from chart_renderer import CandlestickRenderer, draw_k_line_chart
+from data_provider import AkshareProvider, FakeProvider
+from indicators import IndicatorSet
+from kline_store import DEFAULT_DATA_DIR
+
+matplotlib.rcParams['font.sans-serif'] = ['SimHei']  # 设置中文字体
+matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+
+logger = logging.getLogger(__name__)
+
+CHARTS_DIRNAME = 'charts'        # 数据目录下的默认输出目录
+K_TYPE_NAMES = {'日K': 'daily', '周K': 'weekly', '月K': 'monthly'}  # 文件名中使用的周期名称
+FORMATS = ('png', 'svg')
+FIGURE_SIZE = (12, 8)            # 与界面图表相同（英寸）
+DPI = 100
+BATCH_SIZE = 10                  # 每个任务导出的股票数量
+
+_store = None     # 工作进程内的K线仓库
+_figure = None    # 工作进程内复用的 Figure
+_renderer = None
+
+
+def init_worker(provider_factory, data_dir, source_slots, figsize, dpi):
+    """工作进程初始化：创建K线仓库和一个复用的 Figure"""
+    global _store, _figure, _renderer
+    _store = make_worker_store(provider_factory, data_dir, source_slots)
+    _figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(_figure)
+    ax_price, ax_volume = _figure.subplots(2, 1, gridspec_kw={'height_ratios': [3, 1]})
+    _renderer = CandlestickRenderer(ax_price, ax_volume)
+
+
+def chart_path(output_dir, code, k_type, fmt):
+    return os.path.join(output_dir, f"{code}_{K_TYPE_NAMES[k_type]}.{fmt}")
+
+
+def export_symbol(code, k_types, start_dates, end_date, output_dir, fmt):
+    """导出一只股票的各周期图表，返回文件路径列表"""
+    start_dates = {k_type: start_dates[k_type] for k_type in k_types}
+    daily = _store.get_hist(symbol=code, period="daily", adjust="qfq",
+                            start_date=history_start_date(start_dates), end_date=end_date)
+    paths = []
+    for k_type, df in iter_k_line_data(daily, start_dates):
+        bars = BarSeries.from_frame(df)
+        indicators = IndicatorSet(bars.high, bars.low, bars.close, bars.volume)
+        draw_k_line_chart(_renderer, bars, indicators, k_type, pixel_width=_renderer.ax_price.bbox.width,
+                          title=f'{code} {k_type}价格走势')
+        _figure.tight_layout()
+        # 先写临时文件再改名，中断时不会留下不完整的图片
+        path = chart_path(output_dir, code, k_type, fmt)
+        temp_path = f"{path}.tmp"
+        _figure.savefig(temp_path, format=fmt)
+        os.replace(temp_path, path)
+        paths.append(path)
+    return paths
+
+
+def export_batch(codes, k_types, start_dates, end_date, output_dir, fmt):
+    """在工作进程中导出一批股票，返回 [(代码, 文件数, 错误信息)]"""
+    results = []
+    for code in codes:
+        try:
+            results.append((code, len(export_symbol(code, k_types, start_dates, end_date, output_dir, fmt)), None))
+        except Exception as e:
+            results.append((code, 0, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def run_export(codes, output_dir, provider_factory, data_dir=DEFAULT_DATA_DIR, k_types=('日K',), fmt='png',
+               workers=None, source_concurrency=SOURCE_CONCURRENCY, batch_size=BATCH_SIZE,
+               start_dates=None, end_date=None, figsize=FIGURE_SIZE, dpi=DPI, overwrite=False):
+    """多进程导出截止到 end_date（默认为最近一个已收盘的交易日）的图表，保存在 output_dir/YYYYMMDD，返回统计信息"""
+    workers = workers or os.cpu_count() or 1
+    start_dates = start_dates or range_start_dates()
+    os.makedirs(data_dir, exist_ok=True)
+    calendar = prepare_calendar(provider_factory, data_dir)
+    end_date = end_date or latest_completed_day(calendar)
+    output_dir = os.path.join(output_dir, end_date)
+    os.makedirs(output_dir, exist_ok=True)
+
+    codes = list(dict.fromkeys(codes))
+    todo = [code for code in codes if overwrite or not all(
+        os.path.exists(chart_path(output_dir, code, k_type, fmt)) for k_type in k_types)]
+    logger.info("%d symbols requested, %d already exported to %s, %d to export",
+                len(codes), len(codes) - len(todo), output_dir, len(todo))
+
+    started = time.time()
+    charts = 0
+    failures = {}
+    interrupted = False
+    source_slots = multiprocessing.BoundedSemaphore(source_concurrency)
+    batches = iter(list(chunks(todo, batch_size)))
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker,
+        initargs=(provider_factory, data_dir, source_slots, figsize, dpi))
+    try:
+        pending = set()
+        while True:
+            while len(pending) < workers * PENDING_PER_WORKER:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                pending.add(executor.submit(export_batch, batch, k_types, start_dates, end_date, output_dir, fmt))
+            if not pending:
+                break
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                for code, count, error in future.result():
+                    charts += count
+                    if error is not None:
+                        failures[code] = error
+                        logger.warning("Error exporting charts for %s: %s", code, error)
+            elapsed = time.time() - started
+            logger.info("Exported %d charts (%.0f/min)", charts, charts / max(elapsed, 1e-9) * 60)
+    except KeyboardInterrupt:
+        interrupted = True
+        logger.warning("Interrupted after %d charts, rerun to resume", charts)
+    finally:
+        executor.shutdown(wait=not interrupted, cancel_futures=True)
+
+    elapsed = time.time() - started
+    return {
+        'interrupted': interrupted,
+        'end_date': end_date,
+        'output_dir': output_dir,
+        'symbols': len(todo),
+        'charts': charts,
+        'failed': failures,
+        'workers': workers,
+        'format': fmt,
+        'elapsed_s': round(elapsed, 3),
+        'charts_per_min': round(charts / elapsed * 60, 1) if elapsed > 0 else None,
+    }
+
+
+def load_watchlist(data_dir):
+    # watchlist 模块依赖 tkinter，只在未指定股票时导入，服务器上导出指定股票不需要 Tk
+    from watchlist import WATCHLIST_FILENAME
+    try:
+        with open(os.path.join(data_dir, WATCHLIST_FILENAME), encoding='utf-8') as f:
+            return list(json.load(f))
+    except FileNotFoundError:
+        return []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="图表导出")
+    parser.add_argument("--symbols", nargs="*", help="股票代码，默认为自选股")
+    parser.add_argument("--symbols-file", help="股票代码文件，每行一个代码")
+    parser.add_argument("--k-types", nargs="+", default=["日K"], help=f"K线类型（{'、'.join(K_TYPE_NAMES)}）")
+    parser.add_argument("--format", choices=FORMATS, default="png", help="图片格式")
+    parser.add_argument("--output-dir", help=f"输出目录，默认为数据目录下的 {CHARTS_DIRNAME} 目录（图表保存在截止日期子目录中）")
+    parser.add_argument("--end-date", help="数据截止日期（YYYYMMDD），默认为最近一个已收盘的交易日")
+    parser.add_argument("--workers", type=int, help="进程数，默认为CPU核数")
+    parser.add_argument("--source-concurrency", type=int, default=SOURCE_CONCURRENCY,
+                        help="同时向数据源发起的请求数上限（所有进程合计）")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="每个任务导出的股票数量")
+    parser.add_argument("--dpi", type=int, default=DPI, help="PNG 分辨率")
+    parser.add_argument("--overwrite", action="store_true", help="重新导出已存在的图表")
+    parser.add_argument("--data-dir", help=f"K线缓存目录，默认为 {DEFAULT_DATA_DIR}")
+    parser.add_argument("--fake", action="store_true", help="使用本地模拟数据，不访问网络")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟数据的请求延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="模拟数据的请求失败概率")
+    parser.add_argument("--log-level", default="INFO", help="日志级别")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(),
+                        format="%(asctime)s %(levelname)s %(name)s [%(processName)s] %(message)s")
+    unknown = [k_type for k_type in args.k_types if k_type not in K_TYPE_NAMES]
+    if unknown:
+        parser.error(f"Unknown K-line type: {', '.join(unknown)}")
+
+    if args.fake:
+        provider_factory = functools.partial(FakeProvider, latency=args.latency, failure_rate=args.failure_rate)
+        data_dir = args.data_dir or os.path.join(DEFAULT_DATA_DIR, 'fake')
+    else:
+        provider_factory = AkshareProvider
+        data_dir = args.data_dir or DEFAULT_DATA_DIR
+
+    codes = list(args.symbols or [])
+    if args.symbols_file:
+        codes += read_symbols(args.symbols_file)
+    if not codes:
+        codes = load_watchlist(data_dir)
+    if not codes:
+        parser.error("No symbols given and the watchlist is empty")
+
+    stats = run_export(codes, args.output_dir or os.path.join(data_dir, CHARTS_DIRNAME), provider_factory, data_dir,
+                       k_types=tuple(args.k_types), fmt=args.format, workers=args.workers,
+                       source_concurrency=args.source_concurrency, batch_size=args.batch_size,
+                       end_date=args.end_date, dpi=args.dpi, overwrite=args.overwrite)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
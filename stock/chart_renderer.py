@@ -0,0 +1,322 @@
+"""K线与成交量的向量化绘制"""
+import numpy as np
+import pandas as pd
+import matplotlib.dates as mdates
+from matplotlib.patches import PathPatch
+from matplotlib.path import Path
+from analysis import find_extremes
+from indicators import MA_PERIODS
+from instrumentation import traced
+
+UP_COLOR = 'red'      # 上涨为红色
+DOWN_COLOR = 'green'  # 下跌为绿色
+PIXELS_PER_BAR = 1    # 缩小时每根K线至少占用的像素列数，超过时合并K线
+MA_COLORS = ('gray', 'purple', 'yellow', 'blue')  # 5日、10日、20日、30日均线颜色
+LEGEND_LOC = 'upper left'  # 固定图例位置；'best' 每次重绘都要遍历全部数据点，占缩放帧耗时的大部分
+
+
+def to_date_nums(dates):
+    """将日期序列转换为matplotlib使用的浮点天数"""
+    return mdates.date2num(pd.to_datetime(np.asarray(dates)))
+
+
+def bar_width(x, ratio=0.6):
+    """根据相邻K线间距计算实体宽度"""
+    if len(x) < 2:
+        return ratio
+    return float(np.min(np.diff(x))) * ratio
+
+
+def _rect_verts(x, bottom, top, width):
+    """批量生成矩形顶点，返回形状为 (n, 4, 2) 的数组"""
+    half = width / 2
+    verts = np.empty((len(x), 4, 2))
+    verts[:, 0, 0] = verts[:, 1, 0] = x - half
+    verts[:, 2, 0] = verts[:, 3, 0] = x + half
+    verts[:, 0, 1] = verts[:, 3, 1] = bottom
+    verts[:, 1, 1] = verts[:, 2, 1] = top
+    return verts
+
+
+def rects_path(x, bottom, top, width):
+    """多个矩形合并为一条复合路径（每个矩形一个闭合子路径）"""
+    verts = np.empty((len(x), 5, 2))
+    verts[:, :4] = _rect_verts(x, bottom, top, width)
+    verts[:, 4] = verts[:, 0]
+    codes = np.full((len(x), 5), Path.LINETO, dtype=Path.code_type)
+    codes[:, 0] = Path.MOVETO
+    codes[:, 4] = Path.CLOSEPOLY
+    return Path(verts.reshape(-1, 2), codes.ravel())
+
+
+def segments_path(x, low, high):
+    """多条竖线合并为一条复合路径"""
+    verts = np.empty((len(x), 2, 2))
+    verts[:, 0, 0] = verts[:, 1, 0] = x
+    verts[:, 0, 1] = low
+    verts[:, 1, 1] = high
+    codes = np.tile(np.array([Path.MOVETO, Path.LINETO], dtype=Path.code_type), len(x))
+    return Path(verts.reshape(-1, 2), codes)
+
+
+def visible_range(x, xmin, xmax):
+    """二分查找可见范围内K线的下标区间 [start, end)，两侧各多保留一根"""
+    start = max(int(np.searchsorted(x, xmin, side='left')) - 1, 0)
+    end = min(int(np.searchsorted(x, xmax, side='right')) + 1, len(x))
+    return start, end
+
+
+def downsample_ohlcv(x, open_, high, low, close, volume, max_bars):
+    """把K线合并为不超过 max_bars 个OHLC桶
+
+    每个桶取首根开盘、末根收盘、最高价最大值、最低价最小值，成交量求和，
+    x 取桶内第一根K线的位置。
+    """
+    n = len(x)
+    if n <= max_bars or max_bars < 1:
+        return x, open_, high, low, close, volume
+    size = int(np.ceil(n / max_bars))
+    starts = np.arange(0, n, size)
+    ends = np.append(starts[1:], n) - 1
+    return (x[starts], open_[starts], np.maximum.reduceat(high, starts),
+            np.minimum.reduceat(low, starts), close[ends], np.add.reduceat(volume, starts))
+
+
+class CandlestickRenderer:
+    """一次性根据NumPy数组构建K线和成交量图元
+
+    每种颜色、每个图层（上下引线、实体、成交量柱）只创建一个图元，图元数量与K线数量无关。
+    每个图层是一条复合路径（PathPatch），而不是每根K线一个多边形的集合对象：集合对象每次重绘都要为
+    每根K线创建一个 Path，是缩放帧耗时的主要部分，复合路径一次交给 Agg 绘制。
+    """
+
+    def __init__(self, ax_price, ax_volume):
+        self.ax_price = ax_price
+        self.ax_volume = ax_volume
+        self.artists = []
+        self.data = None  # 完整数据 (x, open, high, low, close, volume)
+        self.width = None
+
+    def remove(self):
+        """移除上一次绘制的图元"""
+        for artist in self.artists:
+            # 坐标轴被 clear() 过的图元已经脱离，无需再移除
+            if artist.axes is not None:
+                artist.remove()
+        self.artists = []
+
+    @traced('chart.artists')
+    def draw(self, x, open_, high, low, close, volume, width=None):
+        """绘制K线与成交量，x 为 matplotlib 日期数值"""
+        x = np.asarray(x, dtype=float)
+        open_ = np.asarray(open_, dtype=float)
+        high = np.asarray(high, dtype=float)
+        low = np.asarray(low, dtype=float)
+        close = np.asarray(close, dtype=float)
+        volume = np.asarray(volume, dtype=float)
+        self.remove()
+        if width is None:
+            width = bar_width(x)
+
+        up = close >= open_
+        for mask, color, label in ((up, UP_COLOR, '成交量'), (~up, DOWN_COLOR, None)):
+            if not mask.any():
+                continue
+            xs = x[mask]
+
+            # 上下引线
+            wicks = PathPatch(segments_path(xs, low[mask], high[mask]), fill=False, edgecolor=color, linewidth=1)
+            # K线实体，十字星也保留一条边线
+            bodies = PathPatch(rects_path(xs, open_[mask], close[mask], width),
+                               facecolor=color, edgecolor=color, linewidth=0.5)
+            # 成交量
+            volumes = PathPatch(rects_path(xs, 0, volume[mask], width), facecolor=color, edgecolor='none',
+                                label=label)
+
+            # add_patch 会逐段计算复合路径的范围，这里用 add_artist 并直接更新数据范围
+            for ax, artist in ((self.ax_price, wicks), (self.ax_price, bodies), (self.ax_volume, volumes)):
+                ax.add_artist(artist)
+            self.artists.extend([wicks, bodies, volumes])
+
+        if len(x):
+            half = width / 2
+            self.ax_price.update_datalim([(x[0] - half, np.nanmin(low)), (x[-1] + half, np.nanmax(high))])
+            self.ax_volume.update_datalim([(x[0] - half, 0), (x[-1] + half, np.nanmax(volume))])
+        self.ax_price.autoscale_view()
+        self.ax_volume.autoscale_view()
+        self.ax_price.xaxis_date()
+        self.ax_volume.xaxis_date()
+        return self.artists
+
+    def set_data(self, x, open_, high, low, close, volume):
+        """保存完整数据，之后按可见范围绘制"""
+        self.data = tuple(np.asarray(values, dtype=float) for values in (x, open_, high, low, close, volume))
+        self.width = bar_width(self.data[0])
+
+    def render(self, xmin=None, xmax=None, pixel_width=None):
+        """多级细节绘制：只绘制可见范围内的K线，K线数多于像素列数时合并为OHLC桶"""
+        if self.data is None:
+            return []
+        x = self.data[0]
+        if len(x) == 0:
+            self.remove()
+            return []
+        xmin = x[0] if xmin is None else xmin
+        xmax = x[-1] if xmax is None else xmax
+        start, end = visible_range(x, xmin, xmax)
+        window = [values[start:end] for values in self.data]
+
+        width = self.width
+        if pixel_width:
+            max_bars = max(int(pixel_width / PIXELS_PER_BAR), 1)
+            if len(window[0]) > max_bars:
+                window = downsample_ohlcv(*window, max_bars)
+                width = bar_width(window[0])
+        self.draw(*window, width=width)
+
+        # 纵轴范围跟随可见数据
+        in_view = (window[0] >= xmin) & (window[0] <= xmax)
+        if in_view.any():
+            low, high = window[3][in_view].min(), window[2][in_view].max()
+            margin = (high - low) * 0.05 or abs(high) * 0.05 or 1
+            self.ax_price.set_ylim(low - margin, high + margin)
+            self.ax_volume.set_ylim(0, window[5][in_view].max() * 1.05 or 1)
+        return self.artists
+
+
+def update_legend(ax, loc=LEGEND_LOC):
+    """只为可见的图元生成图例"""
+    handles, labels = ax.get_legend_handles_labels()
+    visible = [(handle, label) for handle, label in zip(handles, labels) if handle.get_visible()]
+    if visible:
+        ax.legend(*zip(*visible), loc=loc)
+    elif ax.get_legend():
+        ax.get_legend().remove()
+
+
+def draw_k_line_chart(renderer, bars, indicators, k_type, show_ma=True, pixel_width=None, title=None):
+    """清空 renderer 的两个坐标轴，绘制完整的K线图：K线、最高/最低点标记、均线和成交量
+
+    bars 为 BarSeries，indicators 为对应的 IndicatorSet，返回均线图元（界面中用于切换显示）。
+    bars 为空时只保留标题和网格，返回空列表。
+    """
+    ax_price, ax_volume = renderer.ax_price, renderer.ax_volume
+    ax_price.clear()
+    ax_volume.clear()
+
+    x = to_date_nums(bars.datetimes())
+    renderer.set_data(x, bars.open, bars.high, bars.low, bars.close, bars.volume)
+    title = title or f'{k_type}价格走势'
+    if len(bars) == 0:
+        renderer.render()  # 移除上一次的图元
+        ax_price.set_title(f'{title}（无数据）')
+        ax_volume.set_title(f'{k_type}成交量')
+        ax_price.grid(True)
+        ax_volume.grid(True)
+        return []
+    renderer.render(pixel_width=pixel_width)
+
+    # 最高点和最低点标记
+    max_high, high_index, min_low, low_index = find_extremes(bars.high, bars.low)
+    ax_price.plot(x[high_index], max_high, 'r^', markersize=10, label='最高点')
+    ax_price.annotate(f'最高: {max_high:.2f}', xy=(x[high_index], max_high),
+                      xytext=(10, 10), textcoords='offset points', color='red', fontsize=8)
+    ax_price.plot(x[low_index], min_low, 'gv', markersize=10, label='最低点')
+    ax_price.annotate(f'最低: {min_low:.2f}', xy=(x[low_index], min_low),
+                      xytext=(10, -15), textcoords='offset points', color='green', fontsize=8)
+
+    ma_lines = []
+    for period, color in zip(MA_PERIODS, MA_COLORS):
+        line, = ax_price.plot(x, indicators[f'MA{period}'], color=color, label=f'MA{period}', linewidth=1)
+        line.set_visible(show_ma)
+        ma_lines.append(line)
+
+    ax_price.set_title(title)
+    ax_price.grid(True)
+    update_legend(ax_price)
+
+    ax_volume.set_title(f'{k_type}成交量')
+    ax_volume.grid(True)
+    ax_volume.legend(loc=LEGEND_LOC)
+
+    # 初始显示范围为全部数据
+    ax_price.set_xlim(x[0], x[-1])
+    ax_volume.set_xlim(x[0], x[-1])
+    return ma_lines
+
+
+class LayerBlitter:
+    """连续缩放时只重画数据图层（K线、成交量、均线和标记），其余部分使用保存的背景
+
+    begin() 把数据图层和图例标记为 animated 并完整重绘一次，保存不含它们的背景（坐标轴、刻度、标题、网格），
+    图例单独画在背景上并保存所在区域；之后每帧 frame() 只恢复背景、重画数据图层、贴回图例区域并 blit，
+    不调用 canvas.draw()，刻度和网格保持手势开始时的位置。排版图例文字比画全部数据图层还慢，所以不逐帧重画。
+    end() 恢复为普通图元并在空闲时完整重绘，刻度随新的可见范围更新。
+    手势期间发生的完整重绘（如调整窗口大小）会重新保存背景并补画数据图层。
+    """
+
+    def __init__(self, canvas, renderer):
+        self.canvas = canvas
+        self.renderer = renderer
+        self.layers = []         # 手势期间不变的数据图层：均线、最高/最低点标记
+        self.legends = []
+        self.background = None
+        self.legend_regions = []
+        self.active = False
+        canvas.mpl_connect('draw_event', self.on_draw)
+
+    def data_layers(self):
+        """按绘制顺序排列的数据图层：K线和成交量在下，均线、标记在上"""
+        return self.renderer.artists + self.layers
+
+    def begin(self):
+        """开始连续缩放：数据图层和图例不再参与完整重绘，重绘一次并保存背景"""
+        ax_price, ax_volume = self.renderer.ax_price, self.renderer.ax_volume
+        # 已经是 animated 的图元（十字光标线）由各自的对象绘制
+        self.layers = [artist for artist in list(ax_price.lines) + list(ax_price.texts) if not artist.get_animated()]
+        self.legends = [ax.get_legend() for ax in (ax_price, ax_volume) if ax.get_legend() is not None]
+        self.active = True
+        for artist in self.data_layers() + self.legends:
+            artist.set_animated(True)
+        self.canvas.draw()
+
+    def on_draw(self, event):
+        if not self.active:
+            return
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.legend_regions = []
+        for legend in self.legends:
+            legend.axes.draw_artist(legend)
+            self.legend_regions.append(self.canvas.copy_from_bbox(legend.get_window_extent()))
+        self.draw_layers()
+
+    def draw_layers(self):
+        for artist in self.data_layers():
+            artist.set_animated(True)  # render() 每帧创建新的K线图元
+            artist.axes.draw_artist(artist)
+        for region in self.legend_regions:
+            self.canvas.restore_region(region)
+
+    @traced('chart.blit')
+    def frame(self):
+        """恢复背景、重画数据图层并 blit"""
+        if self.background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_layers()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+    def end(self, redraw=True):
+        """结束连续缩放：恢复为普通图元，redraw 为 True 时在空闲时完整重绘（坐标轴已清空时传入 False）"""
+        if not self.active:
+            return
+        for artist in self.data_layers() + self.legends:
+            artist.set_animated(False)
+        self.layers = []
+        self.legends = []
+        self.background = None
+        self.legend_regions = []
+        self.active = False
+        if redraw:
+            self.canvas.draw_idle()
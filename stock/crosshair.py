@@ -0,0 +1,201 @@
+"""K线图十字光标：显示鼠标所在K线的日期、开高低收、涨跌幅、成交量和均线，光标线使用 blit 局部重绘"""
+import tkinter as tk
+import numpy as np
+from matplotlib.lines import Line2D
+from indicators import MA_PERIODS
+from instrumentation import traced
+from quote_sources import format_number, to_float
+
+TOOLTIP_OFFSET = 12  # 提示框与光标的距离（像素）
+TOOLTIP_FONT = ('Courier', 9)
+LINE_STYLE = {'color': 'gray', 'linewidth': 0.8, 'linestyle': '--'}
+
+
+def nearest_index(x, value):
+    """二分查找离 value 最近的K线下标，x 为升序数组"""
+    index = int(np.searchsorted(x, value))
+    if index == 0:
+        return 0
+    if index == len(x):
+        return len(x) - 1
+    return index if x[index] - value < value - x[index - 1] else index - 1
+
+
+def format_volume(value):
+    """成交量（手），一万手以上显示为万手、亿手"""
+    value = to_float(value)
+    if value is None:
+        return "--"
+    if value >= 1e8:
+        return f"{value / 1e8:.2f}亿手"
+    if value >= 1e4:
+        return f"{value / 1e4:.2f}万手"
+    return f"{value:.0f}手"
+
+
+class TkTooltip:
+    """覆盖在 Tk 画布上的提示框
+
+    文字由 Tk 标签直接绘制：在 matplotlib 中排版、绘制十来行文字的耗时是画光标线的十倍以上，
+    而移动标签既不经过 matplotlib，也不需要重绘画布。
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas  # FigureCanvasTkAgg
+        self.label = tk.Label(canvas.get_tk_widget(), justify=tk.LEFT, font=TOOLTIP_FONT,
+                              background='#ffffe8', relief=tk.SOLID, borderwidth=1, padx=4, pady=2)
+        self.text = None
+
+    def show(self, text, x, y, left):
+        """在显示坐标 (x, y)（matplotlib 像素坐标，原点在左下角）旁显示，left 为 True 时显示在左侧"""
+        if text != self.text:
+            self.text = text
+            self.label.config(text=text)
+        ratio = getattr(self.canvas, 'device_pixel_ratio', 1) or 1
+        top = (self.canvas.figure.bbox.height - y) / ratio + TOOLTIP_OFFSET
+        offset = -TOOLTIP_OFFSET if left else TOOLTIP_OFFSET
+        self.label.place(x=x / ratio + offset, y=top, anchor=tk.NE if left else tk.NW)
+
+    def hide(self):
+        self.label.place_forget()
+
+
+class Crosshair:
+    """价格图和成交量图共用的十字光标与数据提示框
+
+    竖线对齐到最近的一根K线并同时画在两个坐标轴上，横线跟随鼠标所在的坐标轴。
+    光标线为 animated 图元，不参与完整重绘：完整重绘后保存背景，鼠标移动时只恢复背景、重画光标线并 blit，
+    不调用 canvas.draw()；查找K线使用二分查找，与K线数量无关。提示框文字只在换到另一根K线时重新生成。
+    """
+
+    def __init__(self, ax_price, ax_volume, canvas, tooltip=None):
+        self.ax_price = ax_price
+        self.ax_volume = ax_volume
+        self.canvas = canvas
+        self.tooltip = tooltip   # 提供 show(text, x, y, left) 和 hide()，为 None 时只显示光标线
+        self.x = None
+        self.bars = None
+        self.ma = []             # [(名称, 数组)]
+        self.index = None        # 提示框当前显示的K线下标
+        self.text = None
+        self.vlines = {}         # 坐标轴 -> 竖线
+        self.hlines = {}         # 坐标轴 -> 横线
+        self.artists = []
+        self.background = None   # 不含光标线的画布背景
+        self.active = False
+        canvas.mpl_connect('draw_event', self.on_draw)
+
+    def setup(self, x, bars, indicators):
+        """绘制新的K线图后调用（坐标轴已清空）：保存数据并创建光标线
+
+        x 为K线的 matplotlib 日期坐标，bars 为 BarSeries，indicators 为对应的 IndicatorSet。
+        """
+        self.x = x
+        self.bars = bars
+        self.ma = [(f'MA{period}', indicators[f'MA{period}']) for period in MA_PERIODS]
+
+        # 直接添加 Line2D 而不使用 axvline / axhline，不影响坐标轴的数据范围
+        self.vlines = {}
+        self.hlines = {}
+        for ax in (self.ax_price, self.ax_volume):
+            self.vlines[ax] = Line2D([0, 0], [0, 1], transform=ax.get_xaxis_transform(), visible=False,
+                                     animated=True, label='_crosshair', **LINE_STYLE)
+            self.hlines[ax] = Line2D([0, 1], [0, 0], transform=ax.get_yaxis_transform(), visible=False,
+                                     animated=True, label='_crosshair', **LINE_STYLE)
+            ax.add_artist(self.vlines[ax])
+            ax.add_artist(self.hlines[ax])
+        self.artists = [(ax, line) for lines in (self.vlines, self.hlines) for ax, line in lines.items()]
+        self.hide_tooltip()
+        self.background = None
+        self.active = True
+
+    def deactivate(self):
+        """清空图表或切换到分时图时调用，之后的完整重绘不再绘制十字光标"""
+        self.hide_tooltip()
+        self.active = False
+        self.background = None
+        self.artists = []
+        self.bars = None
+
+    def on_draw(self, event):
+        """完整重绘后保存背景，并补画光标线"""
+        if not self.active:
+            return
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for ax, artist in self.artists:
+            if artist.get_visible():
+                ax.draw_artist(artist)
+
+    def on_move(self, event):
+        """鼠标移动（界面中合并为每帧一次）"""
+        if not self.active or not len(self.x):
+            return
+        if event.inaxes not in self.vlines or event.xdata is None:
+            self.hide()
+            return
+        if self.background is None or self.canvas.figure.stale:
+            # 缩放等操作后还没有完整重绘，背景已经过期；重绘后在 on_draw 中保存新背景并画出光标
+            self.canvas.draw_idle()
+            return
+        self.move_to(nearest_index(self.x, event.xdata), event.inaxes, event.ydata)
+
+    @traced('chart.crosshair')
+    def move_to(self, index, ax, y):
+        """把竖线移到第 index 根K线，横线移到 ax 中的 y 处，blit 后更新提示框"""
+        x = self.x[index]
+        for line in self.vlines.values():
+            line.set_xdata([x, x])
+            line.set_visible(True)
+        for line_ax, line in self.hlines.items():
+            line.set_visible(line_ax is ax)
+        self.hlines[ax].set_ydata([y, y])
+        self.blit()
+
+        if self.tooltip is not None:
+            if index != self.index:
+                self.index = index
+                self.text = self.format_bar(index)
+            # 竖线在右半边时提示框放在左侧，避免超出图表
+            xmin, xmax = self.ax_price.get_xlim()
+            display_x, display_y = ax.transData.transform((x, y))
+            self.tooltip.show(self.text, display_x, display_y, x > (xmin + xmax) / 2)
+
+    def format_bar(self, index):
+        bars = self.bars
+        lines = [
+            str(bars.date_at(index)),
+            f"开盘  {format_number(bars.open[index])}",
+            f"最高  {format_number(bars.high[index])}",
+            f"最低  {format_number(bars.low[index])}",
+            f"收盘  {format_number(bars.close[index])}",
+            f"涨跌幅 {format_number(bars.pct_change[index], suffix='%')}",
+            f"成交量 {format_volume(bars.volume[index])}",
+        ]
+        lines += [f"{name:<5} {format_number(values[index])}" for name, values in self.ma]
+        return '\n'.join(lines)
+
+    def hide_tooltip(self):
+        self.index = None
+        if self.tooltip is not None:
+            self.tooltip.hide()
+
+    def hide(self):
+        """隐藏光标线和提示框"""
+        self.hide_tooltip()
+        if not self.active or not any(artist.get_visible() for _, artist in self.artists):
+            return
+        for _, artist in self.artists:
+            artist.set_visible(False)
+        if self.background is None or self.canvas.figure.stale:
+            self.canvas.draw_idle()
+        else:
+            self.blit()
+
+    def blit(self):
+        """恢复背景，只重绘光标线"""
+        self.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
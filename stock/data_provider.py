@@ -0,0 +1,324 @@
+"""数据源接口：真实数据源（akshare）、本地模拟数据源与本地数据服务
+
+各数据源的方法名、参数和返回的列名都与 akshare 对应函数一致，
+应用和性能测试可以在不访问东方财富接口的情况下运行。
+"""
+import abc
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+from resample import resample_ohlcv
+
+FAKE_HISTORY_START = '2000-01-03'  # 模拟日K数据的起始日期
+FAKE_SYMBOL_COUNT = 5000           # 模拟全市场快照中的股票数量
+FAKE_HISTORY_CACHE = 256           # 最多缓存多少只股票的模拟日K数据（批量分析会遍历全市场）
+SERVICE_TIMEOUT = 120              # 请求本地数据服务的超时时间（秒），服务端可能需要全量下载K线
+DATE_COLUMNS = ('日期', 'trade_date')  # 通过数据服务传输时为 ISO 字符串、读取后还原为 date 的列
+
+
+class DataProvider(abc.ABC):
+    """数据源接口，方法与 akshare 同名函数的参数、返回格式一致"""
+
+    @abc.abstractmethod
+    def stock_zh_a_hist(self, symbol, period='daily', start_date='19700101', end_date='20500101', adjust=''):
+        """历史K线（日、周、月），日期范围为 YYYYMMDD，返回 ak.stock_zh_a_hist 的列"""
+
+    @abc.abstractmethod
+    def stock_zh_a_spot_em(self):
+        """全市场实时行情快照，每只股票一行，返回 ak.stock_zh_a_spot_em 的列"""
+
+    @abc.abstractmethod
+    def stock_individual_info_em(self, symbol):
+        """个股基本信息，返回 item、value 两列"""
+
+    @abc.abstractmethod
+    def tool_trade_date_hist_sina(self):
+        """全部交易日，返回 trade_date 列"""
+
+    @abc.abstractmethod
+    def stock_zh_a_hist_min_em(self, symbol, start_date, end_date, period='1', adjust=''):
+        """分钟K线，时间范围为 'YYYY-MM-DD HH:MM:SS'，返回 ak.stock_zh_a_hist_min_em 的列"""
+
+
+class AkshareProvider(DataProvider):
+    """通过 akshare 访问东方财富、新浪接口"""
+
+    def __init__(self):
+        import akshare
+        self.ak = akshare
+
+    def stock_zh_a_hist(self, symbol, period='daily', start_date='19700101', end_date='20500101', adjust=''):
+        return self.ak.stock_zh_a_hist(symbol=symbol, period=period, start_date=start_date,
+                                       end_date=end_date, adjust=adjust)
+
+    def stock_zh_a_spot_em(self):
+        return self.ak.stock_zh_a_spot_em()
+
+    def stock_individual_info_em(self, symbol):
+        return self.ak.stock_individual_info_em(symbol=symbol)
+
+    def tool_trade_date_hist_sina(self):
+        return self.ak.tool_trade_date_hist_sina()
+
+    def stock_zh_a_hist_min_em(self, symbol, start_date, end_date, period='1', adjust=''):
+        return self.ak.stock_zh_a_hist_min_em(symbol=symbol, start_date=start_date, end_date=end_date,
+                                              period=period, adjust=adjust)
+
+
+def to_jsonable(value):
+    """把 numpy 数值和日期转换为可写入 JSON 的类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def frame_to_json(df):
+    """把 DataFrame 编码为数据服务的响应（UTF-8 JSON：列名和按行排列的数据）"""
+    data = {'columns': [str(column) for column in df.columns], 'data': df.to_numpy(dtype=object).tolist()}
+    return json.dumps(data, ensure_ascii=False, default=to_jsonable).encode('utf-8')
+
+
+def frame_from_json(data):
+    """frame_to_json 的逆过程，日期列还原为 date"""
+    df = pd.DataFrame(data['data'], columns=data['columns'])
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column]).dt.date
+    return df
+
+
+class RemoteProvider(DataProvider):
+    """通过本地数据服务（data_service.py）获取数据
+
+    多个界面共用一个服务进程：服务端缓存K线和全市场快照，相同的请求合并为一次上游请求。
+    服务不可用或上游请求失败时抛出 ConnectionError，参数错误时抛出 ValueError。
+    """
+
+    def __init__(self, url, timeout=SERVICE_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _get(self, method, **params):
+        url = f"{self.url}/{method}"
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.load(e).get('error', e.reason)
+            except ValueError:
+                message = e.reason
+            if e.code == 400:
+                raise ValueError(f"Bad request to data service {method}: {message}") from None
+            raise ConnectionError(f"Data service error in {method}: {message}") from None
+        except urllib.error.URLError as e:
+            raise ConnectionError(f"Data service at {self.url} unavailable: {e.reason}") from None
+
+    def stock_zh_a_hist(self, symbol, period='daily', start_date='19700101', end_date='20500101', adjust=''):
+        return frame_from_json(self._get('stock_zh_a_hist', symbol=symbol, period=period, start_date=start_date,
+                                         end_date=end_date, adjust=adjust))
+
+    def stock_zh_a_spot_em(self):
+        return frame_from_json(self._get('stock_zh_a_spot_em'))
+
+    def stock_individual_info_em(self, symbol):
+        return frame_from_json(self._get('stock_individual_info_em', symbol=symbol))
+
+    def tool_trade_date_hist_sina(self):
+        return frame_from_json(self._get('tool_trade_date_hist_sina'))
+
+    def stock_zh_a_hist_min_em(self, symbol, start_date, end_date, period='1', adjust=''):
+        return frame_from_json(self._get('stock_zh_a_hist_min_em', symbol=symbol, start_date=start_date,
+                                         end_date=end_date, period=period, adjust=adjust))
+
+    def stats(self):
+        """服务端的请求统计（各接口收到的请求数、上游请求数、合并次数等）"""
+        return self._get('stats')
+
+
+def symbol_seed(*parts):
+    """由股票代码等生成固定的随机种子，同一只股票每次生成相同的数据"""
+    return zlib.crc32('/'.join(str(part) for part in parts).encode('utf-8'))
+
+
+def random_walk(rng, n, start=10.0, volatility=0.02):
+    """生成 n 根K线的开高低收，价格为几何随机游走"""
+    close = start * np.exp(np.cumsum(rng.normal(0, volatility, n)))
+    open_ = close * (1 + rng.normal(0, volatility / 2, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, volatility / 2, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, volatility / 2, n)))
+    return open_.round(2), high.round(2), low.round(2), close.round(2)
+
+
+class FakeProvider(DataProvider):
+    """本地模拟数据源
+
+    按股票代码生成固定的随机行情（同一只股票在不同请求之间保持一致，增量更新可正常校验），
+    可设置每次请求的延迟和失败概率；latency、failure_rate 也可以是 {方法名: 数值} 的字典。
+    calls 记录各方法被调用的次数。
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=0, symbol_count=FAKE_SYMBOL_COUNT):
+        self.latency = latency
+        self.jitter = jitter  # 延迟的随机波动比例
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.symbol_count = symbol_count
+        self.calls = Counter()
+        self.histories = {}  # 股票代码 -> 完整日K数据，超出 FAKE_HISTORY_CACHE 时丢弃最早生成的
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+
+    def _option(self, value, name):
+        return value.get(name, 0.0) if isinstance(value, dict) else value
+
+    def _simulate(self, name):
+        """模拟网络延迟和请求失败"""
+        with self.lock:
+            self.calls[name] += 1
+            latency = self._option(self.latency, name)
+            latency *= 1 + self.random.uniform(-self.jitter, self.jitter)
+            failed = self.random.random() < self._option(self.failure_rate, name)
+        if latency > 0:
+            time.sleep(latency)
+        if failed:
+            raise ConnectionError(f"Injected failure in {name}")
+
+    def symbols(self):
+        """模拟市场中的全部股票代码（深市 000001 起，沪市 600000 起）"""
+        half = self.symbol_count // 2
+        return ([f"{i:06d}" for i in range(1, half + 1)] +
+                [f"{600000 + i:06d}" for i in range(self.symbol_count - half)])
+
+    def history(self, symbol):
+        """某只股票从 FAKE_HISTORY_START 到今天的完整日K数据（不含模拟延迟）"""
+        with self.lock:
+            df = self.histories.get(symbol)
+        if df is not None:
+            return df
+        rng = np.random.default_rng(symbol_seed(self.seed, symbol))
+        dates = pd.bdate_range(FAKE_HISTORY_START, date.today())
+        n = len(dates)
+        open_, high, low, close = random_walk(rng, n, start=rng.uniform(3, 100))
+        volume = rng.integers(10000, 1000000, n).astype(float)
+        previous = np.concatenate(([open_[0]], close[:-1]))
+        df = pd.DataFrame({
+            '日期': dates.date,
+            '股票代码': symbol,
+            '开盘': open_,
+            '收盘': close,
+            '最高': high,
+            '最低': low,
+            '成交量': volume,
+            '成交额': (volume * 100 * close).round(2),
+            '振幅': ((high - low) / previous * 100).round(2),
+            '涨跌幅': ((close - previous) / previous * 100).round(2),
+            '涨跌额': (close - previous).round(2),
+            '换手率': rng.uniform(0.1, 5, n).round(2),
+        })
+        with self.lock:
+            self.histories[symbol] = df
+            if len(self.histories) > FAKE_HISTORY_CACHE:
+                del self.histories[next(iter(self.histories))]
+        return df
+
+    def stock_zh_a_hist(self, symbol, period='daily', start_date='19700101', end_date='20500101', adjust=''):
+        self._simulate('stock_zh_a_hist')
+        df = self.history(symbol)
+        if period != 'daily':
+            df = resample_ohlcv(df, period)
+        dates = pd.to_datetime(df['日期'])
+        mask = (dates >= pd.to_datetime(start_date)) & (dates <= pd.to_datetime(end_date))
+        return df[mask].reset_index(drop=True)
+
+    def stock_zh_a_spot_em(self):
+        self._simulate('stock_zh_a_spot_em')
+        codes = self.symbols()
+        n = len(codes)
+        with self.lock:
+            rng = np.random.default_rng(self.random.getrandbits(32))
+        prev_close = np.random.default_rng(self.seed).uniform(3, 100, n).round(2)
+        change = rng.normal(0, 2, n).clip(-10, 10).round(2)
+        price = (prev_close * (1 + change / 100)).round(2)
+        open_ = (prev_close * (1 + rng.normal(0, 0.01, n))).round(2)
+        high = np.maximum(price, open_) * (1 + np.abs(rng.normal(0, 0.005, n)))
+        low = np.minimum(price, open_) * (1 - np.abs(rng.normal(0, 0.005, n)))
+        volume = rng.integers(1000, 1000000, n).astype(float)
+        total_value = prev_close * rng.uniform(1e8, 1e10, n)
+        return pd.DataFrame({
+            '序号': np.arange(1, n + 1),
+            '代码': codes,
+            '名称': [f'模拟{code}' for code in codes],
+            '最新价': price,
+            '涨跌幅': change,
+            '涨跌额': (price - prev_close).round(2),
+            '成交量': volume,
+            '成交额': (volume * 100 * price).round(2),
+            '振幅': ((high - low) / prev_close * 100).round(2),
+            '最高': high.round(2),
+            '最低': low.round(2),
+            '今开': open_,
+            '昨收': prev_close,
+            '量比': rng.lognormal(0, 0.4, n).round(2),
+            '换手率': rng.uniform(0.1, 10, n).round(2),
+            '市盈率-动态': rng.uniform(5, 80, n).round(2),
+            '市净率': rng.uniform(0.5, 10, n).round(2),
+            '总市值': total_value.round(0),
+            '流通市值': (total_value * rng.uniform(0.3, 1, n)).round(0),
+            '涨速': rng.normal(0, 0.2, n).round(2),
+            '5分钟涨跌': rng.normal(0, 0.5, n).round(2),
+            '60日涨跌幅': rng.normal(0, 15, n).round(2),
+            '年初至今涨跌幅': rng.normal(0, 25, n).round(2),
+        })
+
+    def stock_individual_info_em(self, symbol):
+        self._simulate('stock_individual_info_em')
+        latest = self.history(symbol).iloc[-1]
+        shares = float(np.random.default_rng(symbol_seed(self.seed, symbol, 'shares')).integers(1e8, 1e10))
+        return pd.DataFrame({
+            'item': ['最新', '股票代码', '股票简称', '总股本', '流通股', '总市值', '流通市值', '行业', '上市时间'],
+            'value': [latest['收盘'], symbol, f'模拟{symbol}', shares, shares * 0.8,
+                      shares * latest['收盘'], shares * 0.8 * latest['收盘'], '模拟行业', 20000103],
+        })
+
+    def tool_trade_date_hist_sina(self):
+        self._simulate('tool_trade_date_hist_sina')
+        dates = pd.bdate_range('1990-12-19', date(date.today().year, 12, 31))
+        return pd.DataFrame({'trade_date': dates.date})
+
+    def stock_zh_a_hist_min_em(self, symbol, start_date, end_date, period='1', adjust=''):
+        self._simulate('stock_zh_a_hist_min_em')
+        start, end = pd.to_datetime(start_date), pd.to_datetime(end_date)
+        day = start.normalize()
+        times = pd.date_range(day + timedelta(hours=9, minutes=30), day + timedelta(hours=11, minutes=30), freq='min')
+        times = times.append(pd.date_range(day + timedelta(hours=13, minutes=1), day + timedelta(hours=15), freq='min'))
+        # 整个交易日的数据固定生成，再截取请求范围（当天只返回已经过去的分钟）
+        rng = np.random.default_rng(symbol_seed(self.seed, symbol, day.date()))
+        open_, high, low, close = random_walk(rng, len(times), start=rng.uniform(3, 100), volatility=0.001)
+        volume = rng.integers(100, 10000, len(times)).astype(float)
+        amount = volume * 100 * close
+        average = np.cumsum(amount) / np.cumsum(volume * 100)
+        mask = (times >= start) & (times <= min(end, pd.Timestamp(datetime.now())))
+        return pd.DataFrame({
+            '时间': times[mask].strftime('%Y-%m-%d %H:%M:%S'),
+            '开盘': open_[mask],
+            '收盘': close[mask],
+            '最高': high[mask],
+            '最低': low[mask],
+            '成交量': volume[mask],
+            '成交额': amount[mask].round(2),
+            '均价': average[mask].round(3),
+        })
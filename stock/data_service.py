@@ -0,0 +1,300 @@
+"""本地数据服务：多个界面共用一个进程访问数据源，相同的请求合并为一次上游请求
+
+运行: python data_service.py                          监听 127.0.0.1:8765，数据缓存在 ~/.stock_monitor/service
+      python data_service.py --fake --port 9000       使用本地模拟数据
+界面连接服务: python stock_monitor.py --service http://127.0.0.1:8765
+
+接口与 DataProvider 的方法同名，参数为查询字符串，返回 {"columns": [...], "data": [[...], ...]}：
+    GET /stock_zh_a_hist?symbol=000001&period=daily&start_date=20240101&end_date=20241231&adjust=qfq
+    GET /stock_zh_a_spot_em
+    GET /stock_individual_info_em?symbol=000001
+    GET /tool_trade_date_hist_sina
+    GET /stock_zh_a_hist_min_em?symbol=000001&start_date=2024-06-03 09:30:00&end_date=2024-06-03 15:00:00
+    GET /stats                                        各接口的请求数、上游请求数、合并次数和各阶段耗时
+
+K线保存在服务的K线仓库中，只增量下载；全市场快照在有效期内共用同一份；交易日历只在不覆盖当年时下载。
+正在进行的相同请求只向数据源发起一次，其余请求等待并共享结果；个股信息和分时数据的结果在短时间内直接复用。
+所有上游请求受 --source-concurrency 限制，避免被数据源限流。
+"""
+import argparse
+import concurrent.futures
+import functools
+import http.server
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from datetime import date
+import pandas as pd
+from batch import SOURCE_CONCURRENCY
+from data_provider import AkshareProvider, FakeProvider, frame_to_json
+from instrumentation import span, tracer
+from kline_store import KLineStore, DEFAULT_DATA_DIR, DB_FILENAME
+from market_snapshot import MarketSnapshot, SNAPSHOT_TTL
+from trading_calendar import TradingCalendar, CALENDAR_FILENAME
+
+logger = logging.getLogger(__name__)
+
+SERVICE_DIRNAME = 'service'  # 数据目录下服务使用的缓存目录，与界面自己的缓存分开
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+INFO_TTL = 60                # 个股信息结果的复用时间（秒）
+INTRADAY_TTL = 5             # 分时数据结果的复用时间（秒），与界面的分时刷新间隔相同
+CALENDAR_TTL = 3600          # 交易日历响应的复用时间（秒）
+LISTEN_BACKLOG = 128         # 等待接受的连接数上限，默认的 5 在多个客户端同时请求时会丢弃连接、等待重传
+
+# 接口名称 -> 必需的参数
+ROUTES = {
+    'stock_zh_a_hist': ('symbol',),
+    'stock_zh_a_spot_em': (),
+    'stock_individual_info_em': ('symbol',),
+    'tool_trade_date_hist_sina': (),
+    'stock_zh_a_hist_min_em': ('symbol', 'start_date', 'end_date'),
+}
+
+
+class SingleFlight:
+    """合并相同的请求：某个 key 正在请求时，其他调用等待并共享它的结果
+
+    ttl 大于 0 时，成功的结果在 ttl 秒内继续复用；失败不保留，下一次调用重新请求。
+    """
+
+    def __init__(self, ttl=0.0):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.futures = {}   # key -> 正在进行或在有效期内的 Future
+        self.expires = {}   # key -> 结果的过期时间（time.monotonic）
+        self.calls = 0      # 实际执行的次数
+        self.shared = 0     # 合并到进行中的请求或复用结果的次数
+
+    def do(self, key, func):
+        now = time.monotonic()
+        with self.lock:
+            future = self.futures.get(key)
+            if future is not None and (not future.done() or now < self.expires.get(key, 0)):
+                self.shared += 1
+                owner = False
+            else:
+                self._purge(now)
+                future = self.futures[key] = concurrent.futures.Future()
+                self.calls += 1
+                owner = True
+        if not owner:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            with self.lock:
+                if self.futures.get(key) is future:
+                    del self.futures[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            if self.ttl > 0:
+                self.expires[key] = time.monotonic() + self.ttl
+            elif self.futures.get(key) is future:
+                del self.futures[key]
+        future.set_result(result)
+        return result
+
+    def _purge(self, now):
+        """丢弃已过期的结果（调用时持有 lock）"""
+        for key in [key for key, expires in self.expires.items() if expires <= now]:
+            del self.expires[key]
+            if self.futures[key].done():
+                del self.futures[key]
+
+    def summary(self):
+        with self.lock:
+            return {'calls': self.calls, 'shared': self.shared}
+
+
+class DataService:
+    """服务端：持有数据源、交易日历、K线仓库和全市场快照，返回编码后的 JSON 响应
+
+    每个接口的响应都经过 SingleFlight 合并，响应只编码一次，等待中的请求共享同一份字节串。
+    """
+
+    def __init__(self, provider, data_dir, source_concurrency=SOURCE_CONCURRENCY):
+        self.provider = provider
+        self.source_slots = threading.BoundedSemaphore(source_concurrency)
+        self.lock = threading.Lock()
+        self.requests = Counter()   # 接口名称 -> 收到的请求数
+        self.upstream = Counter()   # 接口名称 -> 实际向数据源发起的请求数
+        self.started_at = time.time()
+        os.makedirs(data_dir, exist_ok=True)
+        self.calendar = TradingCalendar(self._upstream('tool_trade_date_hist_sina'),
+                                        path=os.path.join(data_dir, CALENDAR_FILENAME))
+        self.kline_store = KLineStore(self._upstream('stock_zh_a_hist'), path=os.path.join(data_dir, DB_FILENAME),
+                                      calendar=self.calendar)
+        self.market_snapshot = MarketSnapshot(self._upstream('stock_zh_a_spot_em'))
+        self.flights = {
+            'stock_zh_a_hist': SingleFlight(),  # K线仓库本身会缓存，只合并同时到达的请求
+            'stock_zh_a_spot_em': SingleFlight(SNAPSHOT_TTL),
+            'stock_individual_info_em': SingleFlight(INFO_TTL),
+            'tool_trade_date_hist_sina': SingleFlight(CALENDAR_TTL),
+            'stock_zh_a_hist_min_em': SingleFlight(INTRADAY_TTL),
+        }
+
+    def _upstream(self, name):
+        """包装数据源的方法：限制同时进行的上游请求数，并记录请求次数"""
+        method = getattr(self.provider, name)
+
+        @functools.wraps(method)
+        def call(*args, **kwargs):
+            with self.source_slots:
+                with self.lock:
+                    self.upstream[name] += 1
+                with span('service.upstream', method=name):
+                    return method(*args, **kwargs)
+        return call
+
+    def handle(self, name, params):
+        """处理一次请求（name 为 ROUTES 中的接口），返回响应字节串；缺少参数时抛出 ValueError"""
+        missing = [param for param in ROUTES[name] if not params.get(param)]
+        if missing:
+            raise ValueError(f"Missing parameters: {', '.join(missing)}")
+        with self.lock:
+            self.requests[name] += 1
+        with span('service.request', method=name):
+            return getattr(self, name)(**params)
+
+    def stock_zh_a_hist(self, symbol, period='daily', start_date='19700101', end_date='20500101', adjust=''):
+        key = (symbol, period, start_date, end_date, adjust)
+        return self.flights['stock_zh_a_hist'].do(key, lambda: frame_to_json(self.kline_store.get_hist(
+            symbol=symbol, period=period, adjust=adjust, start_date=start_date, end_date=end_date)))
+
+    def stock_zh_a_spot_em(self):
+        # 快照本身只会有一个刷新请求；以快照的更新时间为 key，每份快照只编码一次
+        self.market_snapshot.get_frame()
+        with self.market_snapshot.lock:
+            df, fetched_at = self.market_snapshot.df, self.market_snapshot.fetched_at
+        return self.flights['stock_zh_a_spot_em'].do(fetched_at, lambda: frame_to_json(df))
+
+    def stock_individual_info_em(self, symbol):
+        fetch = self._upstream('stock_individual_info_em')
+        return self.flights['stock_individual_info_em'].do(symbol, lambda: frame_to_json(fetch(symbol=symbol)))
+
+    def tool_trade_date_hist_sina(self):
+        return self.flights['tool_trade_date_hist_sina'].do(None, self._encode_calendar)
+
+    def _encode_calendar(self):
+        self.calendar.ensure_current()
+        if not self.calendar.covers(date.today().year):
+            raise ConnectionError("Trade calendar unavailable")
+        return frame_to_json(pd.DataFrame({'trade_date': self.calendar.dates}))
+
+    def stock_zh_a_hist_min_em(self, symbol, start_date, end_date, period='1', adjust=''):
+        fetch = self._upstream('stock_zh_a_hist_min_em')
+        key = (symbol, start_date, end_date, period, adjust)
+        return self.flights['stock_zh_a_hist_min_em'].do(key, lambda: frame_to_json(fetch(
+            symbol=symbol, start_date=start_date, end_date=end_date, period=period, adjust=adjust)))
+
+    def stats(self):
+        with self.lock:
+            requests, upstream = dict(self.requests), dict(self.upstream)
+        return {
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'requests': requests,
+            'upstream': upstream,
+            'coalescing': {name: flight.summary() for name, flight in self.flights.items()},
+            'stages': tracer.summary(),
+        }
+
+    def shutdown(self):
+        self.market_snapshot.shutdown()
+
+
+class ServiceServer(http.server.ThreadingHTTPServer):
+    """每个请求一个线程，service 为 DataService"""
+
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+    def __init__(self, address, service):
+        super().__init__(address, RequestHandler)
+        self.service = service
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    """把 GET 请求转给 server.service（DataService）"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        name = url.path.strip('/')
+        params = {key: values[-1] for key, values in
+                  urllib.parse.parse_qs(url.query, keep_blank_values=True).items()}
+        service = self.server.service
+        if name != 'stats' and name not in ROUTES:
+            self.send_json(404, {'error': f"Unknown method: {name}"})
+            return
+        try:
+            if name == 'stats':
+                body = json.dumps(service.stats(), ensure_ascii=False, default=str).encode('utf-8')
+            else:
+                body = service.handle(name, params)
+        except (TypeError, ValueError) as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            logger.warning("Error serving %s %s: %s", name, params, e)
+            self.send_json(502, {'error': f"{type(e).__name__}: {e}"})
+        else:
+            self.send_body(200, body)
+
+    def send_json(self, status, data):
+        self.send_body(status, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def send_body(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+def make_server(provider, data_dir, host=DEFAULT_HOST, port=DEFAULT_PORT, source_concurrency=SOURCE_CONCURRENCY):
+    """创建服务（尚未开始处理请求），port 为 0 时使用系统分配的端口（server.server_address）"""
+    return ServiceServer((host, port), DataService(provider, data_dir, source_concurrency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地数据服务")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="监听地址，供其他机器访问时设为 0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("--source-concurrency", type=int, default=SOURCE_CONCURRENCY,
+                        help="同时向数据源发起的请求数上限")
+    parser.add_argument("--data-dir", help=f"缓存目录，默认为 {os.path.join(DEFAULT_DATA_DIR, SERVICE_DIRNAME)}")
+    parser.add_argument("--fake", action="store_true", help="使用本地模拟数据，不访问网络")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟数据的请求延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="模拟数据的请求失败概率")
+    parser.add_argument("--log-level", default="INFO", help="日志级别")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(),
+                        format="%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s")
+
+    if args.fake:
+        provider = FakeProvider(latency=args.latency, failure_rate=args.failure_rate)
+        data_dir = args.data_dir or os.path.join(DEFAULT_DATA_DIR, 'fake', SERVICE_DIRNAME)
+    else:
+        provider = AkshareProvider()
+        data_dir = args.data_dir or os.path.join(DEFAULT_DATA_DIR, SERVICE_DIRNAME)
+
+    server = make_server(provider, data_dir, args.host, args.port, args.source_concurrency)
+    threading.Thread(target=server.service.calendar.ensure_current, daemon=True).start()
+    logger.info("Serving market data on http://%s:%d (cache in %s)", *server.server_address[:2], data_dir)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
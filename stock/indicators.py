@@ -0,0 +1,253 @@
+"""技术指标计算（均线、MACD、BOLL、KDJ、成交量均线），按数据版本缓存并支持逐根追加"""
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+from instrumentation import span
+
+MA_PERIODS = (5, 10, 20, 30)
+VOLUME_MA_PERIODS = (5, 10)
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BOLL_PERIOD, BOLL_WIDTH = 20, 2
+KDJ_PERIOD, KDJ_SMOOTH = 9, 3
+
+
+def rolling_mean(values, window):
+    """用累计和计算滑动平均，前 window-1 个值为 NaN，与 pandas rolling().mean() 一致
+
+    沿最后一维计算，也可以传入 (股票数, 日期数) 的二维数组一次计算全部股票。
+    """
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    sums = np.pad(np.cumsum(np.where(valid, values, 0.0), axis=-1), pad)
+    counts = np.pad(np.cumsum(valid, axis=-1), pad)
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] >= window:
+        window_sum = sums[..., window:] - sums[..., :-window]
+        full = (counts[..., window:] - counts[..., :-window]) == window
+        result[..., window - 1:] = np.where(full, window_sum / window, np.nan)
+    return result
+
+
+def rolling_std(values, window):
+    """用累计平方和计算滑动样本标准差（ddof=1），与 pandas rolling().std() 一致"""
+    values = np.asarray(values, dtype=float)
+    # 先减去均值再累加，降低大数相减的精度损失
+    centered = values - np.nanmean(values) if len(values) else values
+    mean = rolling_mean(centered, window)
+    mean_sq = rolling_mean(centered ** 2, window)
+    var = (mean_sq - mean ** 2) * window / (window - 1)
+    return np.sqrt(np.maximum(var, 0.0))
+
+
+def ema(values, span):
+    """指数移动平均，与 pandas ewm(span, adjust=False).mean() 一致"""
+    return pd.Series(values, dtype=float).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def sma_cn(values, n, init=50.0):
+    """国内行情软件的 SMA(X, N, 1)，初始值为 init"""
+    series = pd.Series(np.concatenate(([init], np.asarray(values, dtype=float))))
+    return series.ewm(alpha=1.0 / n, adjust=False).mean().to_numpy()[1:]
+
+
+def rsv(high, low, close, period=KDJ_PERIOD):
+    """未成熟随机值，区间不足 period 时使用已有数据"""
+    llv = pd.Series(low, dtype=float).rolling(period, min_periods=1).min().to_numpy()
+    hhv = pd.Series(high, dtype=float).rolling(period, min_periods=1).max().to_numpy()
+    spread = hhv - llv
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(spread > 0, (np.asarray(close, dtype=float) - llv) / spread * 100, 50.0)
+
+
+def moving_averages(close, periods=MA_PERIODS):
+    """计算收盘价均线，返回 {'MA5': 数组, ...}"""
+    return {f'MA{period}': rolling_mean(close, period) for period in periods}
+
+
+def compute_indicators(high, low, close, volume):
+    """一次性向量化计算全部指标，返回 {指标名: 数组}"""
+    result = moving_averages(close)
+    for period in VOLUME_MA_PERIODS:
+        result[f'MAVOL{period}'] = rolling_mean(volume, period)
+
+    dif = ema(close, MACD_FAST) - ema(close, MACD_SLOW)
+    dea = ema(dif, MACD_SIGNAL)
+    result['DIF'] = dif
+    result['DEA'] = dea
+    result['MACD'] = 2 * (dif - dea)
+
+    mid = rolling_mean(close, BOLL_PERIOD)
+    std = rolling_std(close, BOLL_PERIOD)
+    result['BOLL_MID'] = mid
+    result['BOLL_UPPER'] = mid + BOLL_WIDTH * std
+    result['BOLL_LOWER'] = mid - BOLL_WIDTH * std
+
+    k = sma_cn(rsv(high, low, close), KDJ_SMOOTH)
+    d = sma_cn(k, KDJ_SMOOTH)
+    result['K'] = k
+    result['D'] = d
+    result['J'] = 3 * k - 2 * d
+    return result
+
+
+class _GrowableArray:
+    """容量按倍数增长的数组，追加为均摊 O(1)"""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=float)
+        self.size = len(values)
+        self.data = np.empty(max(16, self.size * 2))
+        self.data[:self.size] = values
+
+    def copy(self):
+        other = _GrowableArray.__new__(_GrowableArray)
+        other.size = self.size
+        other.data = self.data.copy()
+        return other
+
+    def append(self, value):
+        if self.size == len(self.data):
+            data = np.empty(len(self.data) * 2)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+        self.data[self.size] = value
+        self.size += 1
+
+    def view(self):
+        return self.data[:self.size]
+
+
+class IndicatorSet:
+    """某一版本数据的全部指标，以及逐根追加K线所需的状态"""
+
+    def __init__(self, high, low, close, volume):
+        values = compute_indicators(high, low, close, volume)
+        self.arrays = {name: _GrowableArray(array) for name, array in values.items()}
+
+        # 追加时只需要最近一个窗口内的数据
+        window = max(max(MA_PERIODS), BOLL_PERIOD, KDJ_PERIOD, max(VOLUME_MA_PERIODS))
+        self.closes = deque(np.asarray(close, dtype=float)[-window:], maxlen=window)
+        self.volumes = deque(np.asarray(volume, dtype=float)[-window:], maxlen=window)
+        self.highs = deque(np.asarray(high, dtype=float)[-KDJ_PERIOD:], maxlen=KDJ_PERIOD)
+        self.lows = deque(np.asarray(low, dtype=float)[-KDJ_PERIOD:], maxlen=KDJ_PERIOD)
+        self.ema_fast = ema(close, MACD_FAST)[-1] if len(close) else None
+        self.ema_slow = ema(close, MACD_SLOW)[-1] if len(close) else None
+
+    def __getitem__(self, name):
+        return self.arrays[name].view()
+
+    def __len__(self):
+        return self.arrays['MA5'].size
+
+    def names(self):
+        return list(self.arrays)
+
+    def copy(self):
+        """复制一份，在副本上追加K线不影响仍在显示或缓存中的原指标（只复制数组，不重新计算）"""
+        other = IndicatorSet.__new__(IndicatorSet)
+        other.arrays = {name: array.copy() for name, array in self.arrays.items()}
+        for name in ('closes', 'volumes', 'highs', 'lows'):
+            window = getattr(self, name)
+            setattr(other, name, deque(window, maxlen=window.maxlen))
+        other.ema_fast = self.ema_fast
+        other.ema_slow = self.ema_slow
+        return other
+
+    @property
+    def nbytes(self):
+        """指标数组占用的内存（含预留容量）"""
+        return sum(array.data.nbytes for array in self.arrays.values())
+
+    @staticmethod
+    def _tail_mean(window, period):
+        if len(window) < period:
+            return np.nan
+        return sum(list(window)[-period:]) / period
+
+    @staticmethod
+    def _ema_step(last, value, span):
+        if last is None:
+            return value
+        alpha = 2.0 / (span + 1)
+        return alpha * value + (1 - alpha) * last
+
+    def append(self, high, low, close, volume):
+        """追加一根新K线，每个指标只做常数次运算"""
+        self.closes.append(close)
+        self.volumes.append(volume)
+        self.highs.append(high)
+        self.lows.append(low)
+        values = {}
+        for period in MA_PERIODS:
+            values[f'MA{period}'] = self._tail_mean(self.closes, period)
+        for period in VOLUME_MA_PERIODS:
+            values[f'MAVOL{period}'] = self._tail_mean(self.volumes, period)
+
+        self.ema_fast = self._ema_step(self.ema_fast, close, MACD_FAST)
+        self.ema_slow = self._ema_step(self.ema_slow, close, MACD_SLOW)
+        dif = self.ema_fast - self.ema_slow
+        last_dea = self['DEA'][-1] if len(self) else None
+        dea = self._ema_step(last_dea, dif, MACD_SIGNAL)
+        values['DIF'] = dif
+        values['DEA'] = dea
+        values['MACD'] = 2 * (dif - dea)
+
+        mid = self._tail_mean(self.closes, BOLL_PERIOD)
+        std = np.std(list(self.closes)[-BOLL_PERIOD:], ddof=1) if len(self.closes) >= BOLL_PERIOD else np.nan
+        values['BOLL_MID'] = mid
+        values['BOLL_UPPER'] = mid + BOLL_WIDTH * std
+        values['BOLL_LOWER'] = mid - BOLL_WIDTH * std
+
+        llv, hhv = min(self.lows), max(self.highs)
+        rsv_value = (close - llv) / (hhv - llv) * 100 if hhv > llv else 50.0
+        last_k = self['K'][-1] if len(self) else 50.0
+        last_d = self['D'][-1] if len(self) else 50.0
+        k = (last_k * (KDJ_SMOOTH - 1) + rsv_value) / KDJ_SMOOTH
+        d = (last_d * (KDJ_SMOOTH - 1) + k) / KDJ_SMOOTH
+        values['K'] = k
+        values['D'] = d
+        values['J'] = 3 * k - 2 * d
+
+        for name, value in values.items():
+            self.arrays[name].append(value)
+
+
+class IndicatorEngine:
+    """按 (数据标识, 数据版本) 缓存指标
+
+    同一版本的数据只计算一次，切换均线显示或切换K线周期都直接使用缓存；
+    增量刷新时逐根追加得到的指标（见 symbol_cache.prepare_k_lines）以新版本号放入。
+    """
+
+    def __init__(self):
+        self.cache = {}  # key -> (version, IndicatorSet)
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        """返回缓存的指标，版本不一致时返回 None"""
+        with self.lock:
+            cached = self.cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        return None
+
+    def compute(self, key, version, high, low, close, volume):
+        """返回指定版本数据的指标，未缓存时计算一次"""
+        indicators = self.get(key, version)
+        if indicators is None:
+            with span('indicators.compute', key=str(key), bars=len(close)):
+                indicators = IndicatorSet(high, low, close, volume)
+            with self.lock:
+                self.cache[key] = (version, indicators)
+        return indicators
+
+    def put(self, key, version, indicators):
+        """放入在别处（如后台线程、股票缓存）计算好的指标"""
+        with self.lock:
+            self.cache[key] = (version, indicators)
+
+    def discard(self, key):
+        with self.lock:
+            self.cache.pop(key, None)
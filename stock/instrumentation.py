@@ -0,0 +1,182 @@
+"""分阶段耗时统计：记录每个阶段的耗时区间（span），保留滚动耗时分布，可导出 JSON / CSV"""
+import bisect
+import csv
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+HISTOGRAM_WINDOW = 500      # 每个阶段保留最近多少次耗时
+MAX_TRACE_SPANS = 20000     # 导出时最多保留的耗时记录数
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)  # 耗时分布区间上限（毫秒）
+
+
+def percentile(sorted_values, q):
+    """已排序样本的分位数（最近秩法）"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Tracer:
+    """记录各阶段耗时
+
+    用法：
+        with tracer.span('kline.fetch', symbol=code) as attrs:
+            df = ...
+            attrs['rows'] = len(df)   # 可以在阶段内补充属性
+
+    每个阶段保留最近 window 次耗时用于计算分位数和分布，所有耗时记录按时间顺序保存，
+    可以导出为 JSON 或 CSV。阶段内抛出的异常会被记录后继续抛出。
+    """
+
+    def __init__(self, window=HISTOGRAM_WINDOW, max_spans=MAX_TRACE_SPANS):
+        self.window = window
+        self.samples = {}          # 阶段名称 -> 最近的耗时（毫秒）
+        self.errors = Counter()    # 阶段名称 -> 失败次数
+        self.totals = Counter()    # 阶段名称 -> 总次数
+        self.trace = deque(maxlen=max_spans)
+        self.lock = threading.Lock()
+        self.enabled = True
+
+    @contextmanager
+    def span(self, name, **attrs):
+        if not self.enabled:
+            yield attrs
+            return
+        wall = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield attrs
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000, wall, error, attrs)
+
+    def record(self, name, duration_ms, wall=None, error=None, attrs=None):
+        """记录一次耗时（也可用于在别处测得的耗时）"""
+        entry = {
+            'name': name,
+            'start': wall if wall is not None else time.time() - duration_ms / 1000,
+            'duration_ms': duration_ms,
+            'thread': threading.current_thread().name,
+            'error': error,
+            'attrs': dict(attrs or {}),
+        }
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+            samples.append(duration_ms)
+            self.totals[name] += 1
+            if error is not None:
+                self.errors[name] += 1
+            self.trace.append(entry)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.errors.clear()
+            self.totals.clear()
+            self.trace.clear()
+
+    def histogram(self, name):
+        """某阶段最近耗时的分布，返回 [(区间上限毫秒, 次数)]，最后一个区间上限为 None"""
+        with self.lock:
+            values = list(self.samples.get(name, ()))
+        counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        for value in values:
+            counts[bisect.bisect_left(BUCKET_BOUNDS_MS, value)] += 1
+        return list(zip(list(BUCKET_BOUNDS_MS) + [None], counts))
+
+    def summary(self):
+        """各阶段的次数、失败次数和最近耗时的分位数"""
+        with self.lock:
+            snapshot = {name: sorted(values) for name, values in self.samples.items()}
+            totals, errors = dict(self.totals), dict(self.errors)
+        result = {}
+        for name, values in sorted(snapshot.items()):
+            result[name] = {
+                'count': totals.get(name, 0),
+                'errors': errors.get(name, 0),
+                'p50_ms': percentile(values, 50),
+                'p90_ms': percentile(values, 90),
+                'p99_ms': percentile(values, 99),
+                'max_ms': values[-1] if values else None,
+            }
+        return result
+
+    def spans(self):
+        with self.lock:
+            return list(self.trace)
+
+    def export_json(self, path):
+        summary = self.summary()
+        data = {
+            'exported_at': time.time(),
+            'summary': summary,
+            'histograms': {name: self.histogram(name) for name in summary},
+            'spans': self.spans(),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+
+    def export_csv(self, path):
+        """每行一条耗时记录，附加属性以 JSON 字符串保存在 attrs 列"""
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'start', 'duration_ms', 'thread', 'error', 'attrs'])
+            for entry in self.spans():
+                writer.writerow([entry['name'], f"{entry['start']:.6f}", f"{entry['duration_ms']:.3f}",
+                                 entry['thread'], entry['error'] or '',
+                                 json.dumps(entry['attrs'], ensure_ascii=False, default=str)])
+
+    def export(self, path):
+        """按扩展名导出为 CSV 或 JSON"""
+        if os.path.splitext(path)[1].lower() == '.csv':
+            self.export_csv(path)
+        else:
+            self.export_json(path)
+
+
+def format_summary(summary, limit=None):
+    """把 summary() 的结果格式化为等宽文本表格"""
+    # 中文表头每个字占两列宽度
+    lines = [f"{'阶段':<24}{'次数':>4}{'失败':>4}{'P50':>9}{'P90':>9}{'最大':>7}"]
+    rows = sorted(summary.items(), key=lambda item: -(item[1]['p90_ms'] or 0))
+    for name, stats in rows[:limit]:
+        lines.append(f"{name:<26}{stats['count']:>6}{stats['errors']:>6}"
+                     f"{stats['p50_ms']:>9.1f}{stats['p90_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+    return '\n'.join(lines)
+
+
+tracer = Tracer()  # 应用内共用的耗时统计
+span = tracer.span
+
+
+def traced(name):
+    """函数装饰器：每次调用记录为一个阶段"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_method(obj, method_name, name):
+    """替换对象上的某个方法，使每次调用都记录为一个阶段（用于无法修改的第三方对象，如画布的 draw）"""
+    method = getattr(obj, method_name)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with tracer.span(name):
+            return method(*args, **kwargs)
+    setattr(obj, method_name, wrapper)
@@ -0,0 +1,183 @@
+"""分时图：预先分配一个交易日的全部分钟位置，增量更新图元并使用 blit 局部重绘"""
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba
+from chart_renderer import UP_COLOR, DOWN_COLOR
+from instrumentation import traced
+from trading_calendar import TRADING_SESSIONS
+
+MORNING_START = 9 * 60 + 30    # 9:30（分钟数）
+MORNING_END = 11 * 60 + 30     # 11:30
+AFTERNOON_START = 13 * 60 + 1  # 13:01，下午第一根分钟线
+AFTERNOON_END = 15 * 60        # 15:00
+MORNING_SLOTS = MORNING_END - MORNING_START + 1  # 121
+SLOTS = MORNING_SLOTS + AFTERNOON_END - AFTERNOON_START + 1  # 241
+TICK_SLOTS = (0, 60, 120, 180, 240)
+TICK_LABELS = ('09:30', '10:30', '11:30/13:00', '14:00', '15:00')
+Y_MARGIN = 0.1  # 数据超出纵轴范围时额外留出的比例，减少完整重绘的次数
+
+
+def minute_slots(times):
+    """把分钟时间转换为分时图上的位置（0-240），不在交易时段内的返回 -1"""
+    times = pd.to_datetime(pd.Series(times))
+    minutes = (times.dt.hour * 60 + times.dt.minute).to_numpy()
+    slots = np.full(len(minutes), -1)
+    morning = (minutes >= MORNING_START) & (minutes <= MORNING_END)
+    afternoon = (minutes >= AFTERNOON_START) & (minutes <= AFTERNOON_END)
+    slots[morning] = minutes[morning] - MORNING_START
+    slots[afternoon] = minutes[afternoon] - AFTERNOON_START + MORNING_SLOTS
+    return slots
+
+
+def session_day(calendar, now=None):
+    """分时图应显示的交易日：当天开盘后为当天，否则为上一个交易日"""
+    now = now or datetime.now()
+    today = now.date()
+    if calendar.is_trading_day(today) and now.time() >= TRADING_SESSIONS[0][0]:
+        return today
+    return calendar.previous_trading_day(today)
+
+
+class IntradayChart:
+    """分时价格、均价和成交量
+
+    一个交易日只有 241 个分钟位置，数组在切换股票或交易日时一次性分配，之后每次更新
+    只写入新增（以及仍在变化的最后一根）分钟的数据，通过 set_data 更新图元，
+    再恢复背景并只重绘这几个图元。只有数据超出坐标轴范围时才完整重绘，且不会清空坐标轴。
+    """
+
+    def __init__(self, ax_price, ax_volume, canvas):
+        self.ax_price = ax_price
+        self.ax_volume = ax_volume
+        self.canvas = canvas
+        self.x = np.arange(SLOTS, dtype=float)
+        self.price = np.full(SLOTS, np.nan)
+        self.average = np.full(SLOTS, np.nan)
+        self.volume = np.zeros(SLOTS)
+        self.segments = np.zeros((SLOTS, 2, 2))  # 成交量竖线
+        self.segments[:, :, 0] = self.x[:, None]
+        self.colors = np.zeros((SLOTS, 4))
+        self.count = 0           # 已有数据的位置数（最后一个有数据的位置 + 1）
+        self.artists = []
+        self.background = None   # 不含动态图元的画布背景
+        self.active = False
+        self.up_rgba = to_rgba(UP_COLOR)
+        self.down_rgba = to_rgba(DOWN_COLOR)
+        canvas.mpl_connect('draw_event', self.on_draw)
+
+    def setup(self, title):
+        """切换到分时图或切换股票、交易日时调用：清空坐标轴并创建动态图元"""
+        self.price[:] = np.nan
+        self.average[:] = np.nan
+        self.volume[:] = 0
+        self.segments[:, :, 1] = 0
+        self.count = 0
+
+        self.ax_price.clear()
+        self.ax_volume.clear()
+        for ax in (self.ax_price, self.ax_volume):
+            ax.set_xlim(0, SLOTS - 1)
+            ax.set_xticks(TICK_SLOTS)
+            ax.set_xticklabels(TICK_LABELS)
+            ax.grid(True)
+        self.ax_price.set_title(title)
+        self.ax_volume.set_title('分时成交量')
+
+        # 动态图元不参与完整重绘，由 blit 单独绘制
+        self.price_line, = self.ax_price.plot([], [], color='blue', linewidth=1, label='价格', animated=True)
+        self.average_line, = self.ax_price.plot([], [], color='orange', linewidth=1, label='均价', animated=True)
+        self.volume_lines = LineCollection([], linewidths=1.5, animated=True)
+        self.ax_volume.add_collection(self.volume_lines)
+        self.artists = [(self.ax_price, self.price_line), (self.ax_price, self.average_line),
+                        (self.ax_volume, self.volume_lines)]
+        self.ax_price.legend(loc='upper left')
+        self.background = None
+        self.active = True
+        self.canvas.draw_idle()
+
+    def deactivate(self):
+        """离开分时图时调用，之后的完整重绘不再绘制动态图元"""
+        self.active = False
+        self.background = None
+        self.artists = []
+
+    def on_draw(self, event):
+        """完整重绘后保存背景，并补画动态图元"""
+        if not self.active:
+            return
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for ax, artist in self.artists:
+            ax.draw_artist(artist)
+
+    @traced('chart.blit')
+    def blit(self):
+        """恢复背景，只重绘动态图元"""
+        self.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+    @traced('intraday.update')
+    def update(self, df):
+        """写入分钟数据（stock_zh_a_hist_min_em 的结果），返回图表是否发生变化"""
+        if not self.active or df is None or len(df) == 0:
+            return False
+        slots = minute_slots(df['时间'])
+        close = df['收盘'].to_numpy(dtype=float)
+        volume = df['成交量'].to_numpy(dtype=float)
+        if '均价' in df:
+            average = df['均价'].to_numpy(dtype=float)
+        else:
+            # 成交量单位为手，均价 = 累计成交额 / 累计成交股数
+            with np.errstate(divide='ignore', invalid='ignore'):
+                average = np.cumsum(df['成交额'].to_numpy(dtype=float)) / np.cumsum(volume * 100)
+        previous = np.concatenate(([df['开盘'].iloc[0]], close[:-1]))
+        up = close >= previous
+
+        # 只写入新增的分钟，以及可能仍在变化的最后一根
+        keep = slots >= max(self.count - 1, 0)
+        if not keep.any():
+            return False
+        slots, close, average, volume, up = slots[keep], close[keep], average[keep], volume[keep], up[keep]
+        if (slots.max() < self.count and np.array_equal(self.price[slots], close)
+                and np.array_equal(self.volume[slots], volume)):
+            return False
+        self.price[slots] = close
+        self.average[slots] = average
+        self.volume[slots] = volume
+        self.segments[slots, 1, 1] = volume
+        self.colors[slots] = np.where(up[:, None], self.up_rgba, self.down_rgba)
+        self.count = max(self.count, int(slots.max()) + 1)
+
+        n = self.count
+        self.price_line.set_data(self.x[:n], self.price[:n])
+        self.average_line.set_data(self.x[:n], self.average[:n])
+        self.volume_lines.set_segments(self.segments[:n])
+        self.volume_lines.set_color(self.colors[:n])
+
+        if self.expand_limits() or self.background is None:
+            self.canvas.draw_idle()  # 坐标轴范围变化，完整重绘后在 on_draw 中重新保存背景
+        else:
+            self.blit()
+        return True
+
+    def expand_limits(self):
+        """数据超出坐标轴范围时扩大范围（多留出一些余量），返回是否发生变化"""
+        changed = False
+        n = self.count
+        prices = np.concatenate((self.price[:n], self.average[:n]))
+        low, high = np.nanmin(prices), np.nanmax(prices)
+        bottom, top = self.ax_price.get_ylim()
+        if self.ax_price.get_autoscaley_on() or low < bottom or high > top:
+            margin = max(high - low, high * 0.01) * Y_MARGIN
+            self.ax_price.set_ylim(low - margin, high + margin)
+            changed = True
+        max_volume = self.volume[:n].max()
+        if self.ax_volume.get_autoscaley_on() or max_volume > self.ax_volume.get_ylim()[1]:
+            self.ax_volume.set_ylim(0, max(max_volume, 1) * (1 + Y_MARGIN))
+            changed = True
+        return changed
@@ -0,0 +1,302 @@
+"""K线数据本地存储（SQLite），按 股票代码/周期/复权方式 增量更新"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser('~'), '.stock_monitor')
+DB_FILENAME = 'kline.db'
+DEFAULT_DB_PATH = os.path.join(DEFAULT_DATA_DIR, DB_FILENAME)
+
+# akshare 列名与数据库列名的对应关系
+COLUMN_MAP = {
+    '开盘': 'open',
+    '收盘': 'close',
+    '最高': 'high',
+    '最低': 'low',
+    '成交量': 'volume',
+    '成交额': 'amount',
+    '振幅': 'amplitude',
+    '涨跌幅': 'pct_change',
+    '涨跌额': 'change',
+    '换手率': 'turnover',
+}
+
+MARKET_OPEN = (9, 30)    # 开盘时间（时, 分）
+MARKET_CLOSE_HOUR = 15   # 收盘时间
+REFRESH_INTERVAL = 60    # 交易时间内重复查询的最小间隔（秒）
+DB_TIMEOUT = 30          # 数据库被其他进程锁定时的最长等待时间（秒）
+LOAD_MANY_CHUNK = 500    # load_many 每次查询的股票数量（SQLite 对参数个数有上限）
+
+
+def latest_market_close(now):
+    """返回不晚于 now 的最近一次收盘时间（按工作日近似）"""
+    close = now.replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0, microsecond=0)
+    if now < close:
+        close -= timedelta(days=1)
+    while close.weekday() >= 5:
+        close -= timedelta(days=1)
+    return close
+
+
+def period_start(date, period):
+    """返回 date 所在K线周期的起始日期"""
+    if period == 'weekly':
+        return date - timedelta(days=date.weekday())
+    if period == 'monthly':
+        return date.replace(day=1)
+    return date
+
+
+class KLineStore:
+    """本地K线仓库
+
+    首次查询时全量下载并写入数据库，之后只请求最后一根已存K线之后的新数据，
+    已经是最新数据时直接从磁盘读取，不发起网络请求。
+    """
+
+    def __init__(self, fetch_func, path=DEFAULT_DB_PATH, refresh_interval=REFRESH_INTERVAL, calendar=None):
+        self.fetch_func = fetch_func
+        self.refresh_interval = refresh_interval
+        self.calendar = calendar  # 交易日历，未提供时按工作日近似
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=DB_TIMEOUT, check_same_thread=False)
+        self.db_lock = threading.Lock()
+        self.key_locks = {}
+        self._init_db()
+
+    def _init_db(self):
+        columns = ', '.join(f'{name} REAL' for name in COLUMN_MAP.values())
+        with self.db_lock:
+            # WAL 模式下读写互不阻塞，批量分析的多个进程可以共用同一个数据库
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.db_lock, self.conn:
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS bars (
+                    symbol TEXT, period TEXT, adjust TEXT, date TEXT, {columns},
+                    PRIMARY KEY (symbol, period, adjust, date)
+                ) WITHOUT ROWID""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    symbol TEXT, period TEXT, adjust TEXT,
+                    start_date TEXT, fetched_at REAL,
+                    PRIMARY KEY (symbol, period, adjust)
+                )""")
+
+    def _key_lock(self, key):
+        with self.db_lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def _get_meta(self, key):
+        with self.db_lock:
+            return self.conn.execute(
+                "SELECT start_date, fetched_at FROM meta WHERE symbol=? AND period=? AND adjust=?",
+                key).fetchone()
+
+    def _set_meta(self, key, start_date, fetched_at):
+        with self.db_lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?, ?)",
+                              (*key, start_date, fetched_at))
+
+    def _last_dates(self, key, count=2):
+        """返回最近 count 根已存K线的日期（降序）"""
+        with self.db_lock:
+            rows = self.conn.execute(
+                "SELECT date FROM bars WHERE symbol=? AND period=? AND adjust=? "
+                "ORDER BY date DESC LIMIT ?", (*key, count)).fetchall()
+        return [row[0] for row in rows]
+
+    def _save(self, key, df, replace_after=None):
+        """写入K线，replace_after 之后的旧数据会先被删除（未完成的K线日期可能变化）"""
+        if df is None or df.empty:
+            rows = []
+        else:
+            dates = pd.to_datetime(df['日期']).dt.strftime('%Y-%m-%d')
+            values = df.reindex(columns=list(COLUMN_MAP)).astype(float)
+            rows = [(*key, date, *vals) for date, vals in zip(dates, values.itertuples(index=False))]
+        placeholders = ', '.join('?' * (4 + len(COLUMN_MAP)))
+        with self.db_lock, self.conn:
+            if replace_after is not None:
+                self.conn.execute(
+                    "DELETE FROM bars WHERE symbol=? AND period=? AND adjust=? AND date>?",
+                    (*key, replace_after))
+            self.conn.executemany(f"INSERT OR REPLACE INTO bars VALUES ({placeholders})", rows)
+
+    def _stored_close(self, key, date):
+        with self.db_lock:
+            row = self.conn.execute(
+                "SELECT close FROM bars WHERE symbol=? AND period=? AND adjust=? AND date=?",
+                (*key, date)).fetchone()
+        return row[0] if row else None
+
+    def clear(self, symbol, period, adjust):
+        """删除某只股票某个周期的全部缓存"""
+        key = (symbol, period, adjust)
+        with self.db_lock, self.conn:
+            self.conn.execute("DELETE FROM bars WHERE symbol=? AND period=? AND adjust=?", key)
+            self.conn.execute("DELETE FROM meta WHERE symbol=? AND period=? AND adjust=?", key)
+
+    def load(self, symbol, period, adjust, start_date=None, end_date=None):
+        """从磁盘读取K线，返回与 ak.stock_zh_a_hist 相同列名的 DataFrame"""
+        sql = ("SELECT date, " + ', '.join(COLUMN_MAP.values()) +
+               " FROM bars WHERE symbol=? AND period=? AND adjust=?")
+        params = [symbol, period, adjust]
+        if start_date:
+            sql += " AND date>=?"
+            params.append(pd.to_datetime(start_date).strftime('%Y-%m-%d'))
+        if end_date:
+            sql += " AND date<=?"
+            params.append(pd.to_datetime(end_date).strftime('%Y-%m-%d'))
+        sql += " ORDER BY date"
+        with span('kline.load', symbol=symbol, period=period) as attrs:
+            with self.db_lock:
+                rows = self.conn.execute(sql, params).fetchall()
+            df = pd.DataFrame(rows, columns=['日期'] + list(COLUMN_MAP))
+            df[list(COLUMN_MAP)] = df[list(COLUMN_MAP)].astype(float)
+            df['日期'] = pd.to_datetime(df['日期']).dt.date
+            df.insert(1, '股票代码', symbol)
+            attrs['rows'] = len(df)
+        return df
+
+    def symbols(self, period='daily', adjust='qfq'):
+        """本地已缓存的股票代码"""
+        with self.db_lock:
+            rows = self.conn.execute(
+                "SELECT symbol FROM meta WHERE period=? AND adjust=? ORDER BY symbol", (period, adjust)).fetchall()
+        return [row[0] for row in rows]
+
+    def last_fetched(self, period='daily', adjust='qfq'):
+        """最近一次更新任意股票的时间戳，没有数据时为 None；可用来判断由仓库数据生成的缓存是否过期"""
+        with self.db_lock:
+            row = self.conn.execute(
+                "SELECT MAX(fetched_at), COUNT(*) FROM meta WHERE period=? AND adjust=?", (period, adjust)).fetchone()
+        return None if row[1] == 0 else row[0]
+
+    def load_many(self, symbols, period, adjust, start_date=None, end_date=None, columns=('open', 'close')):
+        """一次读取多只股票的K线，不访问数据源，返回长表 DataFrame（symbol、date 和 columns 中的列）
+
+        供回测等全市场计算使用，按 LOAD_MANY_CHUNK 只股票分批查询，避免为每只股票单独构造 DataFrame。
+        """
+        unknown = [column for column in columns if column not in COLUMN_MAP.values()]
+        if unknown:
+            raise ValueError(f"Unknown K-line columns: {', '.join(unknown)}")
+        symbols = list(symbols)
+        sql = f"SELECT symbol, date, {', '.join(columns)} FROM bars WHERE period=? AND adjust=?"
+        params = [period, adjust]
+        if start_date:
+            sql += " AND date>=?"
+            params.append(pd.to_datetime(start_date).strftime('%Y-%m-%d'))
+        if end_date:
+            sql += " AND date<=?"
+            params.append(pd.to_datetime(end_date).strftime('%Y-%m-%d'))
+        rows = []
+        with span('kline.load_many', symbols=len(symbols), period=period) as attrs:
+            for i in range(0, len(symbols), LOAD_MANY_CHUNK):
+                chunk = symbols[i:i + LOAD_MANY_CHUNK]
+                with self.db_lock:
+                    rows += self.conn.execute(
+                        f"{sql} AND symbol IN ({', '.join('?' * len(chunk))})", params + chunk).fetchall()
+            df = pd.DataFrame.from_records(rows, columns=['symbol', 'date', *columns])
+            attrs['rows'] = len(df)
+        return df
+
+    def in_session(self, now):
+        """now 是否处于当天开盘之后、收盘之前（包括午间休市），此时最后一根K线仍在变化"""
+        trading_day = self.calendar.is_trading_day(now.date()) if self.calendar is not None else now.weekday() < 5
+        market_open = now.replace(hour=MARKET_OPEN[0], minute=MARKET_OPEN[1], second=0, microsecond=0)
+        return trading_day and market_open <= now < now.replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0,
+                                                                 microsecond=0)
+
+    def is_fresh(self, fetched_at, now=None):
+        """判断上次更新之后是否可能产生了新K线
+
+        盘中（开盘后、收盘前）当天的K线仍在变化，距上次更新超过 refresh_interval 即需要重新获取；
+        其余时间上次更新晚于最近一次收盘即为最新。
+        """
+        now = now or datetime.now()
+        if self.in_session(now):
+            return now.timestamp() - fetched_at < self.refresh_interval
+        if self.calendar is not None:
+            last_close = self.calendar.latest_close(now, MARKET_CLOSE_HOUR)
+        else:
+            last_close = latest_market_close(now)
+        if fetched_at >= last_close.timestamp():
+            return True
+        return now.timestamp() - fetched_at < self.refresh_interval
+
+    def get_hist(self, symbol, period='daily', adjust='qfq', start_date=None, end_date=None):
+        """与 ak.stock_zh_a_hist 参数一致，优先读取本地数据，只下载缺失部分"""
+        key = (symbol, period, adjust)
+        start_date = start_date or '19700101'
+        end_date = end_date or datetime.now().strftime('%Y%m%d')
+        with self._key_lock(key):
+            meta = self._get_meta(key)
+            if meta is None:
+                self._full_fetch(key, start_date, end_date)
+            else:
+                stored_start, fetched_at = meta
+                if start_date < stored_start:
+                    self._fetch_older(key, start_date, stored_start)
+                    stored_start = start_date
+                if not self.is_fresh(fetched_at):
+                    self._fetch_newer(key, stored_start, end_date)
+            return self.load(symbol, period, adjust, start_date, end_date)
+
+    def _fetch(self, key, start_date, end_date):
+        symbol, period, adjust = key
+        logger.info("Fetching %s K-line data for %s from %s to %s", period, symbol, start_date, end_date)
+        with span('kline.fetch', symbol=symbol, period=period, start_date=start_date, end_date=end_date) as attrs:
+            df = self.fetch_func(symbol=symbol, period=period, adjust=adjust,
+                                 start_date=start_date, end_date=end_date)
+            attrs['rows'] = 0 if df is None else len(df)
+        return df
+
+    def _full_fetch(self, key, start_date, end_date):
+        df = self._fetch(key, start_date, end_date)
+        with self.db_lock, self.conn:
+            self.conn.execute("DELETE FROM bars WHERE symbol=? AND period=? AND adjust=?", key)
+        self._save(key, df)
+        self._set_meta(key, start_date, time.time())
+
+    def _fetch_older(self, key, start_date, stored_start):
+        """请求范围早于已存范围时，补齐更早的数据"""
+        end = (datetime.strptime(stored_start, '%Y%m%d') - timedelta(days=1)).strftime('%Y%m%d')
+        df = self._fetch(key, start_date, end)
+        self._save(key, df)
+        fetched_at = self._get_meta(key)[1]
+        self._set_meta(key, start_date, fetched_at)
+
+    def _fetch_newer(self, key, stored_start, end_date):
+        """增量下载最后一根已完成K线之后的数据"""
+        last_dates = self._last_dates(key)
+        if not last_dates:
+            self._full_fetch(key, stored_start, end_date)
+            return
+
+        # 最后一根K线可能尚未完成，以前一根已完成的K线作为校验点
+        check_date = last_dates[-1]
+        check = datetime.strptime(check_date, '%Y-%m-%d')
+        delta_start = period_start(check, key[1]).strftime('%Y%m%d')
+        df = self._fetch(key, delta_start, end_date)
+        if df is None or df.empty:
+            self._set_meta(key, stored_start, time.time())
+            return
+
+        # 复权价格在除权除息后会整体变化，校验点不一致时重新全量下载
+        dates = pd.to_datetime(df['日期']).dt.strftime('%Y-%m-%d')
+        fetched_close = df['收盘'][dates == check_date]
+        stored_close = self._stored_close(key, check_date)
+        if key[2] and (fetched_close.empty or stored_close is None
+                       or abs(float(fetched_close.iloc[0]) - stored_close) > 1e-6):
+            logger.info("Adjusted prices changed for %s %s, refetching full history", key[0], key[1])
+            self._full_fetch(key, stored_start, end_date)
+            return
+
+        self._save(key, df, replace_after=check_date)
+        self._set_meta(key, stored_start, time.time())
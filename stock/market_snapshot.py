@@ -0,0 +1,89 @@
+"""全市场行情快照缓存（ak.stock_zh_a_spot_em），按股票代码建立索引"""
+import concurrent.futures
+import logging
+import threading
+import time
+from instrumentation import traced
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TTL = 30          # 快照有效期（秒）
+REFRESH_AHEAD = 0.8        # 快照使用超过有效期的该比例后，在后台提前刷新
+REFRESH_TIMEOUT = 60       # 等待刷新完成的最长时间（秒）
+
+
+class MarketSnapshot:
+    """全市场行情快照
+
+    有效期内按代码查询为字典查找，不发起网络请求；快照接近过期时在后台提前刷新，
+    同一时间只会有一个刷新请求，所有等待中的查询共享它的结果。
+    """
+
+    def __init__(self, fetch_func, ttl=SNAPSHOT_TTL, refresh_ahead=REFRESH_AHEAD):
+        self.fetch_func = fetch_func
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.df = None          # 最近一次的完整快照
+        self.rows = {}          # 代码 -> 行数据
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+        self.refresh_future = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.listeners = []     # 每次刷新完成后以新快照调用（在刷新线程中）
+
+    def age(self):
+        """当前快照已使用的时间（秒）"""
+        return time.time() - self.fetched_at
+
+    def is_fresh(self):
+        return self.df is not None and self.age() < self.ttl
+
+    def refresh(self):
+        """发起刷新并返回 Future，已有刷新在进行时直接复用"""
+        with self.lock:
+            if self.refresh_future is None or self.refresh_future.done():
+                self.refresh_future = self.executor.submit(self._do_refresh)
+            return self.refresh_future
+
+    @traced('snapshot.refresh')
+    def _do_refresh(self):
+        logger.info("Refreshing market snapshot from stock_zh_a_spot_em")
+        df = self.fetch_func()
+        rows = dict(zip(df['代码'], df.to_dict('records')))
+        with self.lock:
+            self.df = df
+            self.rows = rows
+            self.fetched_at = time.time()
+        for listener in list(self.listeners):
+            try:
+                listener(df)
+            except Exception:
+                logger.exception("Error in market snapshot listener")
+        return df
+
+    def add_listener(self, listener):
+        """登记快照刷新后的回调，回调在刷新线程中执行，应尽快返回"""
+        self.listeners.append(listener)
+
+    def get_frame(self, timeout=REFRESH_TIMEOUT):
+        """返回有效期内的完整快照，过期时等待共享的刷新结果"""
+        if not self.is_fresh():
+            self.refresh().result(timeout=timeout)
+        elif self.age() > self.ttl * self.refresh_ahead:
+            self.refresh()
+        return self.df
+
+    def get(self, code, timeout=REFRESH_TIMEOUT):
+        """按股票代码查询行情，返回字典；快照中没有该代码时返回 None"""
+        self.get_frame(timeout)
+        row = self.rows.get(code)
+        return dict(row) if row is not None else None
+
+    def get_many(self, codes):
+        """在同一份快照中批量查询，返回 {代码: 行数据}，不触发刷新"""
+        with self.lock:
+            rows = self.rows
+        return {code: rows[code] for code in codes if code in rows}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
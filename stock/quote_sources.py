@@ -0,0 +1,230 @@
+"""股票基本信息的多数据源对冲请求"""
+import concurrent.futures
+import logging
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+HEDGE_DELAY = 3.0      # 主数据源超过该时间未返回时启动下一个数据源（秒）
+SOURCE_TIMEOUT = 10    # 单个数据源的超时时间（秒），超时后视为失败，立即启动下一个数据源
+QUOTE_TIMEOUT = 60     # 整体超时时间（秒）
+MAX_QUERIES = 3        # 同时进行的查询数，线程池按每个查询可同时请求全部数据源的数量分配
+LATENCY_SAMPLES = 100  # 每个数据源保留的耗时样本数
+STOP_CHECK_INTERVAL = 0.5  # 等待期间检查是否放弃请求的间隔（秒）
+
+# 统一的股票信息格式，无法获取的字段为 'N/A'
+QUOTE_FIELDS = ['名称', '代码', '最新价', '涨跌幅', '总市值', '市盈率', '市盈率-动态', '换手率', '开盘', '最低', '最高']
+
+
+def make_quote(fields):
+    """生成统一格式的股票信息字典"""
+    return {field: fields.get(field, 'N/A') for field in QUOTE_FIELDS}
+
+
+def to_float(value):
+    """转换为浮点数，无效值（如 'N/A'、NaN）返回 None"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def format_number(value, scale=1, suffix=""):
+    """格式化显示数值，无效值显示为 --"""
+    value = to_float(value)
+    if value is None:
+        return "--"
+    return f"{value*scale:.2f}{suffix}"
+
+
+def is_valid_quote(quote):
+    """最新价必须是有效数字"""
+    return quote is not None and to_float(quote.get('最新价')) is not None
+
+
+def quote_from_snapshot(snapshot, code, timeout=SOURCE_TIMEOUT):
+    """从全市场快照（stock_zh_a_spot_em）中获取，快照过期时最多等待 timeout 秒"""
+    row = snapshot.get(code, timeout)
+    if row is None:
+        raise KeyError(f"{code} not found in market snapshot")
+    return make_quote({
+        '名称': row['名称'],
+        '代码': code,
+        '最新价': row['最新价'],
+        '涨跌幅': row['涨跌幅'],
+        '总市值': row['总市值'],
+        '市盈率-动态': row['市盈率-动态'],
+        '换手率': row['换手率'],
+        '开盘': row['今开'],
+        '最低': row['最低'],
+        '最高': row['最高'],
+    })
+
+
+def quote_from_individual_info(fetch_func, code):
+    """从个股信息（stock_individual_info_em）中获取，返回数据为 item/value 两列"""
+    df = fetch_func(symbol=code)
+    info = dict(zip(df['item'], df['value']))
+    return make_quote({
+        '名称': info.get('股票简称', code),
+        '代码': code,
+        '最新价': info.get('最新', 'N/A'),
+        '总市值': info.get('总市值', 'N/A'),
+    })
+
+
+def quote_from_hist(fetch_func, code):
+    """从最近一个交易日的日K数据（stock_zh_a_hist）中获取"""
+    start_date = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
+    df = fetch_func(symbol=code, period="daily", adjust="qfq", start_date=start_date,
+                    end_date=datetime.now().strftime('%Y%m%d'))
+    latest = df.iloc[-1]
+    return make_quote({
+        '名称': code,  # 无法获取名称，使用代码代替
+        '代码': code,
+        '最新价': latest['收盘'],
+        '涨跌幅': latest['涨跌幅'],
+        '换手率': latest['换手率'],
+        '开盘': latest['开盘'],
+        '最低': latest['最低'],
+        '最高': latest['最高'],
+    })
+
+
+class SourceStats:
+    """单个数据源的耗时与胜出次数统计"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.wins = 0
+        self.failures = 0
+        self.timeouts = 0  # 超过 SOURCE_TIMEOUT 后不再等待的次数
+
+    def summary(self):
+        samples = sorted(self.latencies)
+        if not samples:
+            return {'count': 0, 'wins': self.wins, 'failures': self.failures, 'timeouts': self.timeouts}
+        return {
+            'count': len(samples),
+            'wins': self.wins,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'p50': samples[len(samples) // 2],
+            'p90': samples[min(len(samples) - 1, int(len(samples) * 0.9))],
+            'max': samples[-1],
+        }
+
+
+class HedgedQuoteFetcher:
+    """对冲请求：先请求主数据源，超过 hedge_delay 未返回或失败时依次启动备用数据源，
+    采用最先返回的有效结果，其余请求取消（已在执行的请求结果被丢弃）。
+
+    单个数据源超过 source_timeout 未返回时不再等待，按失败处理并立即启动下一个数据源。
+    正在执行的请求无法取消，线程池按 max_queries 个查询同时请求全部数据源分配，
+    卡在慢数据源上的查询不会占满线程，使新的查询只能排队。
+    """
+
+    def __init__(self, sources, hedge_delay=HEDGE_DELAY, timeout=QUOTE_TIMEOUT, source_timeout=SOURCE_TIMEOUT,
+                 max_queries=MAX_QUERIES):
+        self.sources = sources  # [(名称, func(code) -> 统一格式字典)]，按优先级排列
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.source_timeout = source_timeout
+        self.stats = {name: SourceStats() for name, _ in sources}
+        self.stats_lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(sources) * max_queries)
+
+    def _run_source(self, name, func, code):
+        start = time.perf_counter()
+        try:
+            with span(f'quote.{name}', symbol=code):
+                quote = func(code)
+                if not is_valid_quote(quote):
+                    raise ValueError(f"Invalid quote from {name}")
+            return quote
+        except Exception:
+            with self.stats_lock:
+                self.stats[name].failures += 1
+            raise
+        finally:
+            with self.stats_lock:
+                self.stats[name].latencies.append(time.perf_counter() - start)
+
+    def fetch(self, code, should_stop=None):
+        """返回最先成功的数据源结果，should_stop 返回 True 时放弃本次请求"""
+        deadline = time.monotonic() + self.timeout
+        pending = {}  # Future -> (数据源名称, 该数据源的截止时间)
+        errors = []
+        next_index = 0
+        next_launch_at = 0.0
+
+        try:
+            while pending or next_index < len(self.sources):
+                if should_stop and should_stop():
+                    return None
+                now = time.monotonic()
+                if now >= deadline:
+                    raise TimeoutError(f"Fetching stock info for {code} timed out")
+
+                # 上一个数据源超过对冲延迟未返回或已失败时，启动下一个数据源
+                has_next = next_index < len(self.sources)
+                if has_next and (not pending or now >= next_launch_at):
+                    name, func = self.sources[next_index]
+                    next_index += 1
+                    next_launch_at = now + self.hedge_delay
+                    logger.info("Attempting to fetch stock info from %s for %s", name, code)
+                    future = self.executor.submit(self._run_source, name, func, code)
+                    pending[future] = (name, now + self.source_timeout)
+                    continue
+
+                wake_at = min([deadline] + [source_deadline for _, source_deadline in pending.values()])
+                if has_next:
+                    wake_at = min(wake_at, next_launch_at)
+                done, _ = concurrent.futures.wait(pending, timeout=max(0, min(wake_at - now, STOP_CHECK_INTERVAL)),
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                now = time.monotonic()
+                for future, (name, source_deadline) in list(pending.items()):
+                    if future in done or now < source_deadline:
+                        continue
+                    # 超时的请求不再等待（仍在执行的线程结束后自行记录耗时），立即启动下一个数据源
+                    del pending[future]
+                    future.cancel()
+                    with self.stats_lock:
+                        self.stats[name].timeouts += 1
+                    logger.warning("Fetching stock info from %s for %s timed out after %.1f s",
+                                   name, code, self.source_timeout)
+                    errors.append(f"{name}: timed out")
+                    next_launch_at = 0.0
+                for future in done:
+                    name, _ = pending.pop(future)
+                    try:
+                        quote = future.result()
+                    except Exception as e:
+                        logger.warning("Error fetching stock info from %s for %s: %s", name, code, e)
+                        errors.append(f"{name}: {e}")
+                        next_launch_at = 0.0
+                        continue
+                    with self.stats_lock:
+                        self.stats[name].wins += 1
+                    logger.info("Successfully fetched stock info from %s for %s", name, code)
+                    return quote
+            raise Exception(f"All stock info fetch methods failed: {'; '.join(errors)}")
+        finally:
+            # 取消尚未开始的请求，已在执行的请求结果直接丢弃
+            for future in pending:
+                future.cancel()
+
+    def summary(self):
+        """返回各数据源的耗时分位数与胜出次数"""
+        with self.stats_lock:
+            return {name: stats.summary() for name, stats in self.stats.items()}
+
+    def shutdown(self):
+        logger.info("Stock info sources: %s", self.summary())
+        self.executor.shutdown(wait=False)
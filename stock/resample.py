@@ -0,0 +1,59 @@
+"""由日K数据在本地合成周K、月K"""
+import numpy as np
+import pandas as pd
+
+
+def period_keys(dates, period):
+    """返回每个交易日所属的周期标识：周K为所在周的周一，月K为所在月的1日"""
+    dates = pd.to_datetime(pd.Series(dates)).reset_index(drop=True)
+    if period == 'weekly':
+        return (dates - pd.to_timedelta(dates.dt.weekday, unit='D')).values
+    if period == 'monthly':
+        return dates.dt.to_period('M').dt.start_time.values
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def resample_ohlcv(daily, period):
+    """将日K合成为周K或月K，列名与 ak.stock_zh_a_hist 返回值一致
+
+    日期取周期内最后一个交易日；开盘/收盘取首/末日，最高/最低取极值，
+    成交量、成交额、换手率求和；涨跌额、涨跌幅、振幅相对上一周期收盘价计算。
+    """
+    if daily.empty:
+        return daily.copy()
+    daily = daily.reset_index(drop=True)
+    keys = period_keys(daily['日期'], period)
+
+    # 每个交易日的昨收，周期首日的昨收即为上一周期的收盘价
+    if '涨跌额' in daily:
+        prev_close = daily['收盘'] - daily['涨跌额']
+    else:
+        prev_close = daily['收盘'].shift(1).fillna(daily['开盘'])
+
+    agg = {
+        '日期': 'last',
+        '开盘': 'first',
+        '收盘': 'last',
+        '最高': 'max',
+        '最低': 'min',
+        '成交量': 'sum',
+    }
+    for col in ('成交额', '换手率'):
+        if col in daily:
+            agg[col] = 'sum'
+    if '股票代码' in daily:
+        agg['股票代码'] = 'first'
+
+    grouped = daily.assign(_prev_close=prev_close).groupby(keys, sort=True)
+    result = grouped.agg({**agg, '_prev_close': 'first'}).reset_index(drop=True)
+
+    base = result.pop('_prev_close')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['涨跌额'] = (result['收盘'] - base).round(2)
+        result['涨跌幅'] = (result['涨跌额'] / base * 100).round(2)
+        result['振幅'] = ((result['最高'] - result['最低']) / base * 100).round(2)
+    if '换手率' in result:
+        result['换手率'] = result['换手率'].round(2)
+
+    columns = [col for col in daily.columns if col in result.columns]
+    return result[columns]
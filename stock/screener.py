@@ -0,0 +1,352 @@
+"""条件选股与提醒：每次全市场快照刷新后，对全部股票按列向量化计算选股条件"""
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import threading
+import time
+import tkinter as tk
+from datetime import date
+from tkinter import ttk
+import numpy as np
+import pandas as pd
+from batch import BATCH_DIRNAME, SUMMARY_FILENAME
+from instrumentation import span
+from intraday import session_day
+from kline_store import DEFAULT_DATA_DIR
+from quote_sources import format_number
+
+logger = logging.getLogger(__name__)
+
+RULES_FILENAME = 'screener_rules.json'
+DEFAULT_RULES_PATH = os.path.join(DEFAULT_DATA_DIR, RULES_FILENAME)
+# 均线、近期高点等需要历史数据的条件使用批量分析（batch.py）生成的汇总表
+DEFAULT_REFERENCE_PATH = os.path.join(DEFAULT_DATA_DIR, BATCH_DIRNAME, SUMMARY_FILENAME)
+ALERT_PREVIEW = 5  # 一条提醒中最多列出的股票数量
+
+QUOTE_COLUMNS = ['最新价', '涨跌幅', '换手率', '量比', '成交额', '总市值']
+# 参考数据不可用时选股面板上的说明
+REFERENCE_NOTES = {
+    'missing': "（未找到批量分析汇总表，均线和新高条件未计算）",
+    'stale': "（批量分析汇总表不是上一交易日的数据，均线和新高条件未计算）",
+}
+RESULT_COLUMNS = ('代码', '名称', '最新价', '涨跌幅', '换手率', '量比', '命中条件')
+
+DEFAULT_RULES = [
+    {'name': '涨幅超过7%', 'kind': 'change_above', 'params': {'threshold': 7}, 'alert': True},
+    {'name': '跌幅超过7%', 'kind': 'change_below', 'params': {'threshold': -7}, 'alert': False},
+    {'name': '放量换手', 'kind': 'volume_spike', 'params': {'volume_ratio': 3, 'turnover': 5}, 'alert': False},
+    {'name': '上穿MA20', 'kind': 'cross_above', 'params': {'ma': 'MA20'}, 'alert': False},
+    {'name': '下穿MA20', 'kind': 'cross_below', 'params': {'ma': 'MA20'}, 'alert': False},
+    {'name': '创250日新高', 'kind': 'new_high', 'params': {'window': 250}, 'alert': True},
+]
+
+
+# 条件函数：quote 为 {列名: float 数组}，ref 为与快照逐行对齐的参考数据（DataFrame），返回布尔数组
+def change_above(quote, ref, threshold):
+    return quote['涨跌幅'] >= threshold
+
+
+def change_below(quote, ref, threshold):
+    return quote['涨跌幅'] <= threshold
+
+
+def volume_spike(quote, ref, volume_ratio, turnover=0):
+    return (quote['量比'] >= volume_ratio) & (quote['换手率'] >= turnover)
+
+
+def cross_above(quote, ref, ma='MA20'):
+    """上一根日K收盘在均线之下（含），最新价在均线之上"""
+    line = ref[ma].to_numpy(dtype=float)
+    return (ref['收盘'].to_numpy(dtype=float) <= line) & (quote['最新价'] > line)
+
+
+def cross_below(quote, ref, ma='MA20'):
+    line = ref[ma].to_numpy(dtype=float)
+    return (ref['收盘'].to_numpy(dtype=float) >= line) & (quote['最新价'] < line)
+
+
+def new_high(quote, ref, window=250):
+    return quote['最新价'] > ref[f'{window}日最高'].to_numpy(dtype=float)
+
+
+def new_low(quote, ref, window=250):
+    return quote['最新价'] < ref[f'{window}日最低'].to_numpy(dtype=float)
+
+
+# 条件类型 -> (条件函数, 是否需要参考数据)
+RULE_KINDS = {
+    'change_above': (change_above, False),
+    'change_below': (change_below, False),
+    'volume_spike': (volume_spike, False),
+    'cross_above': (cross_above, True),
+    'cross_below': (cross_below, True),
+    'new_high': (new_high, True),
+    'new_low': (new_low, True),
+}
+
+
+class Rule:
+    """一个选股条件"""
+
+    def __init__(self, name, kind, params=None, alert=False):
+        if kind not in RULE_KINDS:
+            raise ValueError(f"Unknown rule kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.params = dict(params or {})
+        self.alert = alert
+        self.func, self.needs_reference = RULE_KINDS[kind]
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['kind'], data.get('params'), data.get('alert', False))
+
+    def to_dict(self):
+        return {'name': self.name, 'kind': self.kind, 'params': self.params, 'alert': self.alert}
+
+    def evaluate(self, quote, ref):
+        """返回命中的布尔数组；比较中的 NaN 一律视为不命中"""
+        with np.errstate(invalid='ignore'):
+            return np.asarray(self.func(quote, ref, **self.params), dtype=bool)
+
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    """读取选股条件，文件不存在时写入默认条件，便于用户修改"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return [Rule.from_dict(item) for item in json.load(f)]
+    except FileNotFoundError:
+        rules = [Rule.from_dict(item) for item in DEFAULT_RULES]
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump([rule.to_dict() for rule in rules], f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.warning("Error writing default screener rules to %s: %s", path, e)
+        return rules
+    except Exception as e:
+        logger.warning("Error loading screener rules from %s, using defaults: %s", path, e)
+        return [Rule.from_dict(item) for item in DEFAULT_RULES]
+
+
+def load_reference(path=DEFAULT_REFERENCE_PATH):
+    """读取批量分析的汇总表，以股票代码为索引；文件不存在时返回 None"""
+    try:
+        df = pd.read_csv(path, dtype={'代码': str}, encoding='utf-8-sig')
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Error loading screener reference from %s: %s", path, e)
+        return None
+    if 'status' in df:
+        df = df[df['status'] == 'ok']
+    return df.set_index('代码')
+
+
+def reference_day(calendar, now=None):
+    """参考数据应截止的交易日：快照所属交易日（开盘前为上一个交易日）的上一个交易日"""
+    day = session_day(calendar, now)
+    return calendar.previous_trading_day(day) if day is not None else None
+
+
+class Screener:
+    """选股条件引擎
+
+    每个条件是一次针对整列的 NumPy 运算，一次完整计算的耗时与条件数量成正比，与股票数量基本无关。
+    提醒只针对当天首次命中的 (条件, 股票)，同一条件下的股票在一个交易日内只提醒一次。
+
+    给出 reference_path 时，汇总表在文件修改后的下一次计算时重新读取；给出 calendar 时，
+    只使用截止日期（日期列）为快照上一个交易日的参考数据，没有这样的行时跳过需要参考数据的条件。
+    """
+
+    def __init__(self, rules, reference=None, reference_path=None, calendar=None):
+        self.rules = rules
+        self.reference = reference
+        self.reference_path = reference_path
+        self.reference_mtime = None  # 已读取的汇总表文件的修改时间，文件不存在时为 None
+        self.calendar = calendar
+        self.current = None          # (截止日期, 截止于该日期的参考数据)
+        self.reference_issue = None  # 最近一次计算时参考数据不可用的原因：'missing' / 'stale'
+        self.alerted = set()  # 当天已提醒过的 (条件名称, 代码)
+        self.alert_day = None
+        self.lock = threading.Lock()
+        self.skipped = set()  # 已记录日志的 (条件名称, 跳过原因)，同一原因只记录一次
+
+    def reload_reference(self):
+        """汇总表文件的修改时间变化时重新读取；读取失败（如批量分析正在写入）时保留旧表，下次再试"""
+        try:
+            mtime = os.stat(self.reference_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self.reference_mtime:
+            return
+        reference = load_reference(self.reference_path) if mtime is not None else None
+        if mtime is not None and reference is None:
+            return
+        logger.info("Loaded screener reference from %s: %s rows", self.reference_path,
+                    0 if reference is None else len(reference))
+        self.reference, self.reference_mtime, self.current = reference, mtime, None
+
+    def current_reference(self, now=None):
+        """返回 (可用的参考数据, 不可用时的原因)，并记录 reference_issue
+
+        参考数据只保留截止于快照上一个交易日的行；停牌等原因截止日期更早的股票不参与相关条件。
+        """
+        if self.reference_path:
+            self.reload_reference()
+        if self.reference is None:
+            self.reference_issue = 'missing'
+            return None, "no reference table"
+        self.reference_issue = None
+        if self.calendar is None or '日期' not in self.reference:
+            return self.reference, None
+        expected = reference_day(self.calendar, now)
+        if self.current is None or self.current[0] != expected:
+            dates = pd.to_datetime(self.reference['日期'], errors='coerce').dt.date
+            self.current = (expected, self.reference[(dates == expected).to_numpy()])
+        if self.current[1].empty:
+            self.reference_issue = 'stale'
+            latest = self.reference['日期'].max()
+            return None, f"reference table ends on {latest}, expected {expected}"
+        return self.current[1], None
+
+    def evaluate(self, snapshot, now=None):
+        """对全市场快照计算全部条件，返回 (命中结果 DataFrame, 新提醒 {条件名称: [代码]}, 耗时毫秒)"""
+        start = time.perf_counter()
+        with span('screener.evaluate', rows=len(snapshot), rules=len(self.rules)) as attrs:
+            codes = snapshot['代码'].astype(str).to_numpy()
+            quote = {column: pd.to_numeric(snapshot[column], errors='coerce').to_numpy(dtype=float)
+                     for column in QUOTE_COLUMNS if column in snapshot}
+            reference, reason = self.current_reference(now)
+            ref = reference.reindex(codes) if reference is not None else None
+
+            masks = np.zeros((len(self.rules), len(codes)), dtype=bool)
+            for i, rule in enumerate(self.rules):
+                if rule.needs_reference and ref is None:
+                    self._skip(rule, reason)
+                    continue
+                try:
+                    masks[i] = rule.evaluate(quote, ref)
+                except KeyError as e:
+                    self._skip(rule, f"missing column {e}")
+
+            hit_rows = np.flatnonzero(masks.any(axis=0))
+            result = snapshot.iloc[hit_rows].reindex(columns=list(RESULT_COLUMNS[:-1])).reset_index(drop=True)
+            names = np.array([rule.name for rule in self.rules], dtype=object)
+            result['命中条件'] = ['、'.join(names[masks[:, row]]) for row in hit_rows]
+            alerts = self._new_alerts(masks, codes)
+            attrs['hits'] = len(hit_rows)
+        return result, alerts, (time.perf_counter() - start) * 1000
+
+    def _skip(self, rule, reason):
+        if (rule.name, reason) not in self.skipped:
+            self.skipped.add((rule.name, reason))
+            logger.info("Skipping screener rule %s: %s", rule.name, reason)
+
+    def _new_alerts(self, masks, codes):
+        """当天首次命中的提醒条件"""
+        alerts = {}
+        with self.lock:
+            today = date.today()
+            if self.alert_day != today:
+                self.alert_day = today
+                self.alerted.clear()
+            for i, rule in enumerate(self.rules):
+                if not rule.alert:
+                    continue
+                new = [code for code in codes[masks[i]] if (rule.name, code) not in self.alerted]
+                if new:
+                    self.alerted.update((rule.name, code) for code in new)
+                    alerts[rule.name] = new
+        return alerts
+
+
+def format_alerts(alerts, preview=ALERT_PREVIEW):
+    """把新提醒合并为一条消息"""
+    lines = []
+    for name, codes in alerts.items():
+        more = f" 等{len(codes)}只" if len(codes) > preview else ""
+        lines.append(f"{name}: {', '.join(codes[:preview])}{more}")
+    return '\n'.join(lines)
+
+
+def desktop_notify(title, message):
+    """发送系统通知（macOS 使用 osascript，Linux 使用 notify-send），成功时返回 True"""
+    try:
+        system = platform.system()
+        if system == 'Darwin' and shutil.which('osascript'):
+            script = f'display notification {json.dumps(message)} with title {json.dumps(title)}'
+            subprocess.Popen(['osascript', '-e', script])
+            return True
+        if system == 'Linux' and shutil.which('notify-send'):
+            subprocess.Popen(['notify-send', title, message])
+            return True
+    except OSError as e:
+        logger.warning("Error sending desktop notification: %s", e)
+    return False
+
+
+class ScreenerPanel(ttk.Frame):
+    """选股结果表格，点击表头排序，双击查看该股票"""
+
+    def __init__(self, master, on_select):
+        super().__init__(master)
+        self.on_select = on_select
+        self.rows = pd.DataFrame(columns=RESULT_COLUMNS)
+        self.sort_column = '涨跌幅'
+        self.sort_descending = True
+
+        self.status = ttk.Label(self, text="等待行情快照...")
+        self.status.pack(fill=tk.X, pady=2)
+        self.tree = ttk.Treeview(self, columns=RESULT_COLUMNS, show='headings', height=20)
+        for column in RESULT_COLUMNS:
+            self.tree.heading(column, text=column, command=lambda c=column: self.sort_by(c))
+            width = 200 if column == '命中条件' else 70
+            self.tree.column(column, width=width, anchor=tk.W if column in ('代码', '名称', '命中条件') else tk.E)
+        self.tree.tag_configure('up', foreground='red')
+        self.tree.tag_configure('down', foreground='green')
+        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind('<Double-1>', self.on_double_click)
+
+    def update_results(self, result, elapsed_ms, reference_issue=None):
+        """reference_issue 为参考数据不可用的原因（'missing' / 'stale'），可用时为 None"""
+        self.rows = result
+        note = REFERENCE_NOTES.get(reference_issue, "")
+        self.status.config(text=f"命中 {len(result)} 只，计算耗时 {elapsed_ms:.1f} ms{note}")
+        self.refresh_tree()
+
+    def sort_by(self, column):
+        """点击同一列时切换升序、降序"""
+        if column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column, self.sort_descending = column, column not in ('代码', '名称', '命中条件')
+        self.refresh_tree()
+
+    def refresh_tree(self):
+        rows = self.rows.sort_values(self.sort_column, ascending=not self.sort_descending,
+                                     na_position='last', kind='stable')
+        self.tree.delete(*self.tree.get_children())
+        for row in rows.itertuples(index=False):
+            record = dict(zip(RESULT_COLUMNS, row))
+            change = pd.to_numeric(record['涨跌幅'], errors='coerce')
+            self.tree.insert('', tk.END, iid=record['代码'], tags=('down' if change < 0 else 'up',), values=(
+                record['代码'],
+                record['名称'],
+                format_number(record['最新价']),
+                format_number(record['涨跌幅'], suffix="%"),
+                format_number(record['换手率'], suffix="%"),
+                format_number(record['量比']),
+                record['命中条件'],
+            ))
+
+    def on_double_click(self, event):
+        code = self.tree.identify_row(event.y)
+        if code:
+            self.on_select(code)
@@ -1,6 +1,8 @@
+import argparse
+import logging
+import os
 import tkinter as tk
-from tkinter import ttk
-import akshare as ak
+from tkinter import ttk, filedialog
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import pandas as pd
@@ -10,11 +12,49 @@ import time
 import matplotlib
 import queue
 import concurrent.futures
+from collections import deque
+from functools import partial
+from chart_renderer import CandlestickRenderer, LayerBlitter, draw_k_line_chart, update_legend
+from crosshair import Crosshair, TkTooltip
+from data_provider import AkshareProvider, FakeProvider, RemoteProvider
+from kline_store import KLineStore, DEFAULT_DATA_DIR, DB_FILENAME
+from analysis import history_start_date, range_start_dates
+from market_snapshot import MarketSnapshot
+from batch import BATCH_DIRNAME, SUMMARY_FILENAME
+from screener import (Screener, ScreenerPanel, load_rules, format_alerts, desktop_notify,
+                      RULES_FILENAME)
+from trading_calendar import TradingCalendar, CALENDAR_FILENAME
+from symbol_cache import SymbolCache, SymbolState, SYMBOL_CACHE_BUDGET, prepare_k_lines, prefetch_candidates
+from watchlist import WatchlistScheduler, WatchlistPanel, WATCHLIST_FILENAME
+from intraday import IntradayChart, session_day
+from indicators import IndicatorEngine
+from instrumentation import tracer, span, traced, instrument_method, format_summary
+from quote_sources import (HedgedQuoteFetcher, quote_from_snapshot, quote_from_individual_info,
+                           quote_from_hist, to_float, format_number)
+logger = logging.getLogger(__name__)
 matplotlib.rcParams['font.sans-serif'] = ['SimHei']  # 设置中文字体
 matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
 
+QUERY_WORKERS = 3  # 查询线程数（同时进行的K线、行情等请求）
+UI_POLL_INTERVAL = 50  # 主线程处理后台结果的间隔（毫秒）
+ZOOM_BASE_SCALE = 1.1  # 每次滚轮的缩放比例
+ZOOM_COALESCE_INTERVAL = 16  # 合并滚轮事件的间隔（毫秒），约60帧每秒
+ZOOM_SETTLE_INTERVAL = 200  # 停止滚动超过该时间（毫秒）视为缩放结束，完整重绘一次以更新刻度
+MOVE_COALESCE_INTERVAL = 16  # 合并鼠标移动事件的间隔（毫秒），十字光标每帧最多更新一次
+WATCHLIST_INTERVAL = 10000  # 交易时段内自选股刷新间隔（毫秒）
+WATCHLIST_IDLE_INTERVAL = 60000  # 非交易时段检查自选股的间隔（毫秒）
+INTRADAY_INTERVAL = 5000  # 交易时段内分时数据刷新间隔（毫秒）
+INTRADAY_IDLE_INTERVAL = 60000  # 非交易时段检查是否开盘的间隔（毫秒）
+STATS_INTERVAL = 1000  # 性能统计刷新间隔（毫秒）
+PREFETCH_INTERVAL = 2000  # 检查是否可以预取的间隔（毫秒）
+PREFETCH_IDLE_DELAY = 3.0  # 距上次操作超过该时间（秒）才开始预取
+RECENT_SYMBOLS = 20  # 记录最近查询过的股票数量，用于预取
+SCREENER_INTERVAL = 30000  # 交易时段内条件选股的刷新间隔（毫秒）
+ALERT_DURATION = 8000  # 无法发送系统通知时，窗口内提醒的显示时间（毫秒）
+STATS_ROWS = 12        # 性能统计显示的阶段数（按 P90 耗时排序）
+
 class StockMonitor:
-    def __init__(self, root):
+    def __init__(self, root, provider=None, data_dir=DEFAULT_DATA_DIR, cache_budget=SYMBOL_CACHE_BUDGET):
         self.root = root
         self.root.title("股票监控")
         
@@ -51,6 +91,7 @@ class StockMonitor:
         
         # 创建K线类型选择
         self.k_type = tk.StringVar(value="日K")
+        ttk.Radiobutton(self.input_frame, text="分时", variable=self.k_type, value="分时", command=self.on_k_type_change).pack(side=tk.LEFT, padx=5)
         ttk.Radiobutton(self.input_frame, text="日K", variable=self.k_type, value="日K", command=self.on_k_type_change).pack(side=tk.LEFT, padx=5)
         ttk.Radiobutton(self.input_frame, text="周K", variable=self.k_type, value="周K", command=self.on_k_type_change).pack(side=tk.LEFT, padx=5)
         ttk.Radiobutton(self.input_frame, text="月K", variable=self.k_type, value="月K", command=self.on_k_type_change).pack(side=tk.LEFT, padx=5)
@@ -76,9 +117,18 @@ class StockMonitor:
         
         # 创建均线控制按钮
         self.show_ma = tk.BooleanVar(value=True)
-        self.ma_checkbutton = ttk.Checkbutton(self.input_frame, text="显示均线", variable=self.show_ma, command=self.update_chart)
+        self.ma_checkbutton = ttk.Checkbutton(self.input_frame, text="显示均线", variable=self.show_ma, command=self.on_ma_toggle)
         self.ma_checkbutton.pack(side=tk.LEFT, padx=5)
         
+        # 性能统计显示与导出
+        self.show_stats = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.input_frame, text="性能统计", variable=self.show_stats, command=self.on_stats_toggle).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.input_frame, text="导出统计", command=self.export_trace).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.input_frame, text="条件选股", command=self.open_screener).pack(side=tk.LEFT, padx=5)
+        self.screener_window = None
+        self.screener_panel = None
+        self.stats_job = None
+        
         # 初始化显示日K的范围输入框
         self.update_range_input_visibility()
         
@@ -93,150 +143,397 @@ class StockMonitor:
             self.info_labels[item] = ttk.Label(self.info_frame, text="--")
             self.info_labels[item].grid(row=0, column=i*2+1, padx=5)
         
+        # 性能统计区域，勾选"性能统计"后显示
+        self.stats_label = tk.Label(self.main_frame, font=('Courier', 9), justify=tk.LEFT, anchor='w')
+        
         # 创建图表区域
         self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, gridspec_kw={'height_ratios': [3, 1]}, figsize=(12, 8))
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.main_frame)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.init_chart_state()
+        
+        # 初始化数据源、本地缓存和后台线程（未指定数据源时使用 akshare）
+        self.init_services(provider or AkshareProvider(), data_dir, cache_budget)
+        self.root.after(UI_POLL_INTERVAL, self.process_ui_queue)
+        
+        # 在后台加载交易日历，本地日历不覆盖当前年份时才重新下载
+        self.executor.submit(self.trading_calendar.ensure_current)
+        
+        # 创建自选股面板，定时批量刷新
+        self.watchlist_panel = WatchlistPanel(self.main_frame, self.watchlist,
+                                              on_select=self.select_symbol, on_change=self.refresh_watchlist)
+        self.watchlist_panel.pack(side=tk.RIGHT, fill=tk.Y, padx=5, before=self.canvas.get_tk_widget())
+        self.watchlist_job = self.root.after(WATCHLIST_INTERVAL, self.refresh_watchlist)
+        
+        # 条件选股：每次快照刷新后计算，交易时段内定时刷新快照
+        self.screener_job = self.root.after(SCREENER_INTERVAL, self.refresh_screener)
+        
+        # 界面空闲时预取自选股和最近查看过的股票
+        self.prefetch_job = self.root.after(PREFETCH_INTERVAL, self.prefetch_idle)
+        
+        # 初始化图表
+        self.clear_chart()
+    
+    def init_chart_state(self):
+        """创建绘图对象和缩放状态（需要 self.ax1、self.ax2、self.canvas）"""
+        self.renderer = CandlestickRenderer(self.ax1, self.ax2)
+        instrument_method(self.canvas, 'draw', 'chart.draw')  # 记录每次完整重绘（包括 draw_idle 触发的）耗时
+        self.intraday = IntradayChart(self.ax1, self.ax2, self.canvas)  # 分时图，增量更新
+        self.intraday_code = None    # 分时图对应的股票代码
+        self.intraday_key = None     # 当前分时图显示的 (股票代码, 交易日)
+        self.intraday_future = None  # 正在进行的分时数据请求
+        self.intraday_job = None
+        # K线图十字光标，鼠标移动时只 blit 光标线；提示框为覆盖在画布上的 Tk 标签（性能测试的 Agg 画布上不创建）
+        tooltip = TkTooltip(self.canvas) if hasattr(self.canvas, 'get_tk_widget') else None
+        self.crosshair = Crosshair(self.ax1, self.ax2, self.canvas, tooltip)
         
         # 添加缩放功能
         self.canvas.mpl_connect('scroll_event', self.on_scroll)
+        self.pending_zoom_steps = 0  # 尚未处理的滚轮步数
+        self.zoom_center = None
+        self.zoom_job = None
+        # 连续缩放期间只 blit 数据图层，停止滚动后完整重绘
+        self.zoom_blitter = LayerBlitter(self.canvas, self.renderer)
+        self.zoom_settle_job = None
+        self.last_zoom_at = 0.0
         
-        # 初始化变量
-        self.is_trading_day = self.is_trading_day_check()
+        # 十字光标：鼠标移动事件合并后只处理最后一个
+        self.canvas.mpl_connect('motion_notify_event', self.on_mouse_move)
+        self.canvas.mpl_connect('figure_leave_event', self.on_mouse_leave)
+        self.pending_move = None
+        self.move_job = None
+    
+    def init_services(self, provider, data_dir=DEFAULT_DATA_DIR, cache_budget=SYMBOL_CACHE_BUDGET):
+        """创建数据源、本地缓存和后台线程，不依赖界面控件"""
+        self.provider = provider
+        self.trading_calendar = TradingCalendar(provider.tool_trade_date_hist_sina,
+                                                path=os.path.join(data_dir, CALENDAR_FILENAME))  # 本地缓存的交易日历
         self.has_queried = False
         self.current_data = None  # 存储当前数据
-        self.k_line_data = {}     # 存储不同K线类型的数据
+        self.k_line_data = {}     # K线类型 -> BarSeries
+        self.data_version = 0     # 数据版本号，K线数据更新时递增
+        self.k_line_versions = {} # 各K线类型当前数据的版本号
+        self.indicator_engine = IndicatorEngine()  # 按数据版本缓存的指标
+        self.ma_lines = []        # 当前图表中的均线
+        # 本地K线仓库，只增量下载新数据
+        self.kline_store = KLineStore(provider.stock_zh_a_hist, path=os.path.join(data_dir, DB_FILENAME),
+                                      calendar=self.trading_calendar)
+        self.market_snapshot = MarketSnapshot(provider.stock_zh_a_spot_em)  # 全市场行情快照缓存
+        # 股票信息数据源，按优先级排列，主数据源超时或失败时启动备用数据源
+        self.quote_fetcher = HedgedQuoteFetcher([
+            ("stock_zh_a_spot_em", partial(quote_from_snapshot, self.market_snapshot)),
+            ("stock_individual_info_em", partial(quote_from_individual_info, provider.stock_individual_info_em)),
+            ("stock_zh_a_hist", partial(quote_from_hist, provider.stock_zh_a_hist)),
+        ], max_queries=QUERY_WORKERS)
         
-        # 创建线程池和请求队列
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
-        self.request_queue = queue.Queue()
-        self.current_request = None
+        # 创建线程池和结果队列（后台线程的结果通过队列交给主线程）
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=QUERY_WORKERS)
+        self.ui_queue = queue.Queue()
+        self.query_generation = 0  # 查询代号，新查询会使旧查询的结果全部失效
+        self.query_futures = []    # 当前查询提交的所有请求
         self.request_lock = threading.Lock()
         
-        # 初始化图表
-        self.clear_chart()
+        # 自选股刷新调度
+        self.watchlist = WatchlistScheduler(self.market_snapshot, self.kline_store,
+                                            path=os.path.join(data_dir, WATCHLIST_FILENAME))
+        
+        # 已加载股票的内存缓存，切换回最近查看的股票时不再请求网络；预取只使用一个线程，不占用查询线程
+        self.symbol_cache = SymbolCache(cache_budget)
+        self.prefetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.prefetch_future = None
+        self.prefetch_failed = set()  # 预取失败的股票（如代码有误），不再重复尝试
+        self.recent_symbols = deque(maxlen=RECENT_SYMBOLS)
+        self.last_activity = time.monotonic()
+        
+        # 条件选股，均线、新高等条件以批量分析的汇总表作为参考数据（文件更新后自动重新读取，只使用上一交易日的数据）
+        self.screener = Screener(load_rules(os.path.join(data_dir, RULES_FILENAME)),
+                                 reference_path=os.path.join(data_dir, BATCH_DIRNAME, SUMMARY_FILENAME),
+                                 calendar=self.trading_calendar)
+        self.screener_result = None  # 最近一次的 (命中结果, 耗时毫秒)
+        self.market_snapshot.add_listener(self.on_snapshot_refreshed)
     
-    def clear_chart(self):
+    def clear_chart(self, title="请输入股票代码并点击查询"):
         """清空图表显示"""
+        self.intraday.deactivate()
+        self.intraday_key = None
+        self.cancel_zoom_gesture()
+        self.crosshair.deactivate()
         self.ax1.clear()
         self.ax2.clear()
-        self.ax1.set_title("请输入股票代码并点击查询")
+        self.ma_lines = []
+        self.ax1.set_title(title)
         self.ax1.grid(True)
         self.ax2.grid(True)
         self.canvas.draw()
     
     def query_stock(self):
-        """查询股票数据"""
-        # 清空当前显示
-        self.show_error("正在获取数据...")
-        
-        # 更新股票信息
-        self.update_stock_info()
-        
-        # 获取所有K线类型的数据
-        self.fetch_all_k_line_data()
+        """查询股票数据，网络请求在后台线程中进行，不阻塞UI"""
+        # 在主线程中读取输入框内容
+        stock_code = self.stock_code.get()
+        start_dates = self.get_range_start_dates()
+        self.last_activity = time.monotonic()
+        if stock_code in self.recent_symbols:
+            self.recent_symbols.remove(stock_code)
+        self.recent_symbols.appendleft(stock_code)
         
         # 标记已经查询过
         self.has_queried = True
+        generation = self.start_new_query()
+        self.intraday_code = stock_code
         
-        # 更新当前K线类型的图表
-        self.update_chart()
+        # 最近查看过或已预取的股票直接从内存显示
+        state = self.symbol_cache.get(stock_code, start_dates)
+        if state is not None:
+            self.show_cached_symbol(state, generation)
+        else:
+            # 清空当前显示
+            self.show_error("正在获取数据...")
+            self.k_line_data = {}
+            self.current_data = None
+            self.clear_chart("正在获取数据...")
+            
+            # 行情和K线请求并行执行，每完成一步就交给主线程显示，全部完成后放入缓存
+            state = SymbolState(stock_code, start_dates)
+            self.submit_query_task(generation, self.update_stock_info, stock_code, generation, state)
+            self.submit_query_task(generation, self.fetch_all_k_line_data, stock_code, start_dates, generation, state)
+        if self.k_type.get() == "分时":
+            self.start_intraday()
     
-    def fetch_all_k_line_data(self):
-        """获取所有K线类型的数据"""
+    def show_cached_symbol(self, state, generation):
+        """立即显示缓存中的股票，再在后台更新过期的行情和K线
+
+        行情超过快照有效期时，优先取自有效期内的全市场快照，否则发起对冲请求；
+        缓存之后可能产生了新K线（盘中超过K线仓库的刷新间隔）时，在后台重新获取K线。
+        """
+        self.k_line_data = {}
+        for k_type, bars in state.bars.items():
+            self.on_k_line_ready(k_type, bars, state.indicators[k_type])
+        if state.quote is not None:
+            self.update_info_display(state.quote)
+        else:
+            self.show_error("正在获取数据...")
+        
+        refresh_k_lines = not self.kline_store.is_fresh(state.loaded_at)
+        target = SymbolState(state.code, state.start_dates) if refresh_k_lines else state
+        if state.quote is not None and state.quote_age() < self.market_snapshot.ttl:
+            target.set_quote(state.quote, state.quote_at)
+        elif not self.use_snapshot_quote(target):
+            self.submit_query_task(generation, self.update_stock_info, state.code, generation, target)
+        if refresh_k_lines:
+            self.submit_query_task(generation, self.fetch_all_k_line_data, state.code, state.start_dates,
+                                   generation, target, state)
+    
+    def use_snapshot_quote(self, state):
+        """全市场快照在有效期内时直接从中取出行情并显示，返回是否成功"""
+        if not self.market_snapshot.is_fresh():
+            return False
         try:
-            stock_code = self.stock_code.get()
-            end_date = datetime.now().strftime('%Y%m%d')
-            
-            # 获取日K数据
-            try:
-                daily_months = int(self.daily_range.get())
-                if daily_months < 1:
-                    daily_months = 24  # 如果输入无效，使用默认值
-            except ValueError:
-                daily_months = 24
-            start_date = (datetime.now() - timedelta(days=daily_months*30)).strftime('%Y%m%d')
-            future = self.fetch_data_async(ak.stock_zh_a_hist, 
-                                         symbol=stock_code, 
-                                         period="daily", 
-                                         adjust="qfq", 
-                                         start_date=start_date, 
-                                         end_date=end_date)
-            self.k_line_data["日K"] = future.result(timeout=10)
-            
-            # 获取周K数据
+            quote = quote_from_snapshot(self.market_snapshot, state.code)
+        except Exception:
+            return False  # 快照中没有该代码，改用对冲请求
+        state.set_quote(quote, self.market_snapshot.fetched_at)
+        self.update_info_display(quote)
+        return True
+    
+    def start_new_query(self):
+        """开始新查询：递增查询代号，并取消旧查询中尚未开始的请求"""
+        with self.request_lock:
+            self.query_generation += 1
+            # 已经在执行的请求无法取消，其结果会因代号过期而被丢弃
+            for future in self.query_futures:
+                future.cancel()
+            self.query_futures = []
+            return self.query_generation
+    
+    def submit_query_task(self, generation, func, *args):
+        """为指定代号的查询提交后台请求，查询已过期时不再提交"""
+        with self.request_lock:
+            if self.is_stale(generation):
+                return None
+            future = self.executor.submit(func, *args)
+            self.query_futures.append(future)
+            return future
+    
+    def is_stale(self, generation):
+        """判断该代号的查询是否已被新查询取代"""
+        return generation != self.query_generation
+    
+    def post_to_ui(self, generation, callback, *args):
+        """从后台线程把结果交给主线程处理，generation 为 None 时不随查询失效"""
+        self.ui_queue.put((generation, callback, args))
+    
+    def process_ui_queue(self):
+        """在主线程中处理后台线程送回的结果"""
+        while True:
             try:
-                weekly_years = int(self.weekly_range.get())
-                if weekly_years < 1:
-                    weekly_years = 10  # 如果输入无效，使用默认值
-            except ValueError:
-                weekly_years = 10
-            start_date = (datetime.now() - timedelta(days=weekly_years*365)).strftime('%Y%m%d')
-            future = self.fetch_data_async(ak.stock_zh_a_hist, 
-                                         symbol=stock_code, 
-                                         period="weekly", 
-                                         adjust="qfq", 
-                                         start_date=start_date, 
-                                         end_date=end_date)
-            self.k_line_data["周K"] = future.result(timeout=10)
-            
-            # 获取月K数据
+                generation, callback, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if generation is not None and self.is_stale(generation):
+                continue  # 丢弃旧查询的结果，避免覆盖新数据
             try:
-                monthly_years = int(self.monthly_range.get())
-                if monthly_years < 1:
-                    monthly_years = 20  # 如果输入无效，使用默认值
-            except ValueError:
-                monthly_years = 20
-            start_date = (datetime.now() - timedelta(days=monthly_years*365)).strftime('%Y%m%d')
-            future = self.fetch_data_async(ak.stock_zh_a_hist, 
-                                         symbol=stock_code, 
-                                         period="monthly", 
-                                         adjust="qfq", 
-                                         start_date=start_date, 
-                                         end_date=end_date)
-            self.k_line_data["月K"] = future.result(timeout=10)
-            
+                with span(f'ui.{getattr(callback, "__name__", "callback")}'):
+                    callback(*args)
+            except Exception:
+                logger.exception("Error processing UI update")
+        self.root.after(UI_POLL_INTERVAL, self.process_ui_queue)
+    
+    def select_symbol(self, stock_code):
+        """在自选股中双击某只股票时查询该股票"""
+        self.stock_code.delete(0, tk.END)
+        self.stock_code.insert(0, stock_code)
+        self.query_stock()
+    
+    def refresh_watchlist(self):
+        """提交一轮自选股刷新，并安排下一轮（非交易时段降低刷新频率）"""
+        if self.watchlist_job is not None:
+            self.root.after_cancel(self.watchlist_job)
+        trading = self.trading_calendar.is_trading_time()
+        if self.watchlist.symbols and (trading or self.watchlist.has_unfilled()):
+            start_date = history_start_date(self.get_range_start_dates())
+            future = self.watchlist.submit_cycle(start_date, datetime.now().strftime('%Y%m%d'))
+            if future is not None:
+                future.add_done_callback(self.on_watchlist_cycle_done)
+        interval = WATCHLIST_INTERVAL if trading else WATCHLIST_IDLE_INTERVAL
+        self.watchlist_job = self.root.after(interval, self.refresh_watchlist)
+    
+    def on_watchlist_cycle_done(self, future):
+        """在后台线程中调用，把发生变化的行交给主线程更新"""
+        try:
+            changed = future.result()
         except Exception as e:
-            print(f"Error fetching K-line data: {e}")
-            self.show_error("获取K线数据失败")
+            logger.warning("Error refreshing watchlist: %s", e)
+            return
+        if changed:
+            self.post_to_ui(None, self.watchlist_panel.update_rows, changed)
     
-    def cancel_current_request(self):
-        """取消当前正在进行的网络请求"""
-        with self.request_lock:
-            if self.current_request and not self.current_request.done():
-                self.current_request.cancel()
-                self.current_request = None
+    def start_intraday(self):
+        """进入分时模式或查询新股票时，立即请求分时数据并开始定时刷新"""
+        self.intraday_future = None  # 旧股票的请求结果会因查询代号过期而被丢弃
+        self.request_intraday()
+        self.schedule_intraday_poll()
     
-    def fetch_data_async(self, func, *args, **kwargs):
-        """异步获取数据"""
-        self.cancel_current_request()  # 取消之前的请求
-        with self.request_lock:
-            self.current_request = self.executor.submit(func, *args, **kwargs)
-            return self.current_request
+    def stop_intraday(self):
+        """离开分时模式时停止定时刷新"""
+        if self.intraday_job is not None:
+            self.root.after_cancel(self.intraday_job)
+            self.intraday_job = None
+        self.intraday.deactivate()
+        self.intraday_key = None
     
-    def is_trading_day_check(self):
+    def schedule_intraday_poll(self):
+        """安排下一次刷新，非交易时段只定时检查是否开盘"""
+        if self.intraday_job is not None:
+            self.root.after_cancel(self.intraday_job)
+        interval = INTRADAY_INTERVAL if self.trading_calendar.is_trading_time() else INTRADAY_IDLE_INTERVAL
+        self.intraday_job = self.root.after(interval, self.poll_intraday)
+    
+    def poll_intraday(self):
+        """定时刷新分时数据，只在交易时段内发起请求"""
+        self.intraday_job = None
+        if self.k_type.get() != "分时" or self.intraday_code is None:
+            return
+        if self.trading_calendar.is_trading_time():
+            self.request_intraday()
+        self.schedule_intraday_poll()
+    
+    def request_intraday(self):
+        """在后台请求分时数据，上一次请求尚未完成时跳过"""
+        if self.intraday_future is not None and not self.intraday_future.done():
+            return
+        day = session_day(self.trading_calendar)
+        generation = self.query_generation
+        self.intraday_future = self.submit_query_task(generation, self.fetch_intraday,
+                                                      self.intraday_code, day, generation)
+    
+    def fetch_intraday(self, stock_code, day, generation):
+        """在后台线程中获取某个交易日的1分钟数据"""
+        try:
+            day_text = day.strftime('%Y-%m-%d')
+            with span('intraday.fetch', symbol=stock_code):
+                df = self.provider.stock_zh_a_hist_min_em(symbol=stock_code,
+                                                          start_date=f"{day_text} 09:30:00",
+                                                          end_date=f"{day_text} 15:00:00",
+                                                          period="1",
+                                                          adjust="")
+            self.post_to_ui(generation, self.on_intraday_ready, stock_code, day, df)
+        except Exception as e:
+            logger.warning("Error fetching intraday data: %s", e)
+            self.post_to_ui(generation, self.show_error, "获取分时数据失败")
+    
+    def on_intraday_ready(self, stock_code, day, df):
+        """分时数据就绪后增量更新图表，切换股票或交易日时才重建图表"""
+        if self.k_type.get() != "分时":
+            return
+        if (stock_code, day) != self.intraday_key:
+            self.intraday_key = (stock_code, day)
+            self.current_data = None
+            self.ma_lines = []
+            self.cancel_zoom_gesture()
+            self.crosshair.deactivate()
+            self.intraday.setup(f'{day.strftime("%Y-%m-%d")} 分时走势')
+        self.intraday.update(df)
+    
+    def get_range_start_dates(self):
+        """根据范围输入框计算各K线类型的起始日期"""
+        # 日K
         try:
-            # 获取交易日历
-            trade_cal = ak.tool_trade_date_hist_sina()
-            today = datetime.now().strftime('%Y-%m-%d')
-            return today in trade_cal['trade_date'].values
-        except:
-            return True  # 如果获取失败，默认认为是交易日
-    
-    def get_last_trading_day_data(self, stock_code):
+            daily_months = int(self.daily_range.get())
+            if daily_months < 1:
+                daily_months = 24  # 如果输入无效，使用默认值
+        except ValueError:
+            daily_months = 24
+        
+        # 周K
         try:
-            # 获取日K数据
-            df = ak.stock_zh_a_hist(symbol=stock_code, period="daily", adjust="qfq")
-            # 获取最近一个交易日的数据
-            return df.iloc[0]
-        except:
-            return None
-    
-    def calculate_ma(self, df, periods=[5, 10, 20, 30]):
-        ma_data = {}
-        for period in periods:
-            ma_data[f'MA{period}'] = df['收盘'].rolling(window=period).mean()
-        return ma_data
+            weekly_years = int(self.weekly_range.get())
+            if weekly_years < 1:
+                weekly_years = 10  # 如果输入无效，使用默认值
+        except ValueError:
+            weekly_years = 10
+        
+        # 月K
+        try:
+            monthly_years = int(self.monthly_range.get())
+            if monthly_years < 1:
+                monthly_years = 20  # 如果输入无效，使用默认值
+        except ValueError:
+            monthly_years = 20
+        
+        return range_start_dates(daily_months, weekly_years, monthly_years)
+    
+    def fetch_all_k_line_data(self, stock_code, start_dates, generation, state, previous=None):
+        """在后台线程中获取所有K线类型的数据（只请求一次日K，周K、月K由日K合成），指标也在后台计算
+
+        previous 为缓存中同一只股票的旧数据，只新增了K线时指标逐根追加。
+        """
+        try:
+            for k_type, bars, indicators in prepare_k_lines(self.kline_store, stock_code, start_dates,
+                                                            previous=previous):
+                if self.is_stale(generation):
+                    return
+                state.bars[k_type] = bars
+                state.indicators[k_type] = indicators
+                self.post_to_ui(generation, self.on_k_line_ready, k_type, bars, indicators)
+            state.loaded_at = time.time()
+            self.symbol_cache.put(state)
+            
+        except Exception as e:
+            logger.warning("Error fetching K-line data: %s", e)
+            self.post_to_ui(generation, self.show_error, "获取K线数据失败")
+    
+    def on_k_line_ready(self, k_type, bars, indicators):
+        """某个K线类型的数据就绪后，保存并刷新当前显示的图表"""
+        self.k_line_data[k_type] = bars
+        self.data_version += 1
+        self.k_line_versions[k_type] = self.data_version
+        self.indicator_engine.put(k_type, self.data_version, indicators)
+        if k_type == self.k_type.get():
+            self.update_chart()
+    
+    def is_trading_day_check(self):
+        """今天是否为交易日（本地日历二分查找，日历不可用时按工作日判断）"""
+        return self.trading_calendar.is_trading_day()
     
     def on_k_type_change(self):
         """处理K线类型切换"""
@@ -245,86 +542,33 @@ class StockMonitor:
         
         if not self.has_queried:
             return  # 如果还没有查询过，不执行任何操作
+        
+        if self.k_type.get() == "分时":
+            self.start_intraday()
+            return
+        self.stop_intraday()
             
         # 更新图表显示
         self.update_chart()
     
-    def update_stock_info(self):
-        """更新股票信息"""
+    def update_stock_info(self, stock_code, generation, state=None):
+        """在后台线程中获取股票信息，完成后交给主线程显示，并保存到 state 中"""
         try:
-            stock_code = self.stock_code.get()
-            stock_info = None
-
-            # 尝试使用 stock_zh_a_spot_em 获取实时数据
-            try:
-                print(f"Attempting to fetch stock info from stock_zh_a_spot_em for {stock_code}")
-                future = self.fetch_data_async(ak.stock_zh_a_spot_em)
-                df = future.result(timeout=60)  # 增加超时时间到60秒
-                stock_info = df[df['代码'] == stock_code].iloc[0]
-                print(f"Successfully fetched stock info from stock_zh_a_spot_em for {stock_code}")
-            except Exception as e:
-                print(f"Error fetching stock info from stock_zh_a_spot_em for {stock_code}: {e}")
-
-            # 如果 stock_zh_a_spot_em 失败，尝试使用 stock_individual_info_em
-            if stock_info is None:
-                try:
-                    print(f"Attempting to fetch stock info from stock_individual_info_em for {stock_code}")
-                    future = self.fetch_data_async(ak.stock_individual_info_em, symbol=stock_code)
-                    df = future.result(timeout=60)  # 增加超时时间到60秒
-                    stock_info = df.iloc[0]
-                    # 将 stock_individual_info_em 返回的数据转换为与 stock_zh_a_spot_em 相同的格式
-                    stock_info = {
-                        '名称': stock_info['股票简称'],
-                        '代码': stock_code,
-                        '最新价': stock_info['最新价'],
-                        '涨跌幅': stock_info['涨跌幅'],
-                        '总市值': stock_info['总市值'],
-                        '市盈率': stock_info['市盈率-动态'],
-                        '市盈率-动态': stock_info['市盈率-动态'],
-                        '换手率': stock_info['换手率'],
-                        '开盘': stock_info['开盘'],
-                        '最低': stock_info['最低'],
-                        '最高': stock_info['最高']
-                    }
-                    print(f"Successfully fetched stock info from stock_individual_info_em for {stock_code}")
-                except Exception as e:
-                    print(f"Error fetching stock info from stock_individual_info_em for {stock_code}: {e}")
-
-            # 如果 stock_individual_info_em 也失败，尝试使用 stock_zh_a_hist 获取最新交易日数据
+            # 对冲请求 stock_zh_a_spot_em / stock_individual_info_em / stock_zh_a_hist，采用最先返回的结果
+            with span('quote.total', symbol=stock_code):
+                stock_info = self.quote_fetcher.fetch(stock_code, should_stop=lambda: self.is_stale(generation))
             if stock_info is None:
-                try:
-                    print(f"Attempting to fetch stock info from stock_zh_a_hist for {stock_code}")
-                    future = self.fetch_data_async(ak.stock_zh_a_hist, symbol=stock_code, period="daily", adjust="qfq")
-                    df = future.result(timeout=60)  # 增加超时时间到60秒
-                    latest_data = df.iloc[0]
-                    stock_info = {
-                        '名称': stock_code,  # 无法获取名称，使用代码代替
-                        '代码': stock_code,
-                        '最新价': latest_data['收盘'],
-                        '涨跌幅': latest_data['涨跌幅'],
-                        '总市值': 'N/A',  # 无法获取总市值
-                        '市盈率': 'N/A',  # 无法获取市盈率
-                        '市盈率-动态': 'N/A',
-                        '换手率': 'N/A',  # 无法获取换手率
-                        '开盘': latest_data['开盘'],
-                        '最低': latest_data['最低'],
-                        '最高': latest_data['最高']
-                    }
-                    print(f"Successfully fetched stock info from stock_zh_a_hist for {stock_code}")
-                except Exception as e:
-                    print(f"Error fetching stock info from stock_zh_a_hist for {stock_code}: {e}")
-
-            # 如果所有方法都失败，抛出异常
-            if stock_info is None:
-                raise Exception("All stock info fetch methods failed")
+                return  # 查询已被新查询取代
+            if state is not None:
+                state.set_quote(stock_info)
 
             # 在主线程中更新UI
-            self.root.after(0, lambda: self.update_info_display(stock_info))
+            self.post_to_ui(generation, self.update_info_display, stock_info)
             
         except Exception as e:
-            print(f"Error updating stock info: {e}")
+            logger.warning("Error updating stock info: %s", e)
             # 显示错误信息
-            self.root.after(0, lambda: self.show_error("获取股票信息失败"))
+            self.post_to_ui(generation, self.show_error, "获取股票信息失败")
     
     def show_error(self, message):
         """显示错误信息"""
@@ -340,27 +584,26 @@ class StockMonitor:
             self.info_labels["股票代码"].config(text=stock_info['代码'])
             
             # 更新价格信息（带颜色）
-            current_price = float(stock_info['最新价'])
-            change_ratio = float(stock_info['涨跌幅'])
+            change_ratio = to_float(stock_info['涨跌幅'])
             
             # 设置价格颜色
-            price_color = 'red' if change_ratio >= 0 else 'green'
-            self.info_labels["当前价格"].config(text=f"{current_price:.2f}", foreground=price_color)
-            self.info_labels["涨跌比例"].config(text=f"{change_ratio:.2f}%", foreground=price_color)
+            price_color = 'green' if change_ratio is not None and change_ratio < 0 else 'red'
+            self.info_labels["当前价格"].config(text=format_number(stock_info['最新价']), foreground=price_color)
+            self.info_labels["涨跌比例"].config(text=format_number(stock_info['涨跌幅'], suffix="%"), foreground=price_color)
             
-            # 更新其他信息
-            self.info_labels["市值"].config(text=f"{float(stock_info['总市值'])/100000000:.2f}亿")
-            self.info_labels["动态市盈率"].config(text=f"{float(stock_info['市盈率']):.2f}")
-            self.info_labels["静态市盈率"].config(text=f"{float(stock_info['市盈率-动态']):.2f}")
-            self.info_labels["换手率"].config(text=f"{float(stock_info['换手率']):.2f}%")
+            # 更新其他信息（备用数据源无法获取的字段显示为 --）
+            self.info_labels["市值"].config(text=format_number(stock_info['总市值'], scale=1e-8, suffix="亿"))
+            self.info_labels["动态市盈率"].config(text=format_number(stock_info['市盈率-动态']))
+            self.info_labels["静态市盈率"].config(text=format_number(stock_info['市盈率']))
+            self.info_labels["换手率"].config(text=format_number(stock_info['换手率'], suffix="%"))
             
             # 更新开盘、最低、最高价
-            self.info_labels["开盘价"].config(text=f"{float(stock_info['开盘']):.2f}")
-            self.info_labels["最低价"].config(text=f"{float(stock_info['最低']):.2f}")
-            self.info_labels["最高价"].config(text=f"{float(stock_info['最高']):.2f}")
+            self.info_labels["开盘价"].config(text=format_number(stock_info['开盘']))
+            self.info_labels["最低价"].config(text=format_number(stock_info['最低']))
+            self.info_labels["最高价"].config(text=format_number(stock_info['最高']))
             
         except Exception as e:
-            print(f"Error updating info display: {e}")
+            logger.exception("Error updating info display")
             self.show_error("更新显示信息失败")
     
     def get_time_range_limits(self, k_type):
@@ -377,64 +620,110 @@ class StockMonitor:
             min_range = (now - timedelta(days=365))    # 1年
         return max_range, min_range
 
+    def get_zoom_width_limits(self, k_type):
+        """获取不同K线类型可见范围的最小、最大宽度（天）"""
+        now = datetime.now()
+        max_range, min_range = self.get_time_range_limits(k_type)
+        return (now - min_range).days, (now - max_range).days
+
     def on_scroll(self, event):
-        if event.inaxes == self.ax1 or event.inaxes == self.ax2:
-            if self.current_data is None:
-                return
-                
-            # 获取当前x轴范围
-            cur_xlim = self.ax1.get_xlim()
-            
-            # 计算缩放比例
-            base_scale = 1.1
-            scale = base_scale if event.button == 'up' else 1/base_scale
-            
-            # 计算新的范围
-            new_width = (cur_xlim[1] - cur_xlim[0]) / scale
-            
-            # 获取数据范围
-            data_xlim = self.ax1.get_xlim()
-            
-            # 获取当前K线类型的时间范围限制
-            k_type = self.k_type.get()
-            max_range, min_range = self.get_time_range_limits(k_type)
-            
-            # 限制最小缩放（根据K线类型限制最小时间范围）
-            min_width = (data_xlim[1] - max_range.timestamp())
-            if new_width < min_width:
-                return
-            
-            # 限制最大缩放（根据K线类型限制最大时间范围）
-            max_width = (data_xlim[1] - min_range.timestamp())
-            if new_width > max_width:
-                return
-            
-            # 获取鼠标位置对应的数据坐标
-            if event.inaxes == self.ax1:
-                xdata = event.xdata
-            else:
-                # 如果是在成交量图表上，需要转换坐标
-                xdata = self.ax1.transData.inverted().transform(
-                    self.ax2.transData.transform((event.xdata, 0)))[0]
-            
-            # 计算新的中心点
-            relx = (cur_xlim[1] - xdata) / (cur_xlim[1] - cur_xlim[0])
-            
-            # 计算新的范围
-            new_xlim = [xdata - new_width*(1-relx), xdata + new_width*relx]
-            
-            # 确保不超出数据范围
-            new_xlim[0] = max(new_xlim[0], data_xlim[0])
-            new_xlim[1] = min(new_xlim[1], data_xlim[1])
-            
-            # 设置新的范围
-            self.ax1.set_xlim(new_xlim)
-            
-            # 同步更新成交量图表的x轴范围
-            self.ax2.set_xlim(new_xlim)
-            
-            # 重绘图表
-            self.canvas.draw()
+        """滚轮缩放：累积连续的滚轮事件，合并为一次重绘"""
+        self.last_activity = time.monotonic()
+        if event.inaxes not in (self.ax1, self.ax2) or self.current_data is None or self.k_type.get() == "分时":
+            return
+        self.pending_zoom_steps += 1 if event.button == 'up' else -1
+        self.zoom_center = event.xdata  # 两个图表共用同一日期坐标
+        if self.zoom_job is None:
+            self.zoom_job = self.root.after(ZOOM_COALESCE_INTERVAL, self.apply_zoom)
+
+    @traced('chart.zoom')
+    def apply_zoom(self):
+        """按累积的滚轮步数缩放，以鼠标位置为中心"""
+        self.zoom_job = None
+        steps, self.pending_zoom_steps = self.pending_zoom_steps, 0
+        if steps == 0 or self.current_data is None or self.renderer.data is None:
+            return
+        
+        # 获取当前x轴范围和数据范围
+        cur_xlim = self.ax1.get_xlim()
+        x = self.renderer.data[0]
+        data_min, data_max = x[0], x[-1]
+        
+        # 计算新的范围宽度，并根据K线类型限制最小、最大时间范围
+        new_width = (cur_xlim[1] - cur_xlim[0]) / ZOOM_BASE_SCALE ** steps
+        min_width, max_width = self.get_zoom_width_limits(self.k_type.get())
+        new_width = min(max(new_width, min_width), max_width, data_max - data_min)
+        
+        # 以鼠标位置为中心计算新的范围
+        xdata = self.zoom_center
+        relx = (cur_xlim[1] - xdata) / (cur_xlim[1] - cur_xlim[0])
+        new_xlim = [xdata - new_width*(1-relx), xdata + new_width*relx]
+        
+        # 确保不超出数据范围（平移而不改变宽度）
+        if new_xlim[0] < data_min:
+            new_xlim = [data_min, data_min + new_width]
+        if new_xlim[1] > data_max:
+            new_xlim = [data_max - new_width, data_max]
+        
+        self.set_view(new_xlim, continuous=True)
+
+    def on_mouse_move(self, event):
+        """记录最新的鼠标位置，合并为每帧一次十字光标更新"""
+        self.pending_move = event
+        if self.move_job is None:
+            self.move_job = self.root.after(MOVE_COALESCE_INTERVAL, self.apply_mouse_move)
+
+    def apply_mouse_move(self):
+        self.move_job = None
+        event, self.pending_move = self.pending_move, None
+        # 缩放期间十字光标的背景不含数据图层，缩放结束后再响应
+        if event is not None and not self.zoom_blitter.active:
+            self.crosshair.on_move(event)
+
+    def on_mouse_leave(self, event):
+        """鼠标离开图表时丢弃尚未处理的移动事件并隐藏十字光标"""
+        if self.move_job is not None:
+            self.root.after_cancel(self.move_job)
+            self.move_job = None
+        self.pending_move = None
+        self.crosshair.hide()
+
+    def set_view(self, xlim, continuous=False):
+        """设置可见范围：只重建可见范围内的K线图元
+
+        continuous 为 True 时（滚轮缩放）只重画数据图层并 blit，停止滚动 ZOOM_SETTLE_INTERVAL 后再完整重绘；
+        否则在空闲时完整重绘。
+        """
+        self.ax1.set_xlim(xlim)
+        self.ax2.set_xlim(xlim)  # 同步更新成交量图表的x轴范围
+        self.renderer.render(xlim[0], xlim[1], self.ax1.bbox.width)
+        if not continuous:
+            self.cancel_zoom_gesture()
+            self.canvas.draw_idle()
+            return
+        if self.zoom_blitter.active:
+            self.zoom_blitter.frame()
+        else:
+            self.crosshair.hide()
+            self.zoom_blitter.begin()
+            self.zoom_settle_job = self.root.after(ZOOM_SETTLE_INTERVAL, self.settle_zoom)
+        self.last_zoom_at = time.monotonic()  # 从画完这一帧开始计时，手势开始时的完整重绘不算作停止滚动
+
+    def settle_zoom(self):
+        """停止滚动后结束缩放手势并完整重绘；仍在滚动时稍后再检查"""
+        remaining = ZOOM_SETTLE_INTERVAL - (time.monotonic() - self.last_zoom_at) * 1000
+        if remaining > 0:
+            self.zoom_settle_job = self.root.after(int(remaining) + 1, self.settle_zoom)
+            return
+        self.zoom_settle_job = None
+        self.zoom_blitter.end()
+
+    def cancel_zoom_gesture(self):
+        """重建或清空图表前结束缩放手势，不再重绘（调用方随后会重绘）"""
+        if self.zoom_settle_job is not None:
+            self.root.after_cancel(self.zoom_settle_job)
+            self.zoom_settle_job = None
+        self.zoom_blitter.end(redraw=False)
 
     def update_chart(self):
         """更新图表"""
@@ -444,103 +733,86 @@ class StockMonitor:
         try:
             k_type = self.k_type.get()
             
-            # 从已获取的数据中获取当前K线类型的数据
+            # 从已获取的数据中获取当前K线类型的数据（分时图单独增量更新）
             if k_type not in self.k_line_data:
                 return
                 
-            df = self.k_line_data[k_type]
-            date_col = '日期'
-            price_col = '收盘'
-            volume_col = '成交量'
-            open_col = '开盘'
-            close_col = '收盘'
-            high_col = '最高'
-            low_col = '最低'
+            bars = self.k_line_data[k_type]
             
             # 在主线程中更新图表
-            self.root.after(0, lambda: self.update_chart_display(df, date_col, price_col, volume_col, open_col, close_col, high_col, low_col, k_type))
+            self.root.after(0, lambda: self.update_chart_display(bars, k_type))
             
         except Exception as e:
-            print(f"Error updating chart: {e}")
+            logger.exception("Error updating chart")
     
-    def update_chart_display(self, df, date_col, price_col, volume_col, open_col, close_col, high_col, low_col, k_type):
+    @traced('chart.display')
+    def update_chart_display(self, bars, k_type):
         """在主线程中更新图表显示"""
+        if k_type != self.k_type.get():
+            return  # 等待绘制期间已切换图表类型
         try:
             # 存储当前数据
-            self.current_data = df
-            
-            # 清除旧图
-            self.ax1.clear()
-            self.ax2.clear()
-            
-            # 绘制K线图
-            for i in range(len(df)):
-                if df[close_col].iloc[i] >= df[open_col].iloc[i]:
-                    color = 'red'  # 上涨为红色
-                else:
-                    color = 'green'  # 下跌为绿色
-                
-                # 绘制上下引线
-                self.ax1.plot([df[date_col].iloc[i], df[date_col].iloc[i]], 
-                            [df[low_col].iloc[i], df[high_col].iloc[i]], 
-                            color=color, linewidth=1)
-                
-                # 绘制K线实体
-                self.ax1.plot([df[date_col].iloc[i], df[date_col].iloc[i]], 
-                            [df[open_col].iloc[i], df[close_col].iloc[i]], 
-                            color=color, linewidth=3)
-                
-                # 绘制成交量
-                self.ax2.bar(df[date_col].iloc[i], df[volume_col].iloc[i], 
-                            color=color, width=0.6, label='成交量' if i == 0 else "")
-            
-            # 找出最高点和最低点
-            max_high = df[high_col].max()
-            min_low = df[low_col].min()
-            max_high_date = df[date_col][df[high_col] == max_high].iloc[0]
-            min_low_date = df[date_col][df[low_col] == min_low].iloc[0]
+            self.current_data = bars
+            self.cancel_zoom_gesture()
             
-            # 在最高点添加标记
-            self.ax1.plot(max_high_date, max_high, 'r^', markersize=10, label='最高点')
-            self.ax1.annotate(f'最高: {max_high:.2f}', 
-                            xy=(max_high_date, max_high),
-                            xytext=(10, 10), textcoords='offset points',
-                            color='red', fontsize=8)
+            # 指标按数据版本缓存，切换显示只改变均线可见性而不重新计算
+            indicators = self.indicator_engine.compute(k_type, self.k_line_versions.get(k_type),
+                                                       bars.high, bars.low, bars.close, bars.volume)
             
-            # 在最低点添加标记
-            self.ax1.plot(min_low_date, min_low, 'gv', markersize=10, label='最低点')
-            self.ax1.annotate(f'最低: {min_low:.2f}', 
-                            xy=(min_low_date, min_low),
-                            xytext=(10, -15), textcoords='offset points',
-                            color='green', fontsize=8)
-            
-            if self.show_ma.get():
-                # 计算并绘制均线
-                ma_data = self.calculate_ma(df)
-                colors = ['gray', 'purple', 'yellow', 'blue']  # 5日、10日、20日、30日均线颜色
-                for (ma_name, ma_values), color in zip(ma_data.items(), colors):
-                    self.ax1.plot(df[date_col], ma_values, color=color, label=ma_name, linewidth=1)
-            
-            self.ax1.set_title(f'{k_type}价格走势')
-            self.ax1.grid(True)
-            self.ax1.legend()
-            
-            self.ax2.set_title(f'{k_type}成交量')
-            self.ax2.grid(True)
-            # 只在有成交量数据时显示图例
-            if len(df) > 0:
-                self.ax2.legend()
-            
-            # 设置初始显示范围（显示所有数据）
-            self.ax1.set_xlim(df[date_col].iloc[0], df[date_col].iloc[-1])
-            self.ax2.set_xlim(df[date_col].iloc[0], df[date_col].iloc[-1])
+            # 向量化绘制K线、最高/最低点、均线和成交量，按像素宽度决定细节层级（与图表导出共用）
+            self.ma_lines = draw_k_line_chart(self.renderer, bars, indicators, k_type,
+                                              show_ma=self.show_ma.get(), pixel_width=self.ax1.bbox.width)
+            self.crosshair.setup(self.renderer.data[0], bars, indicators)
             
             # 调整布局，确保x轴标签不被截断
             plt.tight_layout()
             self.canvas.draw()
             
         except Exception as e:
-            print(f"Error updating chart display: {e}")
+            logger.exception("Error updating chart display")
+    
+    def update_legend(self):
+        """只为可见的图元生成价格图图例"""
+        update_legend(self.ax1)
+    
+    def on_ma_toggle(self):
+        """切换均线显示，只改变已绘制均线的可见性"""
+        if not self.ma_lines:
+            self.update_chart()
+            return
+        self.cancel_zoom_gesture()  # 图例会重新生成，随后完整重绘
+        for line in self.ma_lines:
+            line.set_visible(self.show_ma.get())
+        self.update_legend()
+        self.canvas.draw_idle()
+    
+    def on_stats_toggle(self):
+        """显示或隐藏各阶段耗时统计"""
+        if self.show_stats.get():
+            self.stats_label.pack(fill=tk.X, after=self.info_frame)
+            self.refresh_stats()
+        else:
+            if self.stats_job is not None:
+                self.root.after_cancel(self.stats_job)
+                self.stats_job = None
+            self.stats_label.pack_forget()
+    
+    def refresh_stats(self):
+        """定时刷新耗时统计（毫秒，按最近的 P90 排序）"""
+        summary = tracer.summary()
+        self.stats_label.config(text=format_summary(summary, STATS_ROWS) if summary else "暂无数据")
+        self.stats_job = self.root.after(STATS_INTERVAL, self.refresh_stats)
+    
+    def export_trace(self):
+        """导出全部耗时记录，按扩展名保存为 JSON 或 CSV"""
+        path = filedialog.asksaveasfilename(defaultextension=".json",
+                                            filetypes=[("JSON", "*.json"), ("CSV", "*.csv")])
+        if not path:
+            return
+        try:
+            tracer.export(path)
+        except Exception:
+            logger.exception("Error exporting trace to %s", path)
     
     def update_range_input_visibility(self):
         """更新范围输入框的可见性"""
@@ -565,11 +837,128 @@ class StockMonitor:
             self.monthly_range_label.pack(side=tk.LEFT)
             self.monthly_range.pack(side=tk.LEFT, padx=2)
 
+    def open_screener(self):
+        """打开条件选股窗口，关闭时只隐藏，之后的计算结果仍会更新到表格中"""
+        if self.screener_window is not None:
+            self.screener_window.deiconify()
+            self.screener_window.lift()
+            return
+        self.screener_window = tk.Toplevel(self.root)
+        self.screener_window.title("条件选股")
+        self.screener_window.geometry("720x480")
+        self.screener_window.protocol("WM_DELETE_WINDOW", self.screener_window.withdraw)
+        self.screener_panel = ScreenerPanel(self.screener_window, on_select=self.select_symbol)
+        self.screener_panel.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        if self.screener_result is not None:
+            self.screener_panel.update_results(*self.screener_result, self.screener.reference_issue)
+        elif not self.market_snapshot.is_fresh():
+            self.market_snapshot.refresh()
+    
+    def refresh_screener(self):
+        """交易时段内定时刷新全市场快照（快照仍有效时不重复请求），选股在刷新完成后计算"""
+        if self.trading_calendar.is_trading_time() and not self.market_snapshot.is_fresh():
+            self.market_snapshot.refresh()
+        self.screener_job = self.root.after(SCREENER_INTERVAL, self.refresh_screener)
+    
+    def on_snapshot_refreshed(self, df):
+        """在快照刷新线程中计算全部选股条件，结果交给主线程显示"""
+        result, alerts, elapsed_ms = self.screener.evaluate(df)
+        self.post_to_ui(None, self.on_screener_result, result, alerts, elapsed_ms)
+    
+    def on_screener_result(self, result, alerts, elapsed_ms):
+        self.screener_result = (result, elapsed_ms)
+        if self.screener_panel is not None:
+            self.screener_panel.update_results(result, elapsed_ms, self.screener.reference_issue)
+        if alerts:
+            message = format_alerts(alerts)
+            logger.info("Screener alerts: %s", message.replace('\n', '; '))
+            if not desktop_notify("条件选股提醒", message):
+                self.show_alert(message)
+    
+    def show_alert(self, message):
+        """在窗口右下角短暂显示提醒"""
+        self.root.bell()
+        toast = tk.Toplevel(self.root)
+        toast.overrideredirect(True)
+        toast.attributes('-topmost', True)
+        tk.Label(toast, text=message, justify=tk.LEFT, background='lightyellow', padx=10, pady=6).pack()
+        toast.update_idletasks()
+        x = self.root.winfo_rootx() + self.root.winfo_width() - toast.winfo_width() - 20
+        y = self.root.winfo_rooty() + self.root.winfo_height() - toast.winfo_height() - 20
+        toast.geometry(f"+{x}+{y}")
+        self.root.after(ALERT_DURATION, toast.destroy)
+    
+    def prefetch_idle(self):
+        """界面空闲且没有进行中的查询时，在后台预取下一只可能查看的股票（每次一只）"""
+        self.prefetch_job = self.root.after(PREFETCH_INTERVAL, self.prefetch_idle)
+        if time.monotonic() - self.last_activity < PREFETCH_IDLE_DELAY:
+            return
+        if self.prefetch_future is not None and not self.prefetch_future.done():
+            return
+        with self.request_lock:
+            if any(not future.done() for future in self.query_futures):
+                return
+        if not self.symbol_cache.has_room():
+            return
+        candidates = prefetch_candidates(self.intraday_code, list(self.watchlist.symbols), list(self.recent_symbols))
+        for code in candidates:
+            if code not in self.symbol_cache and code not in self.prefetch_failed:
+                self.prefetch_future = self.prefetch_executor.submit(
+                    self.prefetch_symbol, code, self.get_range_start_dates())
+                return
+    
+    def prefetch_symbol(self, stock_code, start_dates):
+        """在预取线程中准备一只股票的K线和指标，行情只取自有效期内的全市场快照"""
+        state = SymbolState(stock_code, start_dates)
+        try:
+            with span('prefetch.symbol', symbol=stock_code):
+                for k_type, bars, indicators in prepare_k_lines(self.kline_store, stock_code, start_dates):
+                    state.bars[k_type] = bars
+                    state.indicators[k_type] = indicators
+        except Exception as e:
+            logger.info("Prefetch failed for %s: %s", stock_code, e)
+            self.prefetch_failed.add(stock_code)
+            return
+        if self.market_snapshot.is_fresh():
+            try:
+                state.set_quote(quote_from_snapshot(self.market_snapshot, stock_code), self.market_snapshot.fetched_at)
+            except Exception:
+                pass  # 查看时再通过对冲请求获取
+        self.symbol_cache.put(state)
+    
     def __del__(self):
         """清理资源"""
         self.executor.shutdown(wait=False)
+        self.prefetch_executor.shutdown(wait=False)
+        self.market_snapshot.shutdown()
+        self.quote_fetcher.shutdown()
+        self.watchlist.shutdown()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="股票监控")
+    parser.add_argument("--fake", action="store_true", help="使用本地模拟数据，不访问网络")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟数据的请求延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="模拟数据的请求失败概率")
+    parser.add_argument("--service", help="通过本地数据服务（data_service.py）获取数据，如 http://127.0.0.1:8765")
+    parser.add_argument("--cache-mb", type=int, default=SYMBOL_CACHE_BUDGET // (1024 * 1024),
+                        help="已加载股票的内存缓存上限（MB）")
+    parser.add_argument("--trace", help="退出时把耗时记录导出到该文件（.json 或 .csv）")
+    parser.add_argument("--log-level", default="INFO", help="日志级别")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(),
+                        format="%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s")
+    
+    provider = None
+    data_dir = DEFAULT_DATA_DIR
+    if args.fake:
+        # 模拟数据使用单独的缓存目录，不与真实数据混在一起
+        provider = FakeProvider(latency=args.latency, failure_rate=args.failure_rate)
+        data_dir = os.path.join(DEFAULT_DATA_DIR, 'fake')
+    if args.service:
+        # 多个界面共用一个服务进程访问数据源；与 --fake 同时使用时连接以 --fake 运行的服务，本地缓存仍在模拟数据目录
+        provider = RemoteProvider(args.service)
     root = tk.Tk()
-    app = StockMonitor(root)
-    root.mainloop() 
\ No newline at end of file
+    app = StockMonitor(root, provider, data_dir, cache_budget=args.cache_mb * 1024 * 1024)
+    root.mainloop()
+    if args.trace:
+        tracer.export(args.trace) 
\ No newline at end of file
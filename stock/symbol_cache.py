@@ -0,0 +1,161 @@
+"""已加载股票的内存缓存：按最近使用顺序淘汰，总内存不超过预算；界面空闲时在后台预取"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from analysis import history_start_date, iter_k_line_data
+from bars import BarSeries
+from indicators import IndicatorSet
+from instrumentation import span
+
+SYMBOL_CACHE_BUDGET = 256 * 1024 * 1024  # 缓存的内存预算（字节）
+PREFETCH_FILL_RATIO = 0.8                # 缓存占用超过预算的该比例后不再预取，预取不会挤掉已有的股票
+QUOTE_OVERHEAD = 2048                    # 每只股票行情和对象本身的估计占用（字节）
+
+
+class SymbolState:
+    """一只股票准备好的全部数据：各K线类型的 BarSeries 和指标，以及行情"""
+
+    def __init__(self, code, start_dates):
+        self.code = code
+        self.start_dates = dict(start_dates)
+        self.bars = {}        # K线类型 -> BarSeries
+        self.indicators = {}  # K线类型 -> IndicatorSet
+        self.quote = None     # 行情字典，获取失败时为 None
+        self.quote_at = 0.0   # 行情的获取时间（来自快照时为快照的获取时间）
+        self.loaded_at = time.time()
+
+    @property
+    def nbytes(self):
+        return (sum(bars.nbytes for bars in self.bars.values()) +
+                sum(indicators.nbytes for indicators in self.indicators.values()) + QUOTE_OVERHEAD)
+
+    def age(self):
+        return time.time() - self.loaded_at
+
+    def set_quote(self, quote, fetched_at=None):
+        self.quote = quote
+        self.quote_at = time.time() if fetched_at is None else fetched_at
+
+    def quote_age(self):
+        return time.time() - self.quote_at
+
+
+def is_extension(old, new):
+    """new 是否由 old 在末尾追加K线得到（old 中的K线全部不变）"""
+    n = len(old)
+    return (0 < n <= len(new) and np.array_equal(old.dates, new.dates[:n])
+            and np.array_equal(old.values, new.values[:, :n], equal_nan=True))
+
+
+def update_indicators(old_bars, old_indicators, bars):
+    """刷新后的K线只是在原有K线之后追加时，在原指标的副本上逐根追加（每根常数次运算），否则返回 None"""
+    if old_bars is None or not is_extension(old_bars, bars):
+        return None
+    indicators = old_indicators.copy()
+    with span('indicators.append', bars=len(bars) - len(old_bars)):
+        for i in range(len(old_bars), len(bars)):
+            indicators.append(float(bars.high[i]), float(bars.low[i]), float(bars.close[i]), float(bars.volume[i]))
+    return indicators
+
+
+def prepare_k_lines(kline_store, code, start_dates, end_date=None, previous=None):
+    """获取日K并依次准备各K线类型的数据，产出 (K线类型, BarSeries, IndicatorSet)
+
+    在后台线程中调用，日K只请求一次，周K、月K在本地合成，指标也在后台计算完成。
+    previous 为同一只股票之前准备好的 SymbolState：某个K线类型只是新增了K线时，指标逐根追加而不重新计算；
+    最后一根K线发生变化（盘中未完成的K线、除权除息）时重新计算。
+    """
+    end_date = end_date or datetime.now().strftime('%Y%m%d')
+    # 日K请求范围覆盖三种K线中最长的范围（从所在周期的第一天开始，本地仓库中已有的部分不会重新下载）
+    with span('kline.get_hist', symbol=code):
+        daily = kline_store.get_hist(symbol=code, period="daily", adjust="qfq",
+                                     start_date=history_start_date(start_dates), end_date=end_date)
+    for k_type, df in iter_k_line_data(daily, start_dates):
+        bars = BarSeries.from_frame(df)
+        indicators = None
+        if previous is not None and k_type in previous.bars:
+            indicators = update_indicators(previous.bars[k_type], previous.indicators[k_type], bars)
+        if indicators is None:
+            with span('indicators.compute', key=k_type, bars=len(bars)):
+                indicators = IndicatorSet(bars.high, bars.low, bars.close, bars.volume)
+        yield k_type, bars, indicators
+
+
+class SymbolCache:
+    """按最近使用顺序淘汰的股票缓存
+
+    放入新股票后，从最久未使用的股票开始淘汰，直到总占用不超过 budget；
+    刚放入的股票即使单独超出预算也会保留。取出时要求K线范围与缓存时一致。
+    """
+
+    def __init__(self, budget=SYMBOL_CACHE_BUDGET):
+        self.budget = budget
+        self.entries = OrderedDict()  # 代码 -> SymbolState，最近使用的在末尾
+        self.sizes = {}
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, code, start_dates):
+        with self.lock:
+            state = self.entries.get(code)
+            if state is None or state.start_dates != start_dates:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(code)
+            self.hits += 1
+            return state
+
+    def __contains__(self, code):
+        with self.lock:
+            return code in self.entries
+
+    def put(self, state):
+        size = state.nbytes
+        with self.lock:
+            if state.code in self.entries:
+                self.total -= self.sizes[state.code]
+            self.entries[state.code] = state
+            self.entries.move_to_end(state.code)
+            self.sizes[state.code] = size
+            self.total += size
+            while self.total > self.budget and len(self.entries) > 1:
+                code, _ = self.entries.popitem(last=False)
+                self.total -= self.sizes.pop(code)
+                self.evictions += 1
+
+    def discard(self, code):
+        with self.lock:
+            if self.entries.pop(code, None) is not None:
+                self.total -= self.sizes.pop(code)
+
+    def recent(self, count=None):
+        """最近使用的股票代码，最近的在前"""
+        with self.lock:
+            codes = list(reversed(self.entries))
+        return codes[:count]
+
+    def has_room(self, ratio=PREFETCH_FILL_RATIO):
+        """是否还有空间预取（不会因预取而淘汰已有的股票）"""
+        with self.lock:
+            return self.total < self.budget * ratio
+
+    def stats(self):
+        with self.lock:
+            return {'symbols': len(self.entries), 'bytes': self.total, 'budget': self.budget,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+def prefetch_candidates(current, watchlist, history):
+    """预取顺序：自选股中当前股票的前后相邻股票，其余自选股，再到最近查询过的股票"""
+    candidates = []
+    if current in watchlist:
+        index = watchlist.index(current)
+        candidates += [watchlist[i] for i in (index + 1, index - 1) if 0 <= i < len(watchlist)]
+    candidates += watchlist
+    candidates += history
+    return [code for code in dict.fromkeys(candidates) if code and code != current]
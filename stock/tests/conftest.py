@@ -0,0 +1,5 @@
+"""测试从 stock 目录导入模块（各模块为平铺的脚本，不是包）"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,82 @@
+"""生成 tests/fixtures 中的K线数据
+
+daily.csv 为随机生成的模拟日K（2024-12-02 至 2025-02-14，元旦和春节休市），不是真实行情。
+weekly.csv、monthly.csv 不调用 resample_ohlcv，而是按 akshare 周K、月K的规则逐行独立计算：
+日期为周期内最后一个交易日，开盘为第一天开盘、收盘为最后一天收盘，最高、最低、成交量、成交额、换手率
+在周期内汇总，涨跌幅、涨跌额、振幅相对上一周期的收盘价。它们不是从 akshare 下载的数据。
+
+运行: python tests/fixtures/generate.py
+"""
+import csv
+import os
+import random
+from datetime import date, timedelta
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+START, END = date(2024, 12, 2), date(2025, 2, 14)
+HOLIDAYS = {date(2025, 1, 1)} | {date(2025, 1, 28) + timedelta(days=i) for i in range(8)}
+SEED = 7
+COLUMNS = ['日期', '股票代码', '开盘', '收盘', '最高', '最低', '成交量', '成交额', '振幅', '涨跌幅', '涨跌额', '换手率']
+
+
+def trading_days():
+    day = START
+    while day <= END:
+        if day.weekday() < 5 and day not in HOLIDAYS:
+            yield day
+        day += timedelta(days=1)
+
+
+def make_daily():
+    rng = random.Random(SEED)
+    prev = 11.50
+    rows = []
+    for day in trading_days():
+        open_ = round(prev * (1 + rng.uniform(-0.01, 0.01)), 2)
+        close = round(prev * (1 + rng.uniform(-0.04, 0.04)), 2)
+        high = round(max(open_, close) * (1 + rng.uniform(0, 0.015)), 2)
+        low = round(min(open_, close) * (1 - rng.uniform(0, 0.015)), 2)
+        volume = rng.randint(300000, 1500000)
+        rows.append({'日期': day.isoformat(), '股票代码': '000001', '开盘': open_, '收盘': close,
+                     '最高': high, '最低': low, '成交量': volume,
+                     '成交额': round(volume * 100 * (open_ + close) / 2, 2),
+                     '振幅': round((high - low) / prev * 100, 2), '涨跌幅': round((close - prev) / prev * 100, 2),
+                     '涨跌额': round(close - prev, 2), '换手率': round(rng.uniform(0.2, 1.5), 2)})
+        prev = close
+    return rows
+
+
+def aggregate(rows, period_key):
+    """按 period_key(日期) 分组，逐组汇总为一根K线"""
+    groups = []
+    for row in rows:
+        key = period_key(date.fromisoformat(row['日期']))
+        if not groups or groups[-1][0] != key:
+            groups.append((key, []))
+        groups[-1][1].append(row)
+    result = []
+    for _, group in groups:
+        base = round(group[0]['收盘'] - group[0]['涨跌额'], 2)  # 上一周期的收盘价
+        close = group[-1]['收盘']
+        high = max(row['最高'] for row in group)
+        low = min(row['最低'] for row in group)
+        result.append({'日期': group[-1]['日期'], '股票代码': '000001', '开盘': group[0]['开盘'], '收盘': close,
+                       '最高': high, '最低': low, '成交量': sum(row['成交量'] for row in group),
+                       '成交额': round(sum(row['成交额'] for row in group), 2),
+                       '振幅': round((high - low) / base * 100, 2), '涨跌幅': round((close - base) / base * 100, 2),
+                       '涨跌额': round(close - base, 2), '换手率': round(sum(row['换手率'] for row in group), 2)})
+    return result
+
+
+def write(name, rows):
+    with open(os.path.join(FIXTURES, name), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    daily = make_daily()
+    write('daily.csv', daily)
+    write('weekly.csv', aggregate(daily, lambda day: day.isocalendar()[:2]))
+    write('monthly.csv', aggregate(daily, lambda day: (day.year, day.month)))
@@ -0,0 +1,55 @@
+"""批量分析的断点续跑：同一截止日期跳过已完成的股票，截止日期更新后重新分析"""
+import json
+import os
+import sqlite3
+import pandas as pd
+import pytest
+from batch import run, PROGRESS_FILENAME, SUMMARY_FILENAME
+from data_provider import FakeProvider
+from kline_store import DB_FILENAME
+
+CODES = ['000001', '000002', '000003']
+
+
+def read_summary(output_dir):
+    return pd.read_csv(os.path.join(output_dir, SUMMARY_FILENAME), dtype={'代码': str}, encoding='utf-8-sig')
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    return str(tmp_path / 'batch'), str(tmp_path / 'data')
+
+
+def next_day(data_dir):
+    """把K线仓库的更新时间提前一周，模拟之后的交易日再运行"""
+    with sqlite3.connect(os.path.join(data_dir, DB_FILENAME)) as conn:
+        conn.execute("UPDATE meta SET fetched_at = fetched_at - 7 * 86400")
+
+
+def batch_run(dirs, end_date):
+    output_dir, data_dir = dirs
+    return run(CODES, output_dir, FakeProvider, data_dir, workers=1, start_date='20240101', end_date=end_date)
+
+
+def test_rerun_same_end_date_skips_done(dirs):
+    assert batch_run(dirs, '20250102')['processed'] == len(CODES)
+    assert batch_run(dirs, '20250102')['processed'] == 0
+
+
+def test_rerun_next_trading_day_updates_summary(dirs):
+    batch_run(dirs, '20250102')
+    assert set(read_summary(dirs[0])['日期']) == {'2025-01-02'}
+    next_day(dirs[1])
+    assert batch_run(dirs, '20250103')['processed'] == len(CODES)
+    summary = read_summary(dirs[0])
+    assert set(summary['日期']) == {'2025-01-03'}
+    assert 'end_date' not in summary
+
+
+def test_progress_without_end_date_is_redone(dirs):
+    output_dir, _ = dirs
+    os.makedirs(output_dir)
+    with open(os.path.join(output_dir, PROGRESS_FILENAME), 'w', encoding='utf-8') as f:
+        for code in CODES:
+            f.write(json.dumps({'代码': code, 'status': 'ok'}) + '\n')
+    assert batch_run(dirs, '20250102')['processed'] == len(CODES)
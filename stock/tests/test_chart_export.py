@@ -0,0 +1,18 @@
+"""图表导出按数据截止日期分目录保存，同一截止日期下已导出的图表被跳过"""
+import os
+from chart_export import run_export
+from data_provider import FakeProvider
+
+
+def export(tmp_path, end_date):
+    return run_export(['000001'], str(tmp_path / 'charts'), FakeProvider, str(tmp_path / 'data'),
+                      workers=1, end_date=end_date, dpi=20)
+
+
+def test_charts_saved_per_end_date(tmp_path):
+    first = export(tmp_path, '20250102')
+    assert first['charts'] == 1
+    assert os.path.exists(tmp_path / 'charts' / '20250102' / '000001_daily.png')
+    assert export(tmp_path, '20250102')['charts'] == 0
+    assert export(tmp_path, '20250103')['charts'] == 1
+    assert os.path.exists(tmp_path / 'charts' / '20250103' / '000001_daily.png')
@@ -0,0 +1,57 @@
+"""draw_k_line_chart 可以绘制空数据；连续缩放时 LayerBlitter 只 blit 数据图层，结束后恢复完整重绘"""
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from bars import BarSeries
+from chart_renderer import CandlestickRenderer, LayerBlitter, draw_k_line_chart
+from data_provider import FakeProvider
+from indicators import IndicatorSet
+
+
+def draw(renderer, bars):
+    return draw_k_line_chart(renderer, bars, IndicatorSet(bars.high, bars.low, bars.close, bars.volume), '日K')
+
+
+def test_empty_bars_clear_chart():
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    renderer = CandlestickRenderer(*figure.subplots(2, 1))
+    bars = BarSeries.from_frame(FakeProvider().history('000001').tail(50))
+    assert len(draw(renderer, bars)) == 4
+    assert draw(renderer, bars[:0]) == []
+    assert renderer.artists == [] and not renderer.ax_price.lines
+    assert renderer.ax_price.get_title().endswith('（无数据）')
+    figure.canvas.draw()
+
+
+def test_zoom_frames_blit_without_full_redraw():
+    figure = Figure()
+    canvas = FigureCanvasAgg(figure)
+    renderer = CandlestickRenderer(*figure.subplots(2, 1))
+    bars = BarSeries.from_frame(FakeProvider().history('000001').tail(300))
+    draw(renderer, bars)
+    canvas.draw()
+    draws = []
+    canvas.mpl_connect('draw_event', draws.append)
+    blitter = LayerBlitter(canvas, renderer)
+    ma_lines = [line for line in renderer.ax_price.lines if line.get_label().startswith('MA')]
+
+    blitter.begin()
+    assert len(draws) == 1
+    assert all(artist.get_animated() for artist in renderer.artists + ma_lines + [renderer.ax_price.get_legend()])
+    before = np.asarray(canvas.buffer_rgba()).copy()
+    x = renderer.data[0]
+    for xmin in (x[100], x[200]):
+        for ax in (renderer.ax_price, renderer.ax_volume):
+            ax.set_xlim(xmin, x[-1])
+        renderer.render(xmin, x[-1], renderer.ax_price.bbox.width)
+        blitter.frame()
+    assert len(draws) == 1
+    assert not np.array_equal(before, np.asarray(canvas.buffer_rgba()))
+    # 每帧新建的K线图元也不参与完整重绘
+    assert all(artist.get_animated() for artist in renderer.artists)
+
+    blitter.end(redraw=False)
+    assert not blitter.active
+    assert not any(artist.get_animated() for artist in renderer.artists + ma_lines)
+    canvas.draw()
@@ -0,0 +1,86 @@
+"""指标与 pandas 的计算结果一致，逐根追加的指标与一次性计算的结果一致"""
+import numpy as np
+import pandas as pd
+import pytest
+from bars import BarSeries
+from data_provider import FakeProvider
+from indicators import IndicatorSet, MA_PERIODS, VOLUME_MA_PERIODS
+from symbol_cache import is_extension, update_indicators
+
+
+def make_bars(n=300):
+    return BarSeries.from_frame(FakeProvider().history('000001').tail(n))
+
+
+def assert_indicators_close(actual, expected):
+    assert actual.names() == expected.names()
+    for name in expected.names():
+        np.testing.assert_allclose(actual[name], expected[name], rtol=1e-6, atol=1e-6, equal_nan=True,
+                                   err_msg=name)
+
+
+def full(bars):
+    return IndicatorSet(bars.high, bars.low, bars.close, bars.volume)
+
+
+def pandas_reference(bars):
+    """直接用 pandas 的 rolling / ewm 计算均线、BOLL 和 MACD，作为独立的参考结果"""
+    close, volume = pd.Series(bars.close, dtype=float), pd.Series(bars.volume, dtype=float)
+    expected = {f'MA{n}': close.rolling(n).mean() for n in MA_PERIODS}
+    expected.update({f'MAVOL{n}': volume.rolling(n).mean() for n in VOLUME_MA_PERIODS})
+    mid, std = close.rolling(20).mean(), close.rolling(20).std()
+    expected.update(BOLL_MID=mid, BOLL_UPPER=mid + 2 * std, BOLL_LOWER=mid - 2 * std)
+    dif = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    dea = dif.ewm(span=9, adjust=False).mean()
+    expected.update(DIF=dif, DEA=dea, MACD=2 * (dif - dea))
+    return {name: values.to_numpy() for name, values in expected.items()}
+
+
+def assert_matches_pandas(indicators, bars):
+    for name, expected in pandas_reference(bars).items():
+        np.testing.assert_allclose(indicators[name], expected, rtol=1e-6, atol=1e-6, equal_nan=True, err_msg=name)
+
+
+@pytest.mark.parametrize('n', [300, 25, 12, 1])
+def test_compute_matches_pandas(n):
+    """包括比均线、BOLL 窗口更短的序列（结果全部为 NaN）"""
+    bars = make_bars(n)
+    assert_matches_pandas(full(bars), bars)
+
+
+@pytest.mark.parametrize('start', [1, 4, 19, 29])
+def test_append_matches_pandas(start):
+    """从短于窗口的序列开始逐根追加，经过各窗口的边界"""
+    bars = make_bars(60)
+    indicators = full(bars[:start])
+    for i in range(start, len(bars)):
+        indicators.append(float(bars.high[i]), float(bars.low[i]), float(bars.close[i]), float(bars.volume[i]))
+    assert_matches_pandas(indicators, bars)
+
+
+def test_append_matches_compute():
+    bars = make_bars()
+    indicators = full(bars[:250])
+    for i in range(250, len(bars)):
+        indicators.append(float(bars.high[i]), float(bars.low[i]), float(bars.close[i]), float(bars.volume[i]))
+    assert_indicators_close(indicators, full(bars))
+
+
+def test_update_indicators_appends_on_copy():
+    bars = make_bars()
+    old_bars = bars[:290]
+    old = full(old_bars)
+    updated = update_indicators(old_bars, old, bars)
+    assert updated is not None and updated is not old
+    assert len(old) == 290
+    assert_indicators_close(updated, full(bars))
+
+
+def test_changed_last_bar_is_not_an_extension():
+    bars = make_bars()
+    changed = BarSeries(bars.dates.copy(), bars.values.copy())
+    changed.close[-1] += 0.01
+    assert is_extension(bars[:-1], bars)
+    assert not is_extension(bars, changed)
+    assert update_indicators(bars, full(bars), changed) is None
+
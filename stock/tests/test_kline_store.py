@@ -0,0 +1,37 @@
+"""K线仓库的更新判断：盘中当天的K线仍在变化，收盘后的数据在下一次开盘前有效"""
+from datetime import datetime
+import pytest
+from kline_store import KLineStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = KLineStore(None, path=str(tmp_path / 'kline.db'), refresh_interval=60)
+    yield store
+    store.conn.close()
+
+
+def ts(text):
+    return datetime.strptime(text, '%Y-%m-%d %H:%M').timestamp()
+
+
+def test_in_session_fetch_expires(store):
+    # 2026-10-15 为周四：开盘后获取的数据在盘中超过 refresh_interval 即过期
+    fetched_at = ts('2026-10-15 09:35')
+    assert store.is_fresh(fetched_at, now=datetime(2026, 10, 15, 9, 35, 30))
+    assert not store.is_fresh(fetched_at, now=datetime(2026, 10, 15, 11, 0))
+    # 午间休市时上午的数据同样需要更新
+    assert not store.is_fresh(ts('2026-10-15 11:00'), now=datetime(2026, 10, 15, 12, 0))
+
+
+def test_after_close_fetch_valid_until_next_open(store):
+    fetched_at = ts('2026-10-15 15:05')
+    assert store.is_fresh(fetched_at, now=datetime(2026, 10, 15, 20, 0))
+    assert store.is_fresh(fetched_at, now=datetime(2026, 10, 16, 9, 0))
+    assert not store.is_fresh(fetched_at, now=datetime(2026, 10, 16, 9, 31))
+    # 周末不产生新K线
+    assert store.is_fresh(ts('2026-10-16 15:05'), now=datetime(2026, 10, 18, 12, 0))
+
+
+def test_in_session_fetch_stale_after_close(store):
+    assert not store.is_fresh(ts('2026-10-15 14:50'), now=datetime(2026, 10, 15, 15, 10))
@@ -0,0 +1,72 @@
+"""由日K合成的周K、月K与独立计算的预期结果对比
+
+fixtures 中 daily.csv 为 2024-12-02 至 2025-02-14 随机生成的模拟日K（列名与 ak.stock_zh_a_hist 一致），
+weekly.csv、monthly.csv 由 fixtures/generate.py 不经过 resample_ohlcv、逐行按 akshare 周K、月K的规则计算：
+日期为周期内最后一个交易日，涨跌幅、涨跌额、振幅相对上一周期的收盘价。它们不是从 akshare 下载的数据，
+只能校验合成逻辑与上述规则一致。区间包含元旦（2025-01-01，跨年的一周）和春节休市
+（2025-01-28 至 2025-02-04，2025-01-27 所在的一周只有一个交易日）。
+"""
+import os
+import pandas as pd
+import pytest
+from analysis import history_start_date, iter_k_line_data
+from resample import resample_ohlcv
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def read_bars(name):
+    df = pd.read_csv(os.path.join(FIXTURES, name), dtype={'股票代码': str})
+    df['日期'] = pd.to_datetime(df['日期']).dt.date
+    return df
+
+
+def assert_bars_equal(actual, expected):
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False, atol=0.01)
+
+
+@pytest.mark.parametrize('period, filename', [('weekly', 'weekly.csv'), ('monthly', 'monthly.csv')])
+def test_resample_matches_expected(period, filename):
+    assert_bars_equal(resample_ohlcv(read_bars('daily.csv'), period), read_bars(filename))
+
+
+def test_cross_year_week():
+    weekly = resample_ohlcv(read_bars('daily.csv'), 'weekly')
+    week = weekly[weekly['日期'] == pd.Timestamp('2025-01-03').date()].iloc[0]
+    daily = read_bars('daily.csv').set_index('日期')
+    # 2024-12-30、12-31 与 2025-01-02、01-03 属于同一周
+    assert week['开盘'] == daily.loc[pd.Timestamp('2024-12-30').date(), '开盘']
+    assert week['成交量'] == daily.loc[pd.Timestamp('2024-12-30').date():, '成交量'].iloc[:4].sum()
+
+
+def test_holiday_weeks():
+    dates = [str(day) for day in resample_ohlcv(read_bars('daily.csv'), 'weekly')['日期']]
+    assert '2025-01-27' in dates and '2025-02-07' in dates
+    assert '2025-01-31' not in dates
+
+
+def test_partial_first_period():
+    """起始日期在周、月中间时，第一根周K、月K仍包含整个周期"""
+    start_dates = {'日K': '20250106', '周K': '20241211', '月K': '20241218'}
+    assert history_start_date(start_dates) == '20241201'
+
+    daily = read_bars('daily.csv')
+    daily = daily[pd.to_datetime(daily['日期']) >= pd.to_datetime(history_start_date(start_dates))]
+    frames = dict(iter_k_line_data(daily, start_dates))
+    weekly, monthly = read_bars('weekly.csv'), read_bars('monthly.csv')
+    assert_bars_equal(frames['周K'], weekly[weekly['日期'] >= pd.Timestamp('2024-12-13').date()])
+    assert_bars_equal(frames['月K'], monthly)
+    assert str(frames['日K']['日期'].iloc[0]) == '2025-01-06'
+
+
+
+def test_requested_k_types_only():
+    """只请求部分K线类型时（如图表导出），历史起点只取决于这些类型，其余类型不合成"""
+    start_dates = {'周K': '20241211'}
+    assert history_start_date(start_dates) == '20241209'
+    daily = read_bars('daily.csv')
+    frames = dict(iter_k_line_data(daily[pd.to_datetime(daily['日期']) >= pd.Timestamp('2024-12-09')], start_dates))
+    assert list(frames) == ['周K']
+    weekly = read_bars('weekly.csv')
+    assert_bars_equal(frames['周K'], weekly[weekly['日期'] >= pd.Timestamp('2024-12-13').date()])
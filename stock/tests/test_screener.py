@@ -0,0 +1,105 @@
+"""选股参考数据：只使用截止于快照上一个交易日的行，汇总表文件修改后重新读取"""
+import os
+import sqlite3
+from datetime import datetime
+import pandas as pd
+from batch import run, BATCH_DIRNAME
+from data_provider import FakeProvider
+from kline_store import DB_FILENAME
+from screener import Rule, Screener
+from trading_calendar import TradingCalendar, CALENDAR_FILENAME
+
+SESSION = datetime(2025, 1, 3, 10, 0)  # 周五盘中，参考数据应截止于周四 2025-01-02
+
+
+def make_snapshot():
+    return pd.DataFrame({'代码': ['000001', '000002'], '名称': ['甲', '乙'], '最新价': [11.0, 11.0],
+                         '涨跌幅': [1.0, 1.0], '换手率': [1.0, 1.0], '量比': [1.0, 1.0]})
+
+
+def write_reference(path, dates, mtime=None):
+    pd.DataFrame({'代码': ['000001', '000002'], '日期': dates, '收盘': [10.0, 10.0],
+                  '250日最高': [10.5, 10.5]}).to_csv(path, index=False, encoding='utf-8-sig')
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def make_screener(tmp_path):
+    # 没有本地日历文件时按工作日判断交易日
+    calendar = TradingCalendar(None, path=str(tmp_path / 'calendar.txt'))
+    rules = [Rule('创250日新高', 'new_high', {'window': 250}), Rule('涨幅超过0.5%', 'change_above', {'threshold': 0.5})]
+    return Screener(rules, reference_path=str(tmp_path / 'summary.csv'), calendar=calendar)
+
+
+def hits(result):
+    return dict(zip(result['代码'], result['命中条件']))
+
+
+def test_only_rows_of_previous_trading_day_are_used(tmp_path):
+    write_reference(tmp_path / 'summary.csv', ['2025-01-02', '2024-12-31'])
+    screener = make_screener(tmp_path)
+    result, _, _ = screener.evaluate(make_snapshot(), now=SESSION)
+    assert hits(result) == {'000001': '创250日新高、涨幅超过0.5%', '000002': '涨幅超过0.5%'}
+    assert screener.reference_issue is None
+
+
+def test_stale_reference_skips_reference_rules(tmp_path):
+    write_reference(tmp_path / 'summary.csv', ['2025-01-02', '2025-01-02'])
+    screener = make_screener(tmp_path)
+    result, _, _ = screener.evaluate(make_snapshot(), now=datetime(2025, 1, 6, 10, 0))
+    assert hits(result) == {'000001': '涨幅超过0.5%', '000002': '涨幅超过0.5%'}
+    assert screener.reference_issue == 'stale'
+
+
+def test_before_open_uses_day_before_last_session(tmp_path):
+    write_reference(tmp_path / 'summary.csv', ['2025-01-02', '2025-01-02'])
+    screener = make_screener(tmp_path)
+    # 周一开盘前快照仍是周五的行情，参考数据应截止于周四
+    result, _, _ = screener.evaluate(make_snapshot(), now=datetime(2025, 1, 6, 8, 0))
+    assert set(hits(result).values()) == {'创250日新高、涨幅超过0.5%'}
+
+
+def test_reference_reloaded_when_file_changes(tmp_path):
+    path = tmp_path / 'summary.csv'
+    screener = make_screener(tmp_path)
+    screener.evaluate(make_snapshot(), now=SESSION)
+    assert screener.reference_issue == 'missing'
+
+    write_reference(path, ['2024-12-31', '2024-12-31'], mtime=1_000_000)
+    screener.evaluate(make_snapshot(), now=SESSION)
+    assert screener.reference_issue == 'stale'
+
+    write_reference(path, ['2025-01-02', '2025-01-02'], mtime=2_000_000)
+    result, _, _ = screener.evaluate(make_snapshot(), now=SESSION)
+    assert screener.reference_issue is None
+    assert len(result) == 2 and all('创250日新高' in names for names in result['命中条件'])
+
+
+def test_daily_batch_rerun_keeps_reference_current(tmp_path):
+    """每个交易日收盘后在同一目录重新运行批量分析，次日盘中的选股使用新的汇总表"""
+    codes = ['000001', '000002']
+    data_dir, output_dir = tmp_path / 'data', tmp_path / BATCH_DIRNAME
+    calendar = TradingCalendar(None, path=str(data_dir / CALENDAR_FILENAME))
+    rules = [Rule('创250日新高', 'new_high', {'window': 250})]
+    screener = Screener(rules, reference_path=str(output_dir / 'summary.csv'), calendar=calendar)
+    # 最新价远高于任何历史最高价，参考数据可用时全部命中
+    snapshot = pd.DataFrame({'代码': codes, '名称': codes, '最新价': [1e6, 1e6], '涨跌幅': [0.0, 0.0],
+                             '换手率': [1.0, 1.0], '量比': [1.0, 1.0]})
+
+    run(codes, str(output_dir), FakeProvider, str(data_dir), workers=1, start_date='20240101', end_date='20250102')
+    result, _, _ = screener.evaluate(snapshot, now=datetime(2025, 1, 3, 10, 0))
+    assert screener.reference_issue is None and len(result) == 2
+
+    # 下一个交易日盘中，未重新运行时参考数据已过期
+    result, _, _ = screener.evaluate(snapshot, now=datetime(2025, 1, 6, 10, 0))
+    assert screener.reference_issue == 'stale' and len(result) == 0
+
+    # 模拟之后的交易日：K线仓库的数据已不是最新，在同一目录重新运行
+    with sqlite3.connect(str(data_dir / DB_FILENAME)) as conn:
+        conn.execute("UPDATE meta SET fetched_at = fetched_at - 7 * 86400")
+    os.utime(output_dir / 'summary.csv', (0, 0))  # 保证修改时间变化
+    stats = run(codes, str(output_dir), FakeProvider, str(data_dir), workers=1, start_date='20240101',
+                end_date='20250103')
+    assert stats['processed'] == len(codes)
+    result, _, _ = screener.evaluate(snapshot, now=datetime(2025, 1, 6, 10, 0))
+    assert screener.reference_issue is None and len(result) == 2
@@ -0,0 +1,82 @@
+"""盘中再次查看缓存中的股票时，重新获取的K线包含当天最新的数据"""
+import os
+from datetime import datetime
+import pandas as pd
+import pytest
+import kline_store
+from kline_store import KLineStore
+from symbol_cache import SymbolState, prepare_k_lines
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+START_DATES = {'日K': '20250102', '周K': '20241202', '月K': '20241202'}
+END_DATE = '20250214'  # 周五，日K的最后一天
+
+
+class SourceStub:
+    """由 fixtures 中的日K模拟数据源，最后一根K线的收盘价可以在盘中改变"""
+
+    def __init__(self):
+        self.daily = pd.read_csv(os.path.join(FIXTURES, 'daily.csv'), dtype={'股票代码': str})
+        self.calls = 0
+
+    def set_last_close(self, close):
+        self.daily.loc[self.daily.index[-1], '收盘'] = close
+        self.daily.loc[self.daily.index[-1], '最高'] = max(close, self.daily['最高'].iloc[-1])
+
+    def __call__(self, symbol, period, adjust, start_date, end_date):
+        self.calls += 1
+        dates = pd.to_datetime(self.daily['日期'])
+        return self.daily[(dates >= pd.to_datetime(start_date)) & (dates <= pd.to_datetime(end_date))].copy()
+
+
+def at(monkeypatch, now):
+    """把K线仓库的当前时间固定为 now"""
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+    monkeypatch.setattr(kline_store, 'datetime', FixedDatetime)
+
+
+def load(store, previous=None):
+    state = SymbolState('000001', START_DATES)
+    for k_type, bars, indicators in prepare_k_lines(store, '000001', START_DATES, END_DATE, previous):
+        state.bars[k_type], state.indicators[k_type] = bars, indicators
+    return state
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = KLineStore(SourceStub(), path=str(tmp_path / 'kline.db'), refresh_interval=60)
+    yield store
+    store.conn.close()
+
+
+def test_revisit_in_session_gets_newer_last_bar(store, monkeypatch):
+    source = store.fetch_func
+    opened = datetime(2025, 2, 14, 9, 35)
+    at(monkeypatch, opened)
+    state = load(store)
+    # 首次获取的时间记为 09:35
+    store._set_meta(('000001', 'daily', 'qfq'), store._get_meta(('000001', 'daily', 'qfq'))[0], opened.timestamp())
+    first_close = float(state.bars['日K'].close[-1])
+
+    # 11:00 再次查看：数据源中当天的K线已经变化
+    source.set_last_close(first_close + 1)
+    revisit = datetime(2025, 2, 14, 11, 0)
+    at(monkeypatch, revisit)
+    assert not store.is_fresh(opened.timestamp(), now=revisit)
+    calls = source.calls
+    refreshed = load(store, previous=state)
+    assert source.calls == calls + 1
+    assert refreshed.bars['日K'].close[-1] == pytest.approx(first_close + 1)
+    assert refreshed.bars['周K'].close[-1] == pytest.approx(first_close + 1)
+    assert len(refreshed.bars['日K']) == len(state.bars['日K'])
+
+
+def test_revisit_within_refresh_interval_reads_disk(store):
+    source = store.fetch_func
+    state = load(store)
+    calls = source.calls
+    load(store, previous=state)
+    assert source.calls == calls
@@ -0,0 +1,36 @@
+"""自选股刷新在快照有效期内复用同一份快照"""
+from data_provider import FakeProvider
+from market_snapshot import MarketSnapshot
+from watchlist import WatchlistScheduler
+
+
+def make_scheduler(tmp_path, ttl):
+    provider = FakeProvider()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return provider.stock_zh_a_spot_em()
+
+    snapshot = MarketSnapshot(fetch, ttl=ttl)
+    scheduler = WatchlistScheduler(snapshot, None, path=str(tmp_path / 'watchlist.json'))
+    code = snapshot.get_frame()['代码'].iloc[0]
+    scheduler.add(code)
+    return scheduler, code, calls
+
+
+def test_cycles_within_ttl_share_one_snapshot(tmp_path):
+    scheduler, code, calls = make_scheduler(tmp_path, ttl=60)
+    assert code in scheduler.refresh_quotes()
+    assert scheduler.refresh_quotes() == {}  # 数值未变化
+    scheduler.refresh_quotes()
+    assert len(calls) == 1
+    scheduler.snapshot.shutdown()
+
+
+def test_expired_snapshot_is_refreshed_once(tmp_path):
+    scheduler, code, calls = make_scheduler(tmp_path, ttl=60)
+    scheduler.snapshot.fetched_at -= 61
+    scheduler.refresh_quotes()
+    assert len(calls) == 2
+    scheduler.snapshot.shutdown()
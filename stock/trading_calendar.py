@@ -0,0 +1,139 @@
+"""本地缓存的交易日历（ak.tool_trade_date_hist_sina），使用二分查找"""
+import bisect
+import logging
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from instrumentation import traced
+from kline_store import DEFAULT_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_FILENAME = 'trade_calendar.txt'
+DEFAULT_CALENDAR_PATH = os.path.join(DEFAULT_DATA_DIR, CALENDAR_FILENAME)
+TRADING_SESSIONS = ((time(9, 30), time(11, 30)), (time(13, 0), time(15, 0)))  # 连续竞价时段
+
+
+def to_date(value):
+    """把 date / datetime / 'YYYYMMDD' / 'YYYY-MM-DD' 转换为 date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).replace('-', '')
+    return datetime.strptime(text, '%Y%m%d').date()
+
+
+class TradingCalendar:
+    """交易日历
+
+    启动时不发起网络请求：首次使用时从本地文件读取，本地日历不覆盖当前年份时才在后台重新下载。
+    日历尚不可用时按工作日近似判断。
+    """
+
+    def __init__(self, fetch_func, path=DEFAULT_CALENDAR_PATH):
+        self.fetch_func = fetch_func
+        self.path = path
+        self.dates = None  # 升序排列的交易日
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _load(self):
+        """首次使用时从本地文件读取日历"""
+        if self.loaded:
+            return
+        with self.lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            if not os.path.exists(self.path):
+                return
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self.dates = [to_date(line.strip()) for line in f if line.strip()]
+            except Exception as e:
+                logger.warning("Error loading trade calendar from %s: %s", self.path, e)
+
+    def covers(self, year):
+        """本地日历是否覆盖指定年份"""
+        self._load()
+        return bool(self.dates) and self.dates[-1].year >= year
+
+    @traced('calendar.refresh')
+    def refresh(self):
+        """下载完整日历并保存到本地"""
+        df = self.fetch_func()
+        dates = sorted(to_date(value) for value in df['trade_date'])
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(d.strftime('%Y-%m-%d') for d in dates))
+        with self.lock:
+            self.dates = dates
+
+    def ensure_current(self):
+        """本地日历不覆盖当前年份时重新下载（应在后台线程中调用）"""
+        if self.covers(date.today().year):
+            return
+        try:
+            logger.info("Refreshing trade calendar from tool_trade_date_hist_sina")
+            self.refresh()
+        except Exception as e:
+            logger.warning("Error refreshing trade calendar: %s", e)
+
+    def _usable(self, day):
+        """日历已加载并覆盖该日期"""
+        self._load()
+        return bool(self.dates) and self.dates[0] <= day <= self.dates[-1]
+
+    def is_trading_day(self, day=None):
+        day = to_date(day or date.today())
+        if not self._usable(day):
+            return day.weekday() < 5  # 日历不可用时按工作日近似
+        i = bisect.bisect_left(self.dates, day)
+        return i < len(self.dates) and self.dates[i] == day
+
+    def previous_trading_day(self, day=None):
+        """day 之前（不含当天）的最近一个交易日"""
+        day = to_date(day or date.today())
+        if not self._usable(day - timedelta(days=1)):
+            day -= timedelta(days=1)
+            while day.weekday() >= 5:
+                day -= timedelta(days=1)
+            return day
+        i = bisect.bisect_left(self.dates, day)
+        return self.dates[i - 1] if i > 0 else None
+
+    def next_trading_day(self, day=None):
+        """day 之后（不含当天）的最近一个交易日"""
+        day = to_date(day or date.today())
+        if not self._usable(day + timedelta(days=1)):
+            day += timedelta(days=1)
+            while day.weekday() >= 5:
+                day += timedelta(days=1)
+            return day
+        i = bisect.bisect_right(self.dates, day)
+        return self.dates[i] if i < len(self.dates) else None
+
+    def trading_days_between(self, start, end):
+        """start 与 end 之间（含两端）的全部交易日"""
+        start, end = to_date(start), to_date(end)
+        self._load()
+        if not self.dates:
+            days = (start + timedelta(days=i) for i in range((end - start).days + 1))
+            return [d for d in days if d.weekday() < 5]
+        return self.dates[bisect.bisect_left(self.dates, start):bisect.bisect_right(self.dates, end)]
+
+    def latest_close(self, now, close_hour):
+        """不晚于 now 的最近一次收盘时间"""
+        today = now.date()
+        if self.is_trading_day(today) and now.hour >= close_hour:
+            day = today
+        else:
+            day = self.previous_trading_day(today)
+        return datetime.combine(day, datetime.min.time()).replace(hour=close_hour)
+
+    def is_trading_time(self, now=None):
+        """当前是否处于交易时段"""
+        now = now or datetime.now()
+        return self.is_trading_day(now.date()) and any(
+            start <= now.time() <= end for start, end in TRADING_SESSIONS)
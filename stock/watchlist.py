@@ -0,0 +1,229 @@
+"""自选股列表：每轮最多拉取一次全市场快照，批量更新所有自选股"""
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+from instrumentation import traced
+from kline_store import DEFAULT_DATA_DIR
+from quote_sources import format_number, to_float
+
+logger = logging.getLogger(__name__)
+
+WATCHLIST_FILENAME = 'watchlist.json'
+DEFAULT_WATCHLIST_PATH = os.path.join(DEFAULT_DATA_DIR, WATCHLIST_FILENAME)
+KLINE_BATCH = 2        # 每轮最多刷新K线的自选股数量（错峰刷新）
+KLINE_RATE = 1.0       # K线请求速率上限（次/秒）
+CYCLE_TIMEOUT = 60     # 单轮刷新中等待快照的最长时间（秒）
+
+WATCH_FIELDS = ['名称', '最新价', '涨跌幅', '换手率']
+
+
+class TokenBucket:
+    """令牌桶限速器"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self, timeout=None):
+        """阻塞直到获得令牌，超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.try_acquire():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(1.0 / self.rate / 4)
+        return True
+
+
+class WatchlistScheduler:
+    """自选股刷新调度
+
+    每轮刷新最多请求一次全市场快照（有效期内直接复用），再按代码查出全部自选股，只返回发生变化的行；
+    K线按轮次错峰刷新少量股票并限速，单轮刷新的网络开销与自选股数量无关。
+    """
+
+    def __init__(self, snapshot, kline_store, path=DEFAULT_WATCHLIST_PATH,
+                 kline_batch=KLINE_BATCH, kline_rate=KLINE_RATE):
+        self.snapshot = snapshot
+        self.kline_store = kline_store
+        self.path = path
+        self.kline_batch = kline_batch
+        self.limiter = TokenBucket(kline_rate)
+        self.symbols = self._load()
+        self.last_values = {}  # 代码 -> 上次显示的数值
+        self.kline_cursor = 0
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.running = None
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return list(json.load(f))
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            logger.warning("Error loading watchlist from %s: %s", self.path, e)
+            return []
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.symbols, f)
+
+    def add(self, code):
+        with self.lock:
+            if code in self.symbols:
+                return False
+            self.symbols.append(code)
+        self.save()
+        return True
+
+    def remove(self, code):
+        with self.lock:
+            if code not in self.symbols:
+                return False
+            self.symbols.remove(code)
+            self.last_values.pop(code, None)
+        self.save()
+        return True
+
+    def has_unfilled(self):
+        """是否有自选股尚未获取过行情"""
+        with self.lock:
+            return any(code not in self.last_values for code in self.symbols)
+
+    def refresh_quotes(self):
+        """从有效期内的全市场快照中查出自选股，返回数值发生变化的自选股 {代码: {字段: 值}}
+
+        快照过期时才等待一次共享的刷新，有效期内的多轮刷新不会重复请求快照。
+        """
+        self.snapshot.get_frame(timeout=CYCLE_TIMEOUT)
+        with self.lock:
+            symbols = list(self.symbols)
+        rows = self.snapshot.get_many(symbols)
+        changed = {}
+        with self.lock:
+            for code, row in rows.items():
+                values = {field: row.get(field) for field in WATCH_FIELDS}
+                if code in self.symbols and self.last_values.get(code) != values:
+                    self.last_values[code] = values
+                    changed[code] = values
+            # 快照中没有的代码（如代码有误或已退市）也记为已获取，避免非交易时段反复请求
+            for code in symbols:
+                if code in self.symbols and code not in rows:
+                    self.last_values.setdefault(code, None)
+        return changed
+
+    def refresh_klines(self, start_date, end_date):
+        """轮流刷新少量自选股的日K数据，并限制请求速率"""
+        with self.lock:
+            symbols = list(self.symbols)
+        if not symbols:
+            return
+        for _ in range(min(self.kline_batch, len(symbols))):
+            code = symbols[self.kline_cursor % len(symbols)]
+            self.kline_cursor += 1
+            if not self.limiter.acquire(timeout=CYCLE_TIMEOUT):
+                return
+            try:
+                self.kline_store.get_hist(symbol=code, period="daily", adjust="qfq",
+                                          start_date=start_date, end_date=end_date)
+            except Exception as e:
+                logger.warning("Error refreshing K-line data for watchlist symbol %s: %s", code, e)
+
+    @traced('watchlist.cycle')
+    def run_cycle(self, start_date, end_date):
+        changed = self.refresh_quotes()
+        self.refresh_klines(start_date, end_date)
+        return changed
+
+    def submit_cycle(self, start_date, end_date):
+        """在后台执行一轮刷新，上一轮尚未完成时返回 None"""
+        if self.running is not None and not self.running.done():
+            return None
+        self.running = self.executor.submit(self.run_cycle, start_date, end_date)
+        return self.running
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+class WatchlistPanel(ttk.Frame):
+    """自选股面板，只重绘数值发生变化的行"""
+
+    COLUMNS = ('代码', '名称', '最新价', '涨跌幅', '换手率')
+
+    def __init__(self, master, scheduler, on_select, on_change):
+        super().__init__(master)
+        self.scheduler = scheduler
+        self.on_select = on_select  # 双击某只股票时调用
+        self.on_change = on_change  # 添加自选股后调用
+
+        input_frame = ttk.Frame(self)
+        input_frame.pack(fill=tk.X, pady=2)
+        self.code_entry = ttk.Entry(input_frame, width=10)
+        self.code_entry.pack(side=tk.LEFT, padx=2)
+        ttk.Button(input_frame, text="添加", command=self.add_symbol).pack(side=tk.LEFT, padx=2)
+        ttk.Button(input_frame, text="删除", command=self.remove_selected).pack(side=tk.LEFT, padx=2)
+
+        self.tree = ttk.Treeview(self, columns=self.COLUMNS, show='headings', height=20)
+        for column in self.COLUMNS:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=70, anchor=tk.E if column not in ('代码', '名称') else tk.W)
+        self.tree.tag_configure('up', foreground='red')
+        self.tree.tag_configure('down', foreground='green')
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind('<Double-1>', self.on_double_click)
+
+        for code in scheduler.symbols:
+            self.tree.insert('', tk.END, iid=code, values=(code, '--', '--', '--', '--'))
+
+    def add_symbol(self):
+        code = self.code_entry.get().strip()
+        if code and self.scheduler.add(code):
+            self.tree.insert('', tk.END, iid=code, values=(code, '--', '--', '--', '--'))
+            self.code_entry.delete(0, tk.END)
+            self.on_change()
+
+    def remove_selected(self):
+        for code in self.tree.selection():
+            self.scheduler.remove(code)
+            self.tree.delete(code)
+
+    def on_double_click(self, event):
+        code = self.tree.identify_row(event.y)
+        if code:
+            self.on_select(code)
+
+    def update_rows(self, changed):
+        """只更新数值发生变化的行"""
+        for code, values in changed.items():
+            if not self.tree.exists(code):
+                continue
+            change = to_float(values['涨跌幅'])
+            tag = 'down' if change is not None and change < 0 else 'up'
+            self.tree.item(code, tags=(tag,), values=(
+                code,
+                values['名称'],
+                format_number(values['最新价']),
+                format_number(values['涨跌幅'], suffix="%"),
+                format_number(values['换手率'], suffix="%"),
+            ))